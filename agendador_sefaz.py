@@ -0,0 +1,260 @@
+# agendador_sefaz.py
+# Agendador das requisições aos portais de NFC-e da SEFAZ, por host:
+# - balde de tokens: no máximo SEFAZ_REQ_POR_SEGUNDO requisições por segundo
+#   (com rajadas de até SEFAZ_RAJADA) para cada portal;
+# - no máximo SEFAZ_MAX_SIMULTANEAS requisições em andamento por portal;
+# - coalescência: pedidos iguais (mesma camada e URL) ao mesmo tempo viram
+#   uma requisição só, e todos recebem o mesmo resultado;
+# - disjuntor: depois de SEFAZ_FALHAS_DISJUNTOR falhas seguidas o portal é
+#   dado como fora do ar e os pedidos falham na hora (PortalIndisponivel) por
+#   SEFAZ_DISJUNTOR_ABERTO_S segundos; depois disso um pedido de teste decide
+#   se fecha de novo;
+# - novas tentativas voltam para a fila do host (balde e vagas) depois de um
+#   backoff, em vez de repetir na hora segurando a vaga.
+# Falha do portal = erro de rede, timeout, 429 ou 5xx. Um 4xx é resposta do
+# portal: não conta para o disjuntor nem é repetido.
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+from observabilidade import contador, medidor, medir, obter_logger
+
+
+log = obter_logger("sefaz")
+
+REQUISICOES_SEFAZ = contador(
+    "reembolso_sefaz_requisicoes_total",
+    "Pedidos aos portais da SEFAZ por host e resultado (ok, falha, erro_portal, coalescido, disjuntor_aberto, sem_vaga).")
+
+
+class PortalIndisponivel(Exception):
+    pass
+
+
+class PortalSemVaga(Exception):
+    pass
+
+
+# --- BALDE DE TOKENS ---
+class BaldeTokens:
+    def __init__(self, taxa, capacidade):
+        self.taxa = taxa
+        self.capacidade = max(1, capacidade)
+        self._tokens = float(self.capacidade)
+        self._atualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Reserva um token e retorna quantos segundos esperar por ele, ou None se
+    # a espera passaria de espera_max (nada é reservado nesse caso).
+    def reservar(self, espera_max=None):
+        if self.taxa <= 0:
+            return 0.0
+        with self._lock:
+            agora = time.monotonic()
+            self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+            espera = max(0.0, (1 - self._tokens) / self.taxa)
+            if espera_max is not None and espera > espera_max:
+                return None
+            self._tokens -= 1
+            return espera
+
+
+# --- DISJUNTOR ---
+class Disjuntor:
+    FECHADO = "fechado"
+    ABERTO = "aberto"
+    MEIO_ABERTO = "meio_aberto"
+
+    def __init__(self, nome, limite_falhas, tempo_aberto):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self.estado = self.FECHADO
+        self._falhas = 0
+        self._aberto_em = 0.0
+        self._testando = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == self.ABERTO and time.monotonic() - self._aberto_em >= self.tempo_aberto:
+                self.estado = self.MEIO_ABERTO
+                self._testando = False
+            if self.estado == self.MEIO_ABERTO:
+                # Só um pedido de teste por vez; os outros continuam falhando rápido.
+                if self._testando:
+                    return False
+                self._testando = True
+                return True
+            return self.estado == self.FECHADO
+
+    def registrar_sucesso(self):
+        with self._lock:
+            if self.estado != self.FECHADO:
+                log.info("Portal respondeu de novo. Disjuntor fechado.", extra={"host": self.nome})
+            self.estado = self.FECHADO
+            self._falhas = 0
+            self._testando = False
+
+    # O pedido de teste desistiu antes de chegar ao portal (sem vaga).
+    def desistir(self):
+        with self._lock:
+            self._testando = False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            self._testando = False
+            if self.estado == self.MEIO_ABERTO or (
+                    self.estado == self.FECHADO and self._falhas >= self.limite_falhas):
+                self.estado = self.ABERTO
+                self._aberto_em = time.monotonic()
+                log.warning("Portal fora do ar. Disjuntor aberto.", extra={
+                    "host": self.nome, "falhas": self._falhas, "segundos": self.tempo_aberto})
+
+
+class _Host:
+    def __init__(self, nome, agendador):
+        self.balde = BaldeTokens(agendador.taxa, agendador.rajada)
+        self.vagas = threading.BoundedSemaphore(agendador.max_simultaneas)
+        self.disjuntor = Disjuntor(nome, agendador.limite_falhas, agendador.tempo_aberto)
+
+
+def falha_do_portal(erro):
+    status = getattr(getattr(erro, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return True
+
+
+# --- AGENDADOR ---
+class AgendadorSefaz:
+    def __init__(self, taxa=None, rajada=None, max_simultaneas=None, tentativas=None,
+                 limite_falhas=None, tempo_aberto=None, espera_max=None, backoff=None):
+        self.taxa = taxa if taxa is not None else float(os.environ.get("SEFAZ_REQ_POR_SEGUNDO", 2))
+        self.rajada = rajada or int(os.environ.get("SEFAZ_RAJADA", 4))
+        self.max_simultaneas = max_simultaneas or int(os.environ.get("SEFAZ_MAX_SIMULTANEAS", 4))
+        self.tentativas = tentativas if tentativas is not None else int(os.environ.get("SEFAZ_TENTATIVAS", 2))
+        self.limite_falhas = limite_falhas or int(os.environ.get("SEFAZ_FALHAS_DISJUNTOR", 5))
+        self.tempo_aberto = tempo_aberto if tempo_aberto is not None else float(
+            os.environ.get("SEFAZ_DISJUNTOR_ABERTO_S", 30))
+        # Tempo máximo na fila do host (vaga + token) antes de desistir do pedido.
+        self.espera_max = espera_max if espera_max is not None else float(os.environ.get("SEFAZ_ESPERA_MAX_S", 30))
+        self.backoff = backoff if backoff is not None else 0.5
+        self._hosts = {}
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+
+    def _host(self, nome):
+        with self._lock:
+            if nome not in self._hosts:
+                self._hosts[nome] = _Host(nome, self)
+            return self._hosts[nome]
+
+    # Executa funcao(*args) respeitando os limites do host da URL. `camada`
+    # separa pedidos da mesma URL que não são equivalentes (http x navegador).
+    def executar(self, url, funcao, *args, camada=""):
+        host = urlsplit(url).hostname or ""
+        chave = (camada, url)
+        with self._lock:
+            futuro = self._em_andamento.get(chave)
+            lider = futuro is None
+            if lider:
+                futuro = self._em_andamento[chave] = Future()
+        if not lider:
+            REQUISICOES_SEFAZ.inc(host=host, resultado="coalescido")
+            return futuro.result()
+        try:
+            resultado = self._executar(host, funcao, args)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                self._em_andamento.pop(chave, None)
+
+    def _executar(self, host, funcao, args):
+        estado = self._host(host)
+        for tentativa in range(self.tentativas + 1):
+            if not estado.disjuntor.permitir():
+                REQUISICOES_SEFAZ.inc(host=host, resultado="disjuntor_aberto")
+                raise PortalIndisponivel(f"Portal {host} fora do ar (disjuntor aberto).")
+            try:
+                self._reservar(host, estado)
+            except PortalSemVaga:
+                estado.disjuntor.desistir()
+                raise
+            # O disjuntor pode ter aberto enquanto o pedido esperava a vez.
+            if estado.disjuntor.estado == Disjuntor.ABERTO:
+                estado.vagas.release()
+                REQUISICOES_SEFAZ.inc(host=host, resultado="disjuntor_aberto")
+                raise PortalIndisponivel(f"Portal {host} fora do ar (disjuntor aberto).")
+            try:
+                resultado = funcao(*args)
+            except Exception as e:
+                if not falha_do_portal(e):
+                    estado.disjuntor.registrar_sucesso()
+                    REQUISICOES_SEFAZ.inc(host=host, resultado="erro_portal")
+                    raise
+                estado.disjuntor.registrar_falha()
+                REQUISICOES_SEFAZ.inc(host=host, resultado="falha")
+                if tentativa == self.tentativas:
+                    raise
+                log.info("Falha no portal (%s). Nova tentativa na fila do host.", e, extra={
+                    "host": host, "tentativa": tentativa + 1})
+            else:
+                estado.disjuntor.registrar_sucesso()
+                REQUISICOES_SEFAZ.inc(host=host, resultado="ok")
+                return resultado
+            finally:
+                estado.vagas.release()
+            # Espera fora da vaga: os outros pedidos do host seguem enquanto isso.
+            time.sleep(self.backoff * 2 ** tentativa)
+
+    # Ocupa uma vaga do host e espera o token do balde; desiste depois de espera_max.
+    def _reservar(self, host, estado):
+        with medir("espera_sefaz"):
+            inicio = time.monotonic()
+            if not estado.vagas.acquire(timeout=self.espera_max):
+                REQUISICOES_SEFAZ.inc(host=host, resultado="sem_vaga")
+                raise PortalSemVaga(f"Sem vaga para o portal {host} em {self.espera_max:.0f}s.")
+            espera = estado.balde.reservar(max(0.0, self.espera_max - (time.monotonic() - inicio)))
+            if espera is None:
+                estado.vagas.release()
+                REQUISICOES_SEFAZ.inc(host=host, resultado="sem_vaga")
+                raise PortalSemVaga(f"Limite de requisições do portal {host} esgotado.")
+            if espera:
+                time.sleep(espera)
+
+    def disjuntores_abertos(self):
+        with self._lock:
+            return sum(1 for estado in self._hosts.values()
+                       if estado.disjuntor.estado != Disjuntor.FECHADO)
+
+    def estatisticas(self):
+        with self._lock:
+            return {nome: estado.disjuntor.estado for nome, estado in self._hosts.items()}
+
+
+_agendador = None
+_agendador_pid = None
+_agendador_lock = threading.Lock()
+
+
+def obter_agendador_sefaz():
+    global _agendador, _agendador_pid
+    with _agendador_lock:
+        # Semáforos e pedidos em andamento são do processo: recria depois de um fork.
+        if _agendador is None or _agendador_pid != os.getpid():
+            _agendador = AgendadorSefaz()
+            _agendador_pid = os.getpid()
+            medidor("reembolso_sefaz_disjuntores_abertos", "Portais da SEFAZ com o disjuntor aberto.",
+                    _agendador.disjuntores_abertos)
+        return _agendador
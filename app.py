@@ -3,18 +3,23 @@
 
 import os
 import uuid
-import requests
-import pandas as pd
-import openpyxl
-from flask import Flask, request
+from flask import Flask, Response, request, jsonify
 from twilio.twiml.messaging_response import MessagingResponse
 from dotenv import load_dotenv
-from shutil import copyfile
-from collections import defaultdict
 import re
 # --- Importa os "motores" dos outros arquivos ---
-from processador_pedagio import extrair_texto_da_imagem, analisar_e_estruturar_texto
-from processador_cupom import configurar_detector_wechat, ler_qr_code, extrair_dados_pagina
+from processador_pedagio import ler_extrato, transacoes_das_paginas, mesclar_paginas_extrato
+from processador_cupom import obter_pool_detectores, ler_qr_code, extrair_dados_pagina, estatisticas_fontes, transacao_do_cupom
+from fila_processamento import FilaProcessamento
+from enviador_mensagens import criar_enviador
+import exportacao
+from armazenamento_estado import criar_armazenamento
+from cache_resultados import CacheResultados, chave_do_extrato, chaves_da_imagem, extrair_chave_acesso
+from agendador_sefaz import obter_agendador_sefaz
+from baixador_midias import obter_baixador, MidiaGrandeDemais
+from decodificador_nfce import completar_com_qr, dados_nota_do_qr, decodificar_qr_nfce, qr_tem_dados_de_lancamento
+from observabilidade import ESCALADAS, MENSAGENS, com_id_requisicao, exportar_prometheus, medir, obter_logger
+from relatorios import consultar, interpretar_consulta, periodo_do_cadastro
 
 
 # Carrega as variáveis de ambiente (senhas) do arquivo .env
@@ -23,9 +28,7 @@ load_dotenv()
 
 # --- Configuração Inicial ---
 app = Flask(__name__)
-
-# Guardar progresso da coleta de dados iniciais
-estado_usuarios = defaultdict(lambda: {"etapa": 0, "dados": {}})
+log = obter_logger("app")
 
 # No PythonAnywhere, os caminhos são relativos ao seu diretório home do usuário
 # Ex: /home/seu_usuario_pythonanywhere/
@@ -33,80 +36,57 @@ HOME_DIR = os.path.expanduser("~")
 # O nome da sua pasta de projeto que você vai criar no PythonAnywhere
 PROJECT_FOLDER_NAME = "bot_planilha_de_custos"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-TEMP_DIR = os.path.join(BASE_DIR, "temp")
-if not os.path.exists(TEMP_DIR):
-    os.makedirs(TEMP_DIR)
-
-detector_qr = configurar_detector_wechat()
 
 # Carrega as credenciais da Twilio do ambiente
 ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID")
 AUTH_TOKEN = os.environ.get("TWILIO_AUTH_TOKEN")
 
+# Fila de processamento das mídias e canal de resposta assíncrona
+fila = FilaProcessamento()
+enviador = criar_enviador()
+
+# Cache dos resultados já extraídos (evita reprocessar e duplicar lançamentos)
+cache = CacheResultados(os.environ.get(
+    "CACHE_RESULTADOS_DB", os.path.join(BASE_DIR, "cache_resultados.db")))
+
 # --- Configurações da Planilha ---
 NOME_DA_ABA = "Plan2"
-LINHA_DOS_TOTAIS = 46
 ARQUIVO_MODELO = os.path.join(BASE_DIR, "planilha_reembolso_branco.xlsx")
-ARQUIVO_DESTINO = os.path.join(BASE_DIR, "reembolso_preenchido.xlsx")
+PASTA_PLANILHAS = os.path.join(BASE_DIR, "planilhas")
 
-# --- Função Centralizada para Preencher a Planilha ---
+# Estado das conversas e lançamentos por número (SQLite por padrão)
+armazenamento = criar_armazenamento(BASE_DIR)
 
+COMANDOS_EXPORTAR = ["exportar", "planilha"]
 
-def salvar_dados_iniciais(dados, arquivo_modelo, arquivo_destino, nome_da_aba):
-    if not os.path.exists(arquivo_destino):
-        copyfile(arquivo_modelo, arquivo_destino)
+# Cupom cujo QR Code já traz valor e data: responde na hora e busca o nome do
+# estabelecimento na página da NFC-e depois, numa tarefa separada da fila.
+ENRIQUECIMENTO_ADIADO = os.environ.get("NFCE_ENRIQUECIMENTO_ADIADO", "1") == "1"
+# Se o portal não responder, o enriquecimento volta para a fila depois que o
+# disjuntor do host puder fechar de novo (SEFAZ_DISJUNTOR_ABERTO_S).
+TENTATIVAS_ENRIQUECIMENTO = int(os.environ.get("NFCE_TENTATIVAS_ENRIQUECIMENTO", 3))
 
-    workbook = openpyxl.load_workbook(arquivo_destino)
-    sheet = workbook[nome_da_aba]
 
-    sheet["H3"] = dados.get("nome", "")
-    sheet["H4"] = dados.get("cpf_cnpj", "")
-    sheet["H5"] = dados.get("banco", "")
-    sheet["H6"] = dados.get("agencia_cc", "")
-    sheet["H7"] = dados.get("pix", "")
-    sheet["F4"] = dados.get("data_inicial", "")
-    sheet["F5"] = dados.get("data_final", "")
-
-    workbook.save(arquivo_destino)
-    print("✅ Dados iniciais salvos na planilha!")
-
-
-def preencher_planilha_reembolso(transacoes, arquivo_modelo, arquivo_destino, nome_da_aba, linha_dos_totais):
-    if not transacoes:
-        print("AVISO: Nenhuma transação para preencher.")
-        return
-    print(
-        f"INFO: Preenchendo {len(transacoes)} transações em '{os.path.basename(arquivo_destino)}'...")
-    if not os.path.exists(arquivo_destino):
-        copyfile(arquivo_modelo, arquivo_destino)
-    try:
-        workbook = openpyxl.load_workbook(arquivo_destino)
-        sheet = workbook[nome_da_aba]
-        linha_atual = 10
-        while sheet[f'B{linha_atual}'].value is not None:
-            linha_atual += 1
-
-        linhas_necessarias = len(transacoes)
-        if (linha_atual + linhas_necessarias) > linha_dos_totais:
-            sheet.insert_rows(linha_dos_totais, amount=linhas_necessarias)
-
-        for transacao in transacoes:
-            sheet[f'B{linha_atual}'] = transacao.get('Data')
-            sheet[f'C{linha_atual}'] = transacao.get('Estabelecimento', '') + (
-                ' - ' + transacao.get('Observação', '') if transacao.get('Observação') else '')
-            sheet[f'D{linha_atual}'] = transacao.get('Tipo de Despesa')
-            sheet[f'F{linha_atual}'] = "São Jose dos Campos"
-            sheet[f'G{linha_atual}'] = "São Paulo"
-            sheet[f'I{linha_atual}'] = transacao.get('Valor')
-            linha_atual += 1
-        workbook.save(arquivo_destino)
-        print("INFO: Planilha de reembolso atualizada com sucesso!")
-    except Exception as e:
-        print(f"ERRO CRÍTICO ao preencher a planilha: {e}")
+ETAPAS_CADASTRO = [
+    "Qual o seu nome completo?",
+    "Informe o CPF ou CNPJ:",
+    "Qual o banco?",
+    "Informe Agência e C/C:",
+    "Qual a chave PIX?",
+    "Data Inicial: (DD/MM/AAAA)",
+    "Data Final: (DD/MM/AAAA)"
+]
+CAMPOS_CADASTRO = ["nome", "cpf_cnpj", "banco", "agencia_cc", "pix", "data_inicial", "data_final"]
 
 
 @app.route("/whatsapp", methods=["POST"])
 def whatsapp_bot():
+    # O id da mensagem (MessageSid da Twilio) acompanha os logs até o worker da fila.
+    with com_id_requisicao(request.values.get("MessageSid") or uuid.uuid4().hex[:12]):
+        return responder_mensagem()
+
+
+def responder_mensagem():
     num_media = int(request.values.get("NumMedia", 0))
     resp = MessagingResponse()
     msg = resp.message()
@@ -114,125 +94,404 @@ def whatsapp_bot():
     from_number = request.values.get("From", "")
     texto = request.values.get("Body", "").strip()
 
-    etapas = [
-        "Qual o seu nome completo?",
-        "Informe o CPF ou CNPJ:",
-        "Qual o banco?",
-        "Informe Agência e C/C:",
-        "Qual a chave PIX?",
-        "Data Inicial: (DD/MM/AAAA)",
-        "Data Final: (DD/MM/AAAA)"
-    ]
-
-    usuario = estado_usuarios[from_number]
+    # Leitura e escrita do estado do usuário serializadas (threads e workers)
+    with armazenamento.bloquear(from_number):
+        usuario = armazenamento.obter_usuario(from_number)
+        resposta_cadastro = conduzir_cadastro(usuario, texto)
+        if resposta_cadastro:
+            armazenamento.salvar_usuario(from_number, usuario)
+    if resposta_cadastro:
+        MENSAGENS.inc(tipo="cadastro")
+        msg.body(resposta_cadastro)
+        return str(resp)
 
-    # Se for a primeira vez que o usuário fala, inicia perguntando o nome
-    if usuario["etapa"] == 0 and not texto:
-        msg.body(etapas[0])
+    if num_media == 0 and texto.lower() in COMANDOS_EXPORTAR:
+        MENSAGENS.inc(tipo="exportar")
+        # Gerar a planilha pode passar do prazo do webhook da Twilio: vai para a fila.
+        fila.enfileirar(exportar_planilha, from_number)
+        msg.body("⏳ Gerando sua planilha… te aviso assim que ficar pronta.")
         return str(resp)
 
-    if usuario["etapa"] < len(etapas):
-        # Salva a resposta anterior
-        if usuario["etapa"] == 0 and texto:
-            # Lista de saudações comuns que NÃO devem ser salvas como nome
-            saudacoes = ["oi", "olá", "ola", "bom dia",
-                         "boa tarde", "boa noite", "hey", "eae"]
-            if texto.lower() in saudacoes:
-                msg.body("Qual o seu nome completo?")
-                return str(resp)
-            else:
-                usuario["dados"]["nome"] = texto
-        elif usuario["etapa"] == 1 and texto:
-            usuario["dados"]["cpf_cnpj"] = texto
-        elif usuario["etapa"] == 2 and texto:
-            usuario["dados"]["banco"] = texto
-        elif usuario["etapa"] == 3 and texto:
-            usuario["dados"]["agencia_cc"] = texto
-        elif usuario["etapa"] == 4 and texto:
-            usuario["dados"]["pix"] = texto
-        elif usuario["etapa"] == 5 and texto:
-            usuario["dados"]["data_inicial"] = texto
-        elif usuario["etapa"] == 6 and texto:
-            usuario["dados"]["data_final"] = texto
-
-
-        usuario["etapa"] += 1
-
-        # Se ainda falta perguntar, manda a próxima pergunta
-        if usuario["etapa"] < len(etapas):
-            msg.body(etapas[usuario["etapa"]])
-            return str(resp)
-        else:
-            # Finalizou todas as perguntas, salva na planilha
-            salvar_dados_iniciais(
-                usuario["dados"], ARQUIVO_MODELO, ARQUIVO_DESTINO, NOME_DA_ABA)
-            msg.body(
-                "✅ Dados cadastrados! Agora envie uma imagem do cupom ou pedágio.")
-            return str(resp)
+    consulta = interpretar_consulta(texto) if num_media == 0 else None
+    if consulta:
+        MENSAGENS.inc(tipo="consulta")
+        msg.body(responder_consulta(from_number, consulta, usuario))
+        return str(resp)
 
     if num_media > 0:
-        media_url = request.values.get("MediaUrl0")
-        nome_arquivo_temp = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.jpg")
-
-        try:
-            # Baixa a imagem com autenticação
-            r = requests.get(media_url, auth=(ACCOUNT_SID, AUTH_TOKEN))
-            r.raise_for_status()
-            with open(nome_arquivo_temp, "wb") as f:
-                f.write(r.content)
-            print(f"📂 Imagem salva em {os.path.basename(nome_arquivo_temp)}")
-
-            # --- Lógica de Decisão ---
-            url_nota = ler_qr_code(detector_qr, nome_arquivo_temp)
-
-            if url_nota:
-                print("INFO: QR Code detectado! Processando como Cupom...")
-                dados_nota = extrair_dados_pagina(url_nota)
-                if dados_nota and dados_nota.get('valor_total', 0) > 0:
-                    transacao_cupom = [{
-                        "Data": dados_nota['data_emissao'],
-                        "Tipo de Despesa": "Combustivel/Alimentação",
-                        "Estabelecimento": dados_nota['nome_estabelecimento'],
-                        "Valor": dados_nota['valor_total'],
-                        "Observação": f"CNPJ: {dados_nota.get('cnpj', 'N/A')}"
-                    }]
-                    preencher_planilha_reembolso(
-                        transacao_cupom, ARQUIVO_MODELO, ARQUIVO_DESTINO, NOME_DA_ABA, LINHA_DOS_TOTAIS)
-                    msg.body(
-                        f"✅ Cupom de '{dados_nota['nome_estabelecimento']}' (R$ {dados_nota['valor_total']:.2f}) processado!")
-                else:
-                    msg.body(
-                        "❌ QR Code lido, mas falhou ao extrair os dados do site.")
-            else:
-                print("INFO: Nenhum QR Code. Processando como Pedágio (OCR)...")
-                texto_extraido = extrair_texto_da_imagem(nome_arquivo_temp)
-                if texto_extraido:
-                    lista_transacoes = analisar_e_estruturar_texto(
-                        texto_extraido)
-                    if lista_transacoes:
-                        preencher_planilha_reembolso(
-                            lista_transacoes, ARQUIVO_MODELO, ARQUIVO_DESTINO, NOME_DA_ABA, LINHA_DOS_TOTAIS)
-                        msg.body(
-                            f"✅ Extrato com {len(lista_transacoes)} transações processado!")
-                    else:
-                        msg.body(
-                            "❌ Imagem lida, mas não encontrei transações válidas.")
-                else:
-                    msg.body("❌ Não consegui ler nenhum texto na imagem.")
-
-        except Exception as e:
-            print(f"ERRO GERAL: {e}")
-            msg.body("Ocorreu um erro inesperado. 😔 Tente novamente.")
-        finally:
-            if os.path.exists(nome_arquivo_temp):
-                os.remove(nome_arquivo_temp)
+        midias = [(request.values.get(f"MediaUrl{i}"), request.values.get(f"MediaContentType{i}", ""))
+                  for i in range(num_media)]
+        MENSAGENS.inc(tipo="midia")
+        fila.enfileirar(processar_midias, from_number, midias)
+        log.info("Mídias enfileiradas.", extra={
+            "remetente": from_number, "midias": num_media, "profundidade_fila": fila.estatisticas()["profundidade"]})
+        if num_media == 1:
+            msg.body("⏳ Recebi seu arquivo! Estou processando… te aviso assim que terminar.")
+        else:
+            msg.body(f"⏳ Recebi {num_media} arquivos! Estou processando… te aviso assim que terminar.")
     else:
+        MENSAGENS.inc(tipo="texto")
         msg.body(
-            "Olá! Por favor, envie uma imagem de um cupom fiscal ou extrato de pedágio.")
+            "Olá! Por favor, envie uma imagem de um cupom fiscal ou um extrato de pedágio (foto ou PDF). "
+            "Para ver seus lançamentos, mande *total* ou *resumo*.")
 
     return str(resp)
 
 
+# Retorna a próxima pergunta do cadastro, ou None se o cadastro já terminou.
+def conduzir_cadastro(usuario, texto):
+    # Se for a primeira vez que o usuário fala, inicia perguntando o nome
+    if usuario["etapa"] == 0 and not texto:
+        return ETAPAS_CADASTRO[0]
+
+    if usuario["etapa"] >= len(ETAPAS_CADASTRO):
+        return None
+
+    # Salva a resposta anterior
+    if usuario["etapa"] == 0:
+        # Lista de saudações comuns que NÃO devem ser salvas como nome
+        saudacoes = ["oi", "olá", "ola", "bom dia",
+                     "boa tarde", "boa noite", "hey", "eae"]
+        if texto.lower() in saudacoes:
+            return "Qual o seu nome completo?"
+    if texto:
+        usuario["dados"][CAMPOS_CADASTRO[usuario["etapa"]]] = texto
+
+    usuario["etapa"] += 1
+
+    # Se ainda falta perguntar, manda a próxima pergunta
+    if usuario["etapa"] < len(ETAPAS_CADASTRO):
+        return ETAPAS_CADASTRO[usuario["etapa"]]
+    return "✅ Dados cadastrados! Agora envie uma imagem do cupom ou pedágio."
+
+
+# A planilha de cada usuário é gerada sob demanda a partir do armazenamento.
+def arquivo_planilha_usuario(from_number):
+    identificador = re.sub(r"\D", "", from_number) or "anonimo"
+    return os.path.join(PASTA_PLANILHAS, f"reembolso_{identificador}.xlsx")
+
+
+def gerar_planilha_usuario(from_number):
+    arquivo = arquivo_planilha_usuario(from_number)
+    usuario = armazenamento.obter_usuario(from_number)
+    exportacao.exportar_xlsx(armazenamento.listar_transacoes(from_number), arquivo, ARQUIVO_MODELO, NOME_DA_ABA,
+                             usuario["dados"])
+    return arquivo
+
+
+# "total" e "resumo": agregação no armazenamento, sem gerar a planilha. Sem
+# período no comando, vale o do cadastro (Data Inicial a Data Final).
+def responder_consulta(from_number, consulta, usuario):
+    if not consulta["inicio"]:
+        consulta = dict(consulta)
+        consulta["inicio"], consulta["fim"] = periodo_do_cadastro(usuario["dados"])
+    with medir("consulta"):
+        return consultar(armazenamento, from_number, consulta)
+
+
+# Carrega antes da primeira mensagem o que o processamento das mídias usaria
+# sob demanda: bibliotecas pesadas, detector WeChat, motor de OCR e sessões HTTP.
+# Chamado pelo gunicorn em cada worker (post_fork, ver gunicorn.conf.py).
+def precarregar(navegador=None):
+    import processador_imagem  # noqa: F401 (OpenCV + numpy)
+    import classificador_midia  # noqa: F401
+    import openpyxl  # noqa: F401
+    from extratores_nfce import escolher_extrator
+    from processador_cupom import obter_sessao_http
+    from processador_pedagio import obter_motor_ocr
+    from observabilidade import medir
+
+    with medir("precarregamento"):
+        obter_pool_detectores()
+        escolher_extrator(None)  # carrega o lxml e compila os XPaths dos portais
+        obter_motor_ocr()
+        obter_sessao_http()
+        obter_baixador()
+        if navegador is None:
+            navegador = os.environ.get("PRECARREGAR_NAVEGADOR", "0") == "1"
+        if navegador:
+            from pool_navegador import obter_pool_navegador
+            obter_pool_navegador().iniciar()
+    log.info("Worker pré-carregado.", extra={"pid": os.getpid()})
+
+
+@app.route("/fila", methods=["GET"])
+def status_fila():
+    estatisticas = fila.estatisticas()
+    estatisticas["fontes_nfce"] = estatisticas_fontes()
+    estatisticas["disjuntores_sefaz"] = obter_agendador_sefaz().estatisticas()
+    return jsonify(estatisticas)
+
+
+@app.route("/metrics", methods=["GET"])
+def metricas():
+    return Response(exportar_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+# --- Tarefas da fila (rodam nos workers, fora do webhook) ---
+def enviar_resposta(tarefa, from_number, resposta):
+    with tarefa.etapa("envio"):
+        try:
+            enviador.enviar(from_number, resposta)
+        except Exception:
+            log.exception("Erro ao enviar a resposta.", extra={"remetente": from_number})
+    log.info("Tarefa concluída.", extra={
+        "tarefa": tarefa.id, "etapas_s": {nome: round(d, 4) for nome, d in tarefa.etapas.items()}})
+
+
+def exportar_planilha(tarefa, from_number):
+    with tarefa.etapa("planilha"):
+        try:
+            arquivo = gerar_planilha_usuario(from_number)
+            resposta = f"📄 Planilha atualizada: {os.path.basename(arquivo)}"
+        except Exception:
+            log.exception("Erro ao gerar a planilha.", extra={"remetente": from_number})
+            resposta = "❌ Não consegui gerar sua planilha. 😔 Tente novamente."
+    enviar_resposta(tarefa, from_number, resposta)
+
+
+# --- Processamento da mídia ---
+def processar_midias(tarefa, from_number, midias):
+    enviar_resposta(tarefa, from_number, gerar_resposta_midias(tarefa, from_number, midias))
+
+
+# Cupons são lançados um a um; as páginas de extrato (fotos ou PDF) da mesma
+# mensagem são juntadas, sem repetidas, e lançadas num único lote no final.
+def gerar_resposta_midias(tarefa, from_number, midias):
+    respostas = []
+    extratos = []
+    # Baixa todas as mídias da mensagem em paralelo antes de processar.
+    with tarefa.etapa("download"):
+        conteudos = obter_baixador().baixar_varias(
+            [media_url for media_url, _ in midias], auth=(ACCOUNT_SID, AUTH_TOKEN))
+    for (media_url, tipo_conteudo), conteudo in zip(midias, conteudos):
+        if isinstance(conteudo, MidiaGrandeDemais):
+            log.warning("Mídia recusada: %s", conteudo, extra={"url": media_url})
+            respostas.append("❌ Arquivo grande demais. Envie uma foto ou um PDF menor.")
+            continue
+        if isinstance(conteudo, Exception):
+            log.error("Erro ao baixar a mídia: %s", conteudo, extra={"url": media_url})
+            respostas.append("❌ Não consegui baixar o arquivo. 😔 Tente enviar de novo.")
+            continue
+        try:
+            resposta = processar_midia(tarefa, from_number, conteudo, tipo_conteudo, extratos)
+        except Exception:
+            log.exception("Erro ao processar a mídia.")
+            resposta = "Ocorreu um erro inesperado. 😔 Tente novamente."
+        if resposta:
+            respostas.append(resposta)
+    if extratos:
+        try:
+            respostas.append(lancar_extratos(tarefa, from_number, extratos))
+        except Exception:
+            log.exception("Erro ao lançar o extrato.")
+            respostas.append("Ocorreu um erro inesperado. 😔 Tente novamente.")
+    return "\n".join(respostas)
+
+
+# Retorna a resposta do item, ou None quando ele virou páginas de extrato em `extratos`.
+def processar_midia(tarefa, from_number, conteudo, tipo_conteudo, extratos):
+    # OpenCV e pypdfium2 só entram quando chega a primeira mídia (ou no pré-carregamento).
+    from processador_imagem import ESFORCO_QR_MINIMO, ESFORCO_QR_PADRAO, decodificar_imagem, eh_pdf, paginas_do_pdf
+    # Mesma foto (ou reencaminhada) já processada: nem abre a imagem.
+    with tarefa.etapa("cache"):
+        chaves = chaves_da_imagem(conteudo)
+        em_cache = cache.buscar(chaves)
+    if em_cache:
+        return responder_do_cache(tarefa, em_cache, chaves, from_number, extratos)
+
+    if eh_pdf(conteudo, tipo_conteudo):
+        log.info("PDF recebido. Processando como extrato de pedágio página a página.")
+        with tarefa.etapa("ocr"):
+            paginas = [t for t in transacoes_das_paginas(paginas_do_pdf(conteudo)) if t]
+        if not paginas:
+            return "❌ PDF lido, mas não encontrei transações válidas."
+        extratos.append((chaves, paginas))
+        return None
+
+    # Decodifica uma vez, em memória; QR e OCR usam o mesmo buffer.
+    with tarefa.etapa("decodificacao"):
+        imagem = decodificar_imagem(conteudo)
+    if imagem is None:
+        return "❌ Não consegui abrir o arquivo. Envie uma foto (JPG/PNG) ou um PDF."
+    log.info("Imagem decodificada em memória.", extra={"largura": imagem.formato[1], "altura": imagem.formato[0]})
+
+    # --- Lógica de Decisão ---
+    # Classificação barata (miniatura) decide quanto esforço gastar no QR e no OCR.
+    from classificador_midia import classificar_imagem, cupom_sem_qr, esforco_qr
+    with tarefa.etapa("classificacao"):
+        classificacao = classificar_imagem(imagem)
+    esforco = esforco_qr(classificacao)
+    with tarefa.etapa("qr_code"):
+        url_nota = ler_qr_code(obter_pool_detectores(), imagem, esforco=esforco)
+
+    if url_nota:
+        return processar_nota(tarefa, from_number, url_nota, chaves, extratos)
+
+    if cupom_sem_qr(classificacao):
+        return "❌ Parece um cupom fiscal, mas não consegui ler o QR Code. Envie outra foto com o QR Code inteiro e nítido."
+
+    log.info("Nenhum QR Code. Processando como pedágio (OCR).")
+    with tarefa.etapa("ocr"):
+        leitura = ler_extrato(imagem)
+    lista_transacoes = leitura["transacoes"] if leitura else []
+    if not lista_transacoes and esforco == ESFORCO_QR_MINIMO:
+        # Classificada como extrato, mas o OCR não achou nada: faz as
+        # tentativas de QR que tinham sido puladas antes de desistir.
+        ESCALADAS.inc(etapa="qr")
+        with tarefa.etapa("qr_code"):
+            url_nota = ler_qr_code(obter_pool_detectores(), imagem, esforco=ESFORCO_QR_PADRAO)
+        if url_nota:
+            return processar_nota(tarefa, from_number, url_nota, chaves, extratos)
+    if not leitura:
+        return "❌ Não consegui ler nenhum texto na imagem."
+    if not lista_transacoes:
+        return "❌ Imagem lida, mas não encontrei transações válidas."
+    extratos.append((chaves, [lista_transacoes]))
+    return None
+
+
+# Cupom com QR Code lido: cache pela chave de acesso, dados do QR e página da NFC-e.
+def processar_nota(tarefa, from_number, url_nota, chaves, extratos):
+    log.info("QR Code detectado. Processando como cupom.")
+    # Outra foto do mesmo cupom: a chave de acesso identifica a nota.
+    chave_acesso = extrair_chave_acesso(url_nota)
+    if chave_acesso:
+        chaves.append(f"nfce:{chave_acesso}")
+        em_cache = cache.buscar([f"nfce:{chave_acesso}"])
+        if em_cache:
+            return responder_do_cache(tarefa, em_cache, chaves, from_number, extratos)
+
+    # Chave de acesso e parâmetros do QR: CNPJ, UF, mês e, às vezes, valor e data.
+    dados_qr = decodificar_qr_nfce(url_nota)
+    if ENRIQUECIMENTO_ADIADO and qr_tem_dados_de_lancamento(dados_qr):
+        log.info("Cupom lançado com os dados do QR Code; o nome vem depois.")
+        resultado = {"tipo": "cupom", "dados_nota": dados_nota_do_qr(dados_qr, url_nota)}
+        return lancar_resultado(tarefa, resultado, chaves, from_number)
+
+    with tarefa.etapa("pagina_nfce"):
+        dados_nota = extrair_dados_pagina(url_nota)
+    if dados_nota:
+        log.info("Página da NFC-e obtida.", extra={"fonte": dados_nota["fonte"]})
+        dados_nota = completar_com_qr(dados_nota, dados_qr)
+    elif qr_tem_dados_de_lancamento(dados_qr):
+        dados_nota = dados_nota_do_qr(dados_qr, url_nota)
+    if dados_nota and dados_nota.get('valor_total', 0) > 0:
+        resultado = {"tipo": "cupom", "dados_nota": dados_nota}
+        return lancar_resultado(tarefa, resultado, chaves, from_number)
+    return "❌ QR Code lido, mas falhou ao extrair os dados do site."
+
+
+def responder_do_cache(tarefa, em_cache, chaves, from_number, extratos):
+    if from_number in em_cache["remetentes"]:
+        # Associa as chaves novas (ex.: outra foto do mesmo cupom) ao resultado.
+        cache.salvar(chaves, em_cache["resultado"], from_number)
+        return "⚠️ Esse comprovante já foi lançado na sua planilha. Ignorei para não duplicar."
+    # Já extraído para outra pessoa: reaproveita os dados e só lança na planilha.
+    if em_cache["resultado"]["tipo"] == "pedagio":
+        extratos.append((chaves, [em_cache["resultado"]["transacoes"]]))
+        return None
+    return lancar_resultado(tarefa, em_cache["resultado"], chaves, from_number)
+
+
+def lancar_extratos(tarefa, from_number, extratos):
+    # Cada arquivo fica no cache com as próprias transações; o hash delas
+    # reconhece o mesmo extrato reenviado em outra foto.
+    entradas = []
+    for chaves, paginas in extratos:
+        transacoes_do_arquivo = mesclar_paginas_extrato(paginas)
+        entradas.append((chaves + [chave_do_extrato(transacoes_do_arquivo)],
+                         {"tipo": "pedagio", "transacoes": transacoes_do_arquivo}, paginas))
+
+    # Os arquivos ainda não lançados viram um lote só.
+    def montar(novas):
+        with tarefa.etapa("mesclagem"):
+            transacoes = mesclar_paginas_extrato(pagina for _, _, paginas in novas for pagina in paginas)
+        num_paginas = sum(len(paginas) for _, _, paginas in novas)
+        resposta = f"✅ Extrato com {len(transacoes)} transações processado!"
+        if num_paginas > 1:
+            resposta = f"✅ Extrato com {len(transacoes)} transações ({num_paginas} páginas) processado!"
+        if len(novas) < len(entradas):
+            repetidos = len(entradas) - len(novas)
+            resposta += (f"\n⚠️ {repetidos} arquivo(s) já lançado(s) na sua planilha "
+                         "ficaram de fora para não duplicar.")
+        return transacoes, resposta
+
+    return lancar_transacoes(tarefa, from_number, entradas, montar)
+
+
+def lancar_resultado(tarefa, resultado, chaves, from_number):
+    dados_nota = resultado["dados_nota"]
+    entradas = [(chaves, resultado, None)]
+    if not dados_nota.get("nome_pendente"):
+        resposta = f"✅ Cupom de '{dados_nota['nome_estabelecimento']}' (R$ {dados_nota['valor_total']:.2f}) processado!"
+        return lancar_transacoes(tarefa, from_number, entradas, lambda _: ([transacao_do_cupom(dados_nota)], resposta))
+
+    resposta = (f"✅ Cupom de R$ {dados_nota['valor_total']:.2f} ({dados_nota['data_emissao']}, "
+                f"CNPJ {dados_nota['cnpj']}) processado! O nome do estabelecimento entra na planilha em instantes.")
+
+    def agendar_enriquecimento(ids):
+        fila.enfileirar(enriquecer_cupom, from_number, ids, chaves, resultado)
+
+    return lancar_transacoes(tarefa, from_number, entradas, lambda _: ([transacao_do_cupom(dados_nota)], resposta),
+                             ao_lancar=agendar_enriquecimento)
+
+
+# `entradas`: [(chaves, resultado, dados)] de cada arquivo da mensagem. Só as
+# que este usuário ainda não lançou vão para `montar(novas)`, que devolve
+# (transações, resposta). `ao_lancar(ids)` roda depois de gravar, com os ids
+# das transações novas.
+def lancar_transacoes(tarefa, from_number, entradas, montar, ao_lancar=None):
+    with tarefa.etapa("armazenamento"), armazenamento.bloquear(from_number):
+        # Confere de novo dentro do lock, arquivo a arquivo: dois arquivos
+        # iguais podem chegar juntos, ou um repetido junto com um novo.
+        novas = []
+        for entrada in entradas:
+            em_cache = cache.buscar(entrada[0])
+            if not (em_cache and from_number in em_cache["remetentes"]):
+                novas.append(entrada)
+        if not novas:
+            return "⚠️ Esse comprovante já foi lançado na sua planilha. Ignorei para não duplicar."
+        transacoes, resposta = montar(novas)
+        ids = armazenamento.adicionar_transacoes(from_number, transacoes)
+        # Os repetidos também: as chaves novas (outra foto) ficam associadas.
+        for chaves, resultado, _ in entradas:
+            cache.salvar(chaves, resultado, from_number)
+    if ao_lancar:
+        ao_lancar(ids)
+    return resposta
+
+
+# --- Enriquecimento em segundo plano (tarefa própria da fila) ---
+# Busca na página da NFC-e o nome do estabelecimento de um cupom lançado só
+# com o QR Code e atualiza as transações já gravadas e o cache.
+def enriquecer_cupom(tarefa, from_number, ids, chaves, resultado, tentativa=1):
+    dados_nota = resultado["dados_nota"]
+    with tarefa.etapa("pagina_nfce"):
+        dados_pagina = extrair_dados_pagina(dados_nota["url_qr"])
+    if dados_pagina is None and tentativa < TENTATIVAS_ENRIQUECIMENTO:
+        atraso = obter_agendador_sefaz().tempo_aberto
+        log.info("Portal da NFC-e sem resposta. Enriquecimento reagendado.", extra={
+            "chave_acesso": dados_nota["chave_acesso"], "tentativa": tentativa, "atraso_s": atraso})
+        fila.enfileirar_depois(atraso, enriquecer_cupom, from_number, ids, chaves, resultado,
+                               tentativa=tentativa + 1)
+        return
+    if not dados_pagina or dados_pagina["nome_estabelecimento"] == "NÃO ENCONTRADO":
+        log.warning("Não foi possível obter o nome do estabelecimento; fica o CNPJ.",
+                    extra={"chave_acesso": dados_nota["chave_acesso"]})
+        return
+    dados_enriquecidos = dict(dados_nota, nome_estabelecimento=dados_pagina["nome_estabelecimento"],
+                              fonte=f"qr+{dados_pagina['fonte']}", nome_pendente=False)
+    transacao = transacao_do_cupom(dados_enriquecidos)
+    with tarefa.etapa("armazenamento"), armazenamento.bloquear(from_number):
+        for id_transacao in ids:
+            armazenamento.atualizar_transacao(from_number, id_transacao, {
+                "Estabelecimento": transacao["Estabelecimento"]})
+        cache.salvar(chaves, {"tipo": "cupom", "dados_nota": dados_enriquecidos}, from_number)
+    log.info("Cupom enriquecido com o nome do estabelecimento.", extra={
+        "chave_acesso": dados_nota["chave_acesso"], "transacoes": ids})
+
+
 # O bloco __main__ não é usado no PythonAnywhere, mas é bom para testes locais
 if __name__ == "__main__":
     if not all([ACCOUNT_SID, AUTH_TOKEN]):
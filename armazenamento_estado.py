@@ -0,0 +1,324 @@
+# armazenamento_estado.py
+# Estado das conversas e lançamentos de cada usuário (número do WhatsApp).
+# Substitui o defaultdict em memória: sobrevive a reinícios e pode ser
+# compartilhado por vários workers do gunicorn (SQLite). Para testes existe
+# um backend só em memória com a mesma interface.
+#
+# Interface dos backends:
+#   obter_usuario(numero) -> {"etapa": int, "dados": dict}
+#   salvar_usuario(numero, usuario)
+#   adicionar_transacoes(numero, transacoes) -> lista de ids
+#   listar_transacoes(numero) -> lista de dicts (com "id")
+#   atualizar_transacao(numero, id, campos) -> True se a transação existia
+#   bloquear(numero) -> context manager que serializa as escritas do usuário
+#   agregar(numero, por, inicio, fim, tipo) -> [(chave, quantidade, total)]
+#   iterar_transacoes(numero, inicio, fim, tipo) -> gerador de dicts, por data
+#
+# Data (ISO), tipo de despesa, valor e placa de cada transação ficam também
+# em campos próprios (colunas indexadas no SQLite), então totais e resumos
+# por período não precisam ler o JSON de cada lançamento. `inicio` e `fim`
+# são datas ISO (AAAA-MM-DD), inclusivas; com período, transações sem data
+# reconhecida ficam de fora.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+
+from observabilidade import obter_logger
+from transacao import campos_indexados
+
+
+log = obter_logger("armazenamento")
+
+
+def _usuario_novo():
+    return {"etapa": 0, "dados": {}}
+
+
+def _no_filtro(campos, inicio, fim, tipo):
+    data, tipo_despesa = campos[0], campos[1]
+    if (inicio or fim) and data is None:
+        return False
+    if (inicio and data < inicio) or (fim and data > fim):
+        return False
+    return tipo is None or tipo_despesa == tipo
+
+
+# --- BACKEND EM MEMÓRIA (testes / desenvolvimento) ---
+class ArmazenamentoMemoria:
+    def __init__(self):
+        self._usuarios = {}
+        self._transacoes = defaultdict(list)
+        self._campos = {}
+        self._proximo_id = 1
+        self._lock = threading.Lock()
+        self._locks_usuarios = defaultdict(threading.RLock)
+
+    @contextmanager
+    def bloquear(self, numero):
+        with self._lock:
+            lock_usuario = self._locks_usuarios[numero]
+        with lock_usuario:
+            yield
+
+    def obter_usuario(self, numero):
+        with self._lock:
+            usuario = self._usuarios.get(numero)
+            return json.loads(json.dumps(usuario)) if usuario else _usuario_novo()
+
+    def salvar_usuario(self, numero, usuario):
+        with self._lock:
+            self._usuarios[numero] = json.loads(json.dumps(usuario))
+
+    def adicionar_transacoes(self, numero, transacoes):
+        ids = []
+        with self._lock:
+            for transacao in transacoes:
+                registro = dict(transacao, id=self._proximo_id)
+                self._transacoes[numero].append(registro)
+                self._campos[self._proximo_id] = campos_indexados(registro)
+                ids.append(self._proximo_id)
+                self._proximo_id += 1
+        return ids
+
+    def listar_transacoes(self, numero):
+        with self._lock:
+            return [dict(t) for t in self._transacoes[numero]]
+
+    def atualizar_transacao(self, numero, id_transacao, campos):
+        with self._lock:
+            for transacao in self._transacoes[numero]:
+                if transacao["id"] == id_transacao:
+                    transacao.update(campos)
+                    self._campos[id_transacao] = campos_indexados(transacao, self._data_de(id_transacao))
+                    return True
+        return False
+
+    def _data_de(self, id_transacao):
+        data = self._campos[id_transacao][0]
+        return date.fromisoformat(data) if data else None
+
+    def _filtradas(self, numero, inicio, fim, tipo):
+        with self._lock:
+            return [(dict(t), self._campos[t["id"]]) for t in self._transacoes[numero]
+                    if _no_filtro(self._campos[t["id"]], inicio, fim, tipo)]
+
+    def agregar(self, numero, por="tipo", inicio=None, fim=None, tipo=None):
+        indice = {"tipo": 1, "dia": 0, "mes": 0, "placa": 3}.get(por)
+        grupos = {}
+        for _, campos in self._filtradas(numero, inicio, fim, tipo):
+            chave = campos[indice] if indice is not None else None
+            if por == "mes" and chave:
+                chave = chave[:7]
+            quantidade, total = grupos.get(chave, (0, 0.0))
+            grupos[chave] = (quantidade + 1, total + (campos[2] or 0.0))
+        return sorted(((chave, n, round(total, 2)) for chave, (n, total) in grupos.items()),
+                      key=lambda grupo: (grupo[0] is None, grupo[0] or ""))
+
+    def iterar_transacoes(self, numero, inicio=None, fim=None, tipo=None):
+        filtradas = self._filtradas(numero, inicio, fim, tipo)
+        filtradas.sort(key=lambda item: (item[1][0] or "", item[0]["id"]))
+        for transacao, _ in filtradas:
+            yield transacao
+
+
+# --- BACKEND SQLITE (padrão) ---
+class ArmazenamentoSQLite:
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._locks_usuarios = defaultdict(threading.RLock)
+        self._lock = threading.Lock()
+        conexao = self._conexao()
+        conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS usuarios (
+                numero TEXT PRIMARY KEY,
+                etapa INTEGER NOT NULL,
+                dados TEXT NOT NULL,
+                atualizado_em REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS transacoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                numero TEXT NOT NULL,
+                dados TEXT NOT NULL,
+                criado_em REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_transacoes_numero ON transacoes (numero, id);
+        """)
+        self._migrar_campos_indexados()
+
+    # Bancos criados antes das colunas indexadas: adiciona as colunas e
+    # preenche a partir do JSON (uma vez, em lotes).
+    def _migrar_campos_indexados(self):
+        with self._transacao() as conexao:
+            colunas = {linha[1] for linha in conexao.execute("PRAGMA table_info(transacoes)")}
+            for coluna, tipo in (("data", "TEXT"), ("tipo", "TEXT"), ("valor", "REAL"), ("placa", "TEXT"),
+                                 ("indexada", "INTEGER NOT NULL DEFAULT 0")):
+                if coluna not in colunas:
+                    conexao.execute(f"ALTER TABLE transacoes ADD COLUMN {coluna} {tipo}")
+            # Índices de cobertura: total e resumo por período (e por tipo)
+            # saem só do índice, sem tocar nas linhas.
+            conexao.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_periodo "
+                            "ON transacoes (numero, data, tipo, placa, valor)")
+            conexao.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_tipo ON transacoes (numero, tipo, data, valor)")
+            migradas, ultimo_id = 0, 0
+            while True:
+                linhas = conexao.execute(
+                    "SELECT id, dados, criado_em FROM transacoes WHERE id > ? AND indexada = 0 ORDER BY id LIMIT 1000",
+                    (ultimo_id,)).fetchall()
+                if not linhas:
+                    break
+                ultimo_id = linhas[-1][0]
+                conexao.executemany(
+                    "UPDATE transacoes SET data = ?, tipo = ?, valor = ?, placa = ?, indexada = 1 WHERE id = ?",
+                    [(*campos_indexados(json.loads(dados), date.fromtimestamp(criado_em)), id_transacao)
+                     for id_transacao, dados, criado_em in linhas])
+                migradas += len(linhas)
+        if migradas:
+            log.info("Transações antigas indexadas.", extra={"transacoes": migradas})
+
+    # Uma conexão por thread; o modo WAL deixa leitores e o escritor em paralelo.
+    def _conexao(self):
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+            self._local.profundidade = 0
+        return conexao
+
+    @contextmanager
+    def _transacao(self):
+        conexao = self._conexao()
+        if self._local.profundidade:
+            # Já dentro de bloquear(): a escrita entra na mesma transação.
+            yield conexao
+            return
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            yield conexao
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+
+    # Serializa o usuário entre threads (RLock) e entre processos (BEGIN IMMEDIATE
+    # segura o lock de escrita do SQLite até o fim do bloco).
+    @contextmanager
+    def bloquear(self, numero):
+        with self._lock:
+            lock_usuario = self._locks_usuarios[numero]
+        with lock_usuario:
+            conexao = self._conexao()
+            if self._local.profundidade:
+                self._local.profundidade += 1
+                try:
+                    yield
+                finally:
+                    self._local.profundidade -= 1
+                return
+            conexao.execute("BEGIN IMMEDIATE")
+            self._local.profundidade = 1
+            try:
+                yield
+                conexao.execute("COMMIT")
+            except Exception:
+                conexao.execute("ROLLBACK")
+                raise
+            finally:
+                self._local.profundidade = 0
+
+    def obter_usuario(self, numero):
+        linha = self._conexao().execute(
+            "SELECT etapa, dados FROM usuarios WHERE numero = ?", (numero,)).fetchone()
+        if not linha:
+            return _usuario_novo()
+        return {"etapa": linha[0], "dados": json.loads(linha[1])}
+
+    def salvar_usuario(self, numero, usuario):
+        with self._transacao() as conexao:
+            conexao.execute(
+                """INSERT INTO usuarios (numero, etapa, dados, atualizado_em) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(numero) DO UPDATE SET
+                       etapa = excluded.etapa, dados = excluded.dados,
+                       atualizado_em = excluded.atualizado_em""",
+                (numero, usuario["etapa"], json.dumps(usuario["dados"], ensure_ascii=False), time.time()))
+
+    def adicionar_transacoes(self, numero, transacoes):
+        ids = []
+        agora = time.time()
+        hoje = date.fromtimestamp(agora)
+        with self._transacao() as conexao:
+            for transacao in transacoes:
+                cursor = conexao.execute(
+                    """INSERT INTO transacoes (numero, dados, criado_em, data, tipo, valor, placa, indexada)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, 1)""",
+                    (numero, json.dumps(transacao, ensure_ascii=False), agora, *campos_indexados(transacao, hoje)))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def listar_transacoes(self, numero):
+        linhas = self._conexao().execute(
+            "SELECT id, dados FROM transacoes WHERE numero = ? ORDER BY id", (numero,)).fetchall()
+        return [dict(json.loads(dados), id=id_transacao) for id_transacao, dados in linhas]
+
+    def atualizar_transacao(self, numero, id_transacao, campos):
+        with self._transacao() as conexao:
+            linha = conexao.execute(
+                "SELECT dados, criado_em FROM transacoes WHERE id = ? AND numero = ?",
+                (id_transacao, numero)).fetchone()
+            if not linha:
+                return False
+            dados = dict(json.loads(linha[0]), **campos)
+            conexao.execute(
+                "UPDATE transacoes SET dados = ?, data = ?, tipo = ?, valor = ?, placa = ? WHERE id = ?",
+                (json.dumps(dados, ensure_ascii=False), *campos_indexados(dados, date.fromtimestamp(linha[1])),
+                 id_transacao))
+        return True
+
+    @staticmethod
+    def _filtro(numero, inicio, fim, tipo):
+        condicoes, parametros = ["numero = ?"], [numero]
+        if inicio or fim:
+            condicoes.append("data BETWEEN ? AND ?")
+            parametros += [inicio or "0000-00-00", fim or "9999-99-99"]
+        if tipo is not None:
+            condicoes.append("tipo = ?")
+            parametros.append(tipo)
+        return " AND ".join(condicoes), parametros
+
+    def agregar(self, numero, por="tipo", inicio=None, fim=None, tipo=None):
+        chave = {"tipo": "tipo", "dia": "data", "mes": "substr(data, 1, 7)", "placa": "placa", "total": "NULL"}[por]
+        onde, parametros = self._filtro(numero, inicio, fim, tipo)
+        linhas = self._conexao().execute(
+            f"""SELECT {chave} AS chave, COUNT(*), ROUND(COALESCE(SUM(valor), 0), 2) FROM transacoes
+                WHERE {onde} GROUP BY chave ORDER BY chave IS NULL, chave""", parametros).fetchall()
+        return [tuple(linha) for linha in linhas]
+
+    # Lê em lotes (fetchmany): o relatório de um período grande não fica
+    # inteiro na memória.
+    def iterar_transacoes(self, numero, inicio=None, fim=None, tipo=None, lote=1000):
+        onde, parametros = self._filtro(numero, inicio, fim, tipo)
+        cursor = self._conexao().cursor()
+        cursor.execute(f"SELECT id, dados FROM transacoes WHERE {onde} ORDER BY data, id", parametros)
+        try:
+            while (linhas := cursor.fetchmany(lote)):
+                for id_transacao, dados in linhas:
+                    yield dict(json.loads(dados), id=id_transacao)
+        finally:
+            cursor.close()
+
+
+def criar_armazenamento(pasta_base):
+    backend = os.environ.get("ARMAZENAMENTO", "sqlite").lower()
+    if backend == "memoria":
+        log.warning("Usando armazenamento em memória (o estado se perde ao reiniciar).")
+        return ArmazenamentoMemoria()
+    caminho = os.environ.get("ARMAZENAMENTO_DB", os.path.join(pasta_base, "estado_usuarios.db"))
+    return ArmazenamentoSQLite(caminho)
@@ -0,0 +1,112 @@
+# baixador_midias.py
+# Download das mídias que a Twilio manda no webhook (MediaUrl0..N).
+# Uma sessão compartilhada mantém as conexões abertas (keep-alive) com o host
+# de mídia da Twilio e com o armazenamento para onde ele redireciona. Toda
+# requisição tem timeout e as falhas de rede ou 5xx são repetidas com backoff.
+# O corpo é lido em streaming para um buffer limitado: arquivos acima do
+# tamanho máximo são abortados sem ler o resto. As mídias da mesma mensagem
+# são baixadas em paralelo.
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from observabilidade import medir, obter_logger
+
+
+log = obter_logger("download")
+
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+class MidiaGrandeDemais(Exception):
+    pass
+
+
+class BaixadorMidias:
+    def __init__(self, tamanho_max=None, timeout=None, tentativas=None, simultaneos=None):
+        self.tamanho_max = tamanho_max or int(
+            float(os.environ.get("TAMANHO_MAX_MIDIA_MB", 16)) * 1024 * 1024)
+        # (conexão, leitura): a leitura vale para cada bloco, não para o arquivo inteiro.
+        self.timeout = timeout or (float(os.environ.get("TIMEOUT_CONEXAO_MIDIA", 5)),
+                                   float(os.environ.get("TIMEOUT_LEITURA_MIDIA", 30)))
+        self.tentativas = tentativas if tentativas is not None else int(
+            os.environ.get("TENTATIVAS_DOWNLOAD_MIDIA", 3))
+        self.simultaneos = simultaneos or int(os.environ.get("DOWNLOADS_SIMULTANEOS", 4))
+        self.sessao = self._criar_sessao()
+        self._executor = ThreadPoolExecutor(max_workers=self.simultaneos,
+                                            thread_name_prefix="download-midia")
+
+    # requests/urllib3 são importados só quando o primeiro download acontece.
+    def _criar_sessao(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        retry = Retry(total=self.tentativas, connect=self.tentativas, read=self.tentativas,
+                      status=self.tentativas, backoff_factor=0.5,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(["GET"]), respect_retry_after_header=True,
+                      raise_on_status=False)
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=self.simultaneos * 2, max_retries=retry)
+        sessao = requests.Session()
+        sessao.mount("http://", adaptador)
+        sessao.mount("https://", adaptador)
+        return sessao
+
+    # Retorna os bytes da mídia. Levanta MidiaGrandeDemais acima do limite e
+    # requests.RequestException nas falhas que sobraram depois das tentativas.
+    def baixar(self, url, auth=None):
+        with medir("download_midia"):
+            conteudo = self._baixar(url, auth)
+        log.info("Mídia baixada.", extra={"bytes": len(conteudo)})
+        return conteudo
+
+    def _baixar(self, url, auth):
+        with self.sessao.get(url, auth=auth, timeout=self.timeout, stream=True) as r:
+            r.raise_for_status()
+            tamanho_declarado = int(r.headers.get("Content-Length") or 0)
+            if tamanho_declarado > self.tamanho_max:
+                raise MidiaGrandeDemais(
+                    f"Mídia com {tamanho_declarado} bytes (limite de {self.tamanho_max}).")
+            buffer = bytearray()
+            for bloco in r.iter_content(TAMANHO_BLOCO):
+                buffer += bloco
+                # Content-Length pode faltar (chunked) ou mentir: confere o que chegou.
+                if len(buffer) > self.tamanho_max:
+                    raise MidiaGrandeDemais(f"Mídia passou do limite de {self.tamanho_max} bytes.")
+            return bytes(buffer)
+
+    # Baixa várias URLs ao mesmo tempo. Retorna, na ordem das URLs, os bytes de
+    # cada mídia ou a exceção que impediu o download (uma falha não derruba as outras).
+    def baixar_varias(self, urls, auth=None):
+        # Cada download roda numa cópia do contexto (id da requisição nos logs).
+        futuros = [self._executor.submit(contextvars.copy_context().run, self.baixar, url, auth)
+                   for url in urls]
+        resultados = []
+        for futuro in futuros:
+            try:
+                resultados.append(futuro.result())
+            except Exception as e:
+                resultados.append(e)
+        return resultados
+
+    def fechar(self):
+        self._executor.shutdown(wait=False)
+        self.sessao.close()
+
+
+_baixador = None
+_baixador_pid = None
+_baixador_lock = threading.Lock()
+
+
+def obter_baixador():
+    global _baixador, _baixador_pid
+    with _baixador_lock:
+        # Threads e conexões abertas não atravessam um fork: recria por processo.
+        if _baixador is None or _baixador_pid != os.getpid():
+            _baixador = BaixadorMidias()
+            _baixador_pid = os.getpid()
+        return _baixador
@@ -0,0 +1,201 @@
+# benchmarks/benchmark_agendador_sefaz.py
+# Sobe um portal de NFC-e falso (servidor HTTP local) que limita a carga como
+# os portais da SEFAZ (429 acima de N requisições simultâneas ou por segundo)
+# e pode ficar instável ou fora do ar, e confere o agendador por host:
+#   - rajada: muitos cupons ao mesmo tempo, com URLs repetidas; compara
+#     chamadas diretas com o agendador (429, requisições no portal, tempo);
+#   - instável: cada página falha uma vez; as novas tentativas resolvem;
+#   - fora do ar: o disjuntor abre e os pedidos falham rápido sem chegar ao
+#     portal; quando ele volta, o pedido de teste fecha o disjuntor.
+#
+# Uso:
+#   python benchmarks/benchmark_agendador_sefaz.py --cupons 60 --threads 30
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PASTA_RAIZ)
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "ERROR")
+
+from agendador_sefaz import AgendadorSefaz, Disjuntor  # noqa: E402
+from processador_cupom import analisar_html_cupom, baixar_html_http  # noqa: E402
+
+
+CHAVE_SP = "35250312345678000190650010000043211123456789"
+
+with open(os.path.join(PASTA_RAIZ, "benchmarks", "corpus_nfce", "sp_portal_padrao.html"), encoding="utf-8") as f:
+    PAGINA = f.read().encode("utf-8")
+
+
+class _PortalFalso(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latencia = 0.1
+    max_simultaneas = 4
+    max_por_segundo = 10
+    fora_do_ar = False
+    falhas_por_pagina = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def zerar(cls):
+        cls.em_andamento = 0
+        cls.pico_simultaneas = 0
+        cls.requisicoes = 0
+        cls.respostas_429 = 0
+        cls.instantes = []
+        cls.falhas_pendentes = {}
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            agora = time.monotonic()
+            cls.requisicoes += 1
+            cls.em_andamento += 1
+            cls.pico_simultaneas = max(cls.pico_simultaneas, cls.em_andamento)
+            cls.instantes = [t for t in cls.instantes if agora - t < 1.0] + [agora]
+            sobrecarga = cls.em_andamento > cls.max_simultaneas or len(cls.instantes) > cls.max_por_segundo
+            cls.respostas_429 += sobrecarga
+            pendentes = cls.falhas_pendentes.setdefault(self.path, cls.falhas_por_pagina)
+            falhar = cls.fora_do_ar or pendentes > 0
+            if pendentes > 0:
+                cls.falhas_pendentes[self.path] -= 1
+        try:
+            time.sleep(cls.latencia)
+            if sobrecarga:
+                self._responder(429, b"muitas requisicoes")
+            elif falhar:
+                self._responder(503, b"indisponivel")
+            else:
+                self._responder(200, PAGINA)
+        finally:
+            with cls.lock:
+                cls.em_andamento -= 1
+
+    def _responder(self, status, corpo):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+def _subir_portal():
+    _PortalFalso.zerar()
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _PortalFalso)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+def _url(base, i):
+    return f"{base}/qrcode?p={CHAVE_SP}|2|1|{i}|abc"
+
+
+def _consultar(consulta, url):
+    try:
+        return analisar_html_cupom(consulta(url), url)["valor_total"] > 0, None
+    except Exception as e:
+        return False, type(e).__name__
+
+
+def rodar(consulta, urls, threads):
+    _PortalFalso.zerar()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        resultados = list(executor.map(lambda url: _consultar(consulta, url), urls))
+    return {
+        "ok": sum(ok for ok, _ in resultados),
+        "erros": sorted({erro for _, erro in resultados if erro}),
+        "requisicoes": _PortalFalso.requisicoes,
+        "429": _PortalFalso.respostas_429,
+        "pico": _PortalFalso.pico_simultaneas,
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+def _linha(nome, r, total):
+    print(f"{nome:<28}{r['ok']:>4}/{total:<4}{r['requisicoes']:>13}{r['429']:>6}{r['pico']:>6}"
+          f"{r['segundos']:>10.2f}  {', '.join(r['erros'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Agendador por host contra um portal de NFC-e falso.")
+    parser.add_argument("--cupons", type=int, default=60)
+    parser.add_argument("--repetidos", type=int, default=3, help="Pedidos por URL (coalescência).")
+    parser.add_argument("--threads", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    servidor, base = _subir_portal()
+    urls = [_url(base, i // args.repetidos) for i in range(args.cupons)]
+    distintas = len(set(urls))
+    falhas = []
+
+    def novo_agendador(**kwargs):
+        parametros = dict(taxa=5, rajada=4, max_simultaneas=4, tentativas=2, limite_falhas=3,
+                          tempo_aberto=0.5, espera_max=30, backoff=0.05)
+        parametros.update(kwargs)
+        agendador = AgendadorSefaz(**parametros)
+        return agendador, lambda url: agendador.executar(url, baixar_html_http, url, camada="http")
+
+    print(f"portal: até {_PortalFalso.max_simultaneas} simultâneas e {_PortalFalso.max_por_segundo}/s, "
+          f"{_PortalFalso.latencia * 1000:.0f} ms por página; {args.cupons} cupons, {distintas} URLs distintas\n")
+    print(f"{'cenário':<28}{'ok':>9}{'requisições':>13}{'429':>6}{'pico':>6}{'segundos':>10}  erros")
+
+    # --- Rajada ---
+    direto = rodar(baixar_html_http, urls, args.threads)
+    _linha("rajada/direto", direto, args.cupons)
+    _, consulta = novo_agendador()
+    agendado = rodar(consulta, urls, args.threads)
+    _linha("rajada/agendador", agendado, args.cupons)
+    if agendado["ok"] != args.cupons or agendado["429"] or agendado["requisicoes"] > distintas:
+        falhas.append("rajada: o agendador deveria atender tudo sem 429 e uma requisição por URL")
+
+    # --- Instável: cada página falha uma vez ---
+    _PortalFalso.falhas_por_pagina = 1
+    _, consulta = novo_agendador(limite_falhas=1000)
+    instavel = rodar(consulta, urls, args.threads)
+    _linha("instável/agendador", instavel, args.cupons)
+    if instavel["ok"] != args.cupons:
+        falhas.append("instável: as novas tentativas deveriam resolver todas as páginas")
+    _PortalFalso.falhas_por_pagina = 0
+
+    # --- Fora do ar ---
+    _PortalFalso.fora_do_ar = True
+    agendador, consulta = novo_agendador(tentativas=1)
+    fora = rodar(consulta, urls, args.threads)
+    _linha("fora do ar/agendador", fora, args.cupons)
+    # Só os pedidos que já estavam no portal quando o disjuntor abriu chegam lá.
+    if (fora["requisicoes"] > agendador.limite_falhas + agendador.max_simultaneas
+            or "PortalIndisponivel" not in fora["erros"]):
+        falhas.append("fora do ar: o disjuntor deveria abrir e barrar os pedidos antes do portal")
+    _PortalFalso.fora_do_ar = False
+    time.sleep(agendador.tempo_aberto)
+    volta = rodar(consulta, urls[:1] * 5, 5)
+    host = next(iter(agendador.estatisticas()))
+    _linha("volta do portal/agendador", volta, 5)
+    if agendador.estatisticas()[host] != Disjuntor.FECHADO or not volta["ok"]:
+        falhas.append("volta: o pedido de teste deveria fechar o disjuntor")
+    if not _consultar(consulta, urls[0])[0]:
+        falhas.append("volta: pedido barrado com o disjuntor fechado")
+
+    servidor.shutdown()
+    print()
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    if not falhas:
+        print("OK    limites, coalescência, novas tentativas e disjuntor")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
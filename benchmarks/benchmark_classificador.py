@@ -0,0 +1,175 @@
+# benchmarks/benchmark_classificador.py
+# Mede o classificador de mídia (classificador_midia.py) num conjunto
+# sintético: fotos de cupom do teste de carga do webhook, as fotos de cupom em
+# 4000x3000 e as folhas de extrato do benchmark de pré-processamento, e
+# capturas de extrato de pedágio.
+# Para cada imagem: tipo previsto x esperado, tempo da classificação e, na
+# detecção de QR, tentativas e tempo sem o classificador (escada padrão) e
+# com ele (esforço escolhido pela classificação). Com o Tesseract instalado,
+# mede também a leitura do extrato sem e com a escalada de OCR por confiança
+# e, para o extrato que não vira transações, a volta às tentativas de QR.
+#
+# Uso:
+#   python benchmarks/benchmark_classificador.py
+#   python benchmarks/benchmark_classificador.py --usuarios 10 --saida classificador.json
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PASTA_RAIZ)
+sys.path.insert(0, os.path.join(PASTA_RAIZ, "benchmarks"))
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+import classificador_midia  # noqa: E402
+from benchmark_preprocessamento import gerar_amostras_sinteticas  # noqa: E402
+from benchmark_webhook import gerar_cupom, gerar_pedagio  # noqa: E402
+from processador_cupom import configurar_detector_wechat  # noqa: E402
+from processador_imagem import (ESFORCO_QR_MINIMO, ESFORCO_QR_PADRAO, carregar_imagem,  # noqa: E402
+                                decodificar_imagem, tentativas_qr)
+
+URL_SEFAZ = "https://www.nfce.fazenda.sp.gov.br/qrcode"
+
+
+def gerar_conjunto(usuarios):
+    amostras = []
+    for usuario in range(1, usuarios + 1):
+        amostras.append((f"webhook_cupom_{usuario}", classificador_midia.CUPOM,
+                         decodificar_imagem(gerar_cupom(usuario, URL_SEFAZ))))
+        amostras.append((f"webhook_pedagio_{usuario}", classificador_midia.PEDAGIO,
+                         decodificar_imagem(gerar_pedagio(usuario))))
+    pasta = tempfile.mkdtemp(prefix="amostras_classificador_")
+    for nome, alvo in sorted(gerar_amostras_sinteticas(pasta).items()):
+        esperado = classificador_midia.CUPOM if "qr" in alvo else classificador_midia.PEDAGIO
+        amostras.append((nome.rsplit(".", 1)[0], esperado, carregar_imagem(os.path.join(pasta, nome))))
+    return amostras
+
+
+# Percorre a escada de tentativas como ler_qr_code; retorna (segundos, tentativas, achou).
+def detectar_qr(detector, imagem, esforco):
+    inicio = time.perf_counter()
+    tentativas = 0
+    for _, matriz in tentativas_qr(imagem, esforco=esforco):
+        tentativas += 1
+        codigos, _ = detector.detectAndDecode(matriz)
+        if codigos:
+            return time.perf_counter() - inicio, tentativas, True
+    return time.perf_counter() - inicio, tentativas, False
+
+
+def _tesseract_disponivel():
+    import numpy as np
+    try:
+        from processador_pedagio import reconhecer_texto
+        reconhecer_texto(np.full((40, 120), 255, np.uint8))
+        return True
+    except Exception:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classificador de mídia: acerto e custo evitado no QR e no OCR.")
+    parser.add_argument("--usuarios", type=int, default=6, help="Fotos de cupom e de extrato do webhook.")
+    parser.add_argument("--saida", help="Grava o relatório JSON neste arquivo.")
+    args = parser.parse_args(argv)
+
+    amostras = gerar_conjunto(args.usuarios)
+    detector = configurar_detector_wechat()
+    ocr = _tesseract_disponivel()
+    if ocr:
+        from processador_pedagio import ler_extrato
+    else:
+        print("AVISO: Tesseract indisponível; a escalada de OCR não será medida.")
+
+    linhas = []
+    print(f"{'imagem':<26}{'esperado':<10}{'previsto':<14}{'conf':>6}{'class_ms':>10}"
+          f"{'qr_antes':>14}{'qr_depois':>14}" + (f"{'ocr_1x':>14}{'ocr_escalada':>16}" if ocr else ""))
+    for nome, esperado, imagem in amostras:
+        inicio = time.perf_counter()
+        classificacao = classificador_midia.classificar_imagem(imagem)
+        tempo_classificacao = time.perf_counter() - inicio
+        esforco = classificador_midia.esforco_qr(classificacao)
+
+        antes = detectar_qr(detector, imagem, ESFORCO_QR_PADRAO)
+        depois = detectar_qr(detector, imagem, esforco)
+        linha = {
+            "imagem": nome, "esperado": esperado, "previsto": classificacao["tipo"],
+            "confianca": classificacao["confianca"], "classificacao_ms": tempo_classificacao * 1000,
+            "qr_antes": {"ms": antes[0] * 1000, "tentativas": antes[1], "achou": antes[2]},
+            "qr_depois": {"ms": depois[0] * 1000, "tentativas": depois[1], "achou": depois[2]},
+        }
+        if ocr and not depois[2]:
+            inicio = time.perf_counter()
+            simples = ler_extrato(imagem, escalar=False)
+            tempo_simples = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            escalada = ler_extrato(imagem)
+            tempo_escalada = time.perf_counter() - inicio
+            linha["ocr_1x"] = {"ms": tempo_simples * 1000, "transacoes": len(simples["transacoes"]) if simples else 0}
+            linha["ocr_escalada"] = {"ms": tempo_escalada * 1000,
+                                     "transacoes": len(escalada["transacoes"]) if escalada else 0,
+                                     "tentativa": escalada["tentativa"] if escalada else None}
+            # Extrato que não virou transações: o app refaz o QR com a escada padrão.
+            if esforco == ESFORCO_QR_MINIMO and not linha["ocr_escalada"]["transacoes"]:
+                extra = detectar_qr(detector, imagem, ESFORCO_QR_PADRAO)
+                linha["qr_escalada"] = {"ms": extra[0] * 1000, "tentativas": extra[1], "achou": extra[2]}
+        linhas.append(linha)
+
+        def qr_txt(qr):
+            return f"{qr['ms']:.0f}ms/{qr['tentativas']}{'' if qr['achou'] else '-'}"
+        texto = (f"{nome:<26}{esperado:<10}{classificacao['tipo']:<14}{classificacao['confianca']:>6.2f}"
+                 f"{tempo_classificacao * 1000:>10.1f}{qr_txt(linha['qr_antes']):>14}{qr_txt(linha['qr_depois']):>14}")
+        if "ocr_1x" in linha:
+            texto += (f"{linha['ocr_1x']['ms']:>10.0f}ms/{linha['ocr_1x']['transacoes']}"
+                      f"{linha['ocr_escalada']['ms']:>12.0f}ms/{linha['ocr_escalada']['transacoes']}")
+        print(texto)
+
+    # Erro caro é mandar um cupom para o esforço mínimo (ou o contrário): só
+    # classificações confiantes contam como erro; "desconhecido" cai no fluxo de sempre.
+    confiantes = [l for l in linhas if l["previsto"] != classificador_midia.DESCONHECIDO
+                  and l["confianca"] >= classificador_midia.LIMIAR_CONFIANCA]
+    erros = [l for l in confiantes if l["previsto"] != l["esperado"]]
+    perdidos = [l for l in linhas if l["qr_antes"]["achou"] and not l["qr_depois"]["achou"]
+                and not l.get("qr_escalada", {}).get("achou")]
+    escaladas = [l["qr_escalada"] for l in linhas if "qr_escalada" in l]
+    relatorio = {
+        "imagens": len(linhas),
+        "acerto": round(sum(l["previsto"] == l["esperado"] for l in linhas) / len(linhas), 3),
+        "cobertura_confiante": round(len(confiantes) / len(linhas), 3),
+        "erros_confiantes": [l["imagem"] for l in erros],
+        "qr_perdidos": [l["imagem"] for l in perdidos],
+        "classificacao_ms_media": round(statistics.mean(l["classificacao_ms"] for l in linhas), 2),
+        "qr_ms_antes": round(sum(l["qr_antes"]["ms"] for l in linhas), 1),
+        "qr_ms_depois": round(sum(l["qr_depois"]["ms"] + l["classificacao_ms"] for l in linhas), 1),
+        "qr_tentativas_antes": sum(l["qr_antes"]["tentativas"] for l in linhas),
+        "qr_tentativas_depois": sum(l["qr_depois"]["tentativas"] for l in linhas),
+        "qr_escaladas": len(escaladas),
+        "qr_ms_escaladas": round(sum(e["ms"] for e in escaladas), 1),
+    }
+    print()
+    print(f"acerto {relatorio['acerto']:.0%}, confiantes {relatorio['cobertura_confiante']:.0%}, "
+          f"classificação {relatorio['classificacao_ms_media']:.1f} ms em média")
+    print(f"QR: {relatorio['qr_tentativas_antes']} tentativas / {relatorio['qr_ms_antes']:.0f} ms sem o classificador, "
+          f"{relatorio['qr_tentativas_depois']} / {relatorio['qr_ms_depois']:.0f} ms com ele (classificação incluída)")
+    if ocr:
+        print(f"QR refeito após OCR sem transações: {relatorio['qr_escaladas']} imagens, "
+              f"{relatorio['qr_ms_escaladas']:.0f} ms")
+    for nome in relatorio["erros_confiantes"]:
+        print(f"FALHA {nome}: classificação confiante errada")
+    for nome in relatorio["qr_perdidos"]:
+        print(f"FALHA {nome}: QR lido sem o classificador e perdido com ele")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"resumo": relatorio, "imagens": linhas}, f, ensure_ascii=False, indent=2)
+    return 1 if erros or perdidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# benchmarks/benchmark_detector_concorrente.py
+# Teste de carga do detector WeChat sob threads concorrentes. Compara:
+#   - compartilhado: uma única instância protegida por um lock (o jeito seguro
+#     de compartilhar um detector que não é thread-safe);
+#   - pool: PoolDetectores com uma instância por thread (empréstimo/devolução).
+# Confere que todas as leituras devolvem a URL certa e mede a vazão.
+#
+# Uso:
+#   python benchmarks/benchmark_detector_concorrente.py --threads 1 2 4 8 --imagens 64
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+from processador_cupom import PoolDetectores, configurar_detector_wechat, ler_qr_code  # noqa: E402
+from processador_imagem import ImagemDecodificada  # noqa: E402
+
+
+URL = "https://www.nfce.fazenda.sp.gov.br/qrcode?p=35250212345678000190650010000012341000012345|2|1|1|abc"
+
+
+def gerar_fotos(quantidade):
+    qr = cv2.QRCodeEncoder.create().encode(URL)
+    fotos = []
+    for i in range(quantidade):
+        foto = np.full((1200, 1600, 3), 235, np.uint8)
+        lado = 220 + (i % 4) * 40
+        qr_grande = cv2.resize(qr, (lado, lado), interpolation=cv2.INTER_NEAREST)
+        y, x = 300 + (i % 3) * 120, 400 + (i % 5) * 150
+        foto[y:y + lado, x:x + lado] = cv2.cvtColor(qr_grande, cv2.COLOR_GRAY2BGR)
+        fotos.append(ImagemDecodificada(foto))
+    return fotos
+
+
+class _DetectorComLock:
+    def __init__(self, detector):
+        self._detector = detector
+        self._lock = threading.Lock()
+
+    def detectAndDecode(self, matriz):
+        with self._lock:
+            return self._detector.detectAndDecode(matriz)
+
+
+def rodar(detector, fotos, threads):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        resultados = list(executor.map(lambda foto: ler_qr_code(detector, foto), fotos))
+    duracao = time.perf_counter() - inicio
+    erros = sum(1 for r in resultados if r != URL)
+    return len(fotos) / duracao, erros
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vazão do detector WeChat com threads concorrentes.")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--imagens", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    fotos = gerar_fotos(args.imagens)
+    compartilhado = _DetectorComLock(configurar_detector_wechat())
+    print(f"{args.imagens} fotos 1600x1200, {os.cpu_count()} núcleos\n")
+    print(f"{'threads':>7}{'compartilhado (img/s)':>24}{'pool (img/s)':>15}{'ganho':>8}")
+    falhas = 0
+    for threads in args.threads:
+        pool = PoolDetectores(threads)
+        vazao_compartilhado, erros_compartilhado = rodar(compartilhado, fotos, threads)
+        vazao_pool, erros_pool = rodar(pool, fotos, threads)
+        falhas += erros_compartilhado + erros_pool
+        print(f"{threads:>7}{vazao_compartilhado:>24.1f}{vazao_pool:>15.1f}"
+              f"{vazao_pool / vazao_compartilhado:>7.2f}x"
+              + (f"  ({erros_compartilhado}/{erros_pool} leituras erradas)" if erros_compartilhado or erros_pool else ""))
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
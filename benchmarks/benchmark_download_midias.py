@@ -0,0 +1,131 @@
+# benchmarks/benchmark_download_midias.py
+# Sobe um servidor HTTP local que imita o host de mídia da Twilio (latência
+# por requisição, 503 intermitente, arquivo acima do limite) e confere o
+# baixador: repetição com backoff, corte por tamanho, reaproveitamento de
+# conexões e ganho do download em paralelo sobre o sequencial.
+#
+# Uso:
+#   python benchmarks/benchmark_download_midias.py --midias 5 --latencia 0.2
+
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PASTA_RAIZ)
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+from baixador_midias import BaixadorMidias, MidiaGrandeDemais  # noqa: E402
+
+
+TAMANHO_MIDIA = 300 * 1024
+
+
+class _StubTwilio(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latencia = 0.0
+    conexoes = set()
+    falhas_pendentes = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        # O cliente derruba a conexão de propósito quando corta a mídia grande.
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass
+
+    def do_GET(self):
+        with self.lock:
+            self.conexoes.add(self.client_address)
+            falhar = self.falhas_pendentes.get(self.path, 0) > 0
+            if falhar:
+                self.falhas_pendentes[self.path] -= 1
+        time.sleep(self.latencia)
+        if falhar:
+            self._responder(503, b"indisponivel")
+        elif self.path.startswith("/grande"):
+            # Sem Content-Length (chunked): o limite tem que ser conferido durante a leitura.
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            bloco = b"x" * 65536
+            try:
+                for _ in range(64):
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(bloco), bloco))
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            self._responder(200, b"\xff\xd8" + b"\0" * (TAMANHO_MIDIA - 2))
+
+    def _responder(self, status, corpo):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+def _subir_servidor(latencia):
+    _StubTwilio.latencia = latencia
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _StubTwilio)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Confere e mede o download das mídias.")
+    parser.add_argument("--midias", type=int, default=5, help="Mídias por mensagem.")
+    parser.add_argument("--latencia", type=float, default=0.2, help="Latência simulada por requisição (s).")
+    parser.add_argument("--rodadas", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    servidor, base = _subir_servidor(args.latencia)
+    baixador = BaixadorMidias(tamanho_max=1024 * 1024, simultaneos=args.midias)
+    falhas = 0
+
+    _StubTwilio.falhas_pendentes["/instavel"] = 2
+    conteudo = baixador.baixar(f"{base}/instavel")
+    ok = len(conteudo) == TAMANHO_MIDIA
+    falhas += not ok
+    print(f"{'OK  ' if ok else 'FALHA'} repetição após 2x 503")
+
+    try:
+        baixador.baixar(f"{base}/grande")
+        ok = False
+    except MidiaGrandeDemais:
+        ok = True
+    falhas += not ok
+    print(f"{'OK  ' if ok else 'FALHA'} corte de mídia acima do limite (sem Content-Length)")
+
+    urls = [f"{base}/midia{i}" for i in range(args.midias)]
+    sequencial, paralelo = [], []
+    for _ in range(args.rodadas):
+        inicio = time.perf_counter()
+        for url in urls:
+            baixador.baixar(url)
+        sequencial.append(time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        resultados = baixador.baixar_varias(urls)
+        paralelo.append(time.perf_counter() - inicio)
+        falhas += sum(1 for r in resultados if isinstance(r, Exception))
+
+    servidor.shutdown()
+    baixador.fechar()
+    requisicoes = 3 + 1 + 2 * args.rodadas * args.midias
+    print(f"\n{args.midias} mídias de {TAMANHO_MIDIA // 1024} KB, latência {args.latencia * 1000:.0f} ms:")
+    print(f"  sequencial: {min(sequencial) * 1000:8.1f} ms")
+    print(f"  paralelo:   {min(paralelo) * 1000:8.1f} ms")
+    print(f"  conexões TCP abertas: {len(_StubTwilio.conexoes)} para {requisicoes} requisições")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+# benchmarks/benchmark_exportacao.py
+# Mede a exportação de 1k e 10k transações sintéticas em xlsx (modelo de
+# reembolso), csv e parquet, comparando com o preenchimento antigo
+# (`sheet[f'B{linha}']` célula a célula + insert_rows na linha de totais).
+# Também confere o rodapé do xlsx gerado: a linha TOTAL A RECEBER logo
+# depois da última transação e as fórmulas de totais cobrindo todas elas.
+#
+# Uso:
+#   python benchmarks/benchmark_exportacao.py                  # 1000 e 10000 linhas
+#   python benchmarks/benchmark_exportacao.py --linhas 500 5000 --repeticoes 5
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PASTA_RAIZ)
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+import exportacao  # noqa: E402
+
+ARQUIVO_MODELO = os.path.join(PASTA_RAIZ, "planilha_reembolso_branco.xlsx")
+NOME_DA_ABA = "Plan2"
+LINHA_DOS_TOTAIS = 46
+
+
+def transacoes_sinteticas(quantidade):
+    tipos = ["Passagem", "Estacionamento", "Combustivel/Alimentação"]
+    return [{
+        "Data": f"{i % 28 + 1:02d}/{i % 12 + 1:02d}/2025",
+        "Tipo de Despesa": tipos[i % 3],
+        "Estabelecimento": f"Estabelecimento {i % 50}",
+        "Valor": round(5 + (i * 7.31) % 200, 2),
+        "Observação": f"CNPJ: 12.345.678/0001-{i % 100:02d}",
+    } for i in range(quantidade)]
+
+
+# Preenchimento de antes, como referência.
+def preencher_antigo(transacoes, arquivo_destino):
+    import openpyxl
+    shutil.copyfile(ARQUIVO_MODELO, arquivo_destino)
+    workbook = openpyxl.load_workbook(arquivo_destino)
+    sheet = workbook[NOME_DA_ABA]
+    linha_atual = 10
+    while sheet[f'B{linha_atual}'].value is not None:
+        linha_atual += 1
+    espaco_disponivel = LINHA_DOS_TOTAIS - linha_atual
+    if len(transacoes) > espaco_disponivel:
+        sheet.insert_rows(LINHA_DOS_TOTAIS, amount=len(transacoes) - espaco_disponivel)
+    for transacao in transacoes:
+        sheet[f'B{linha_atual}'] = transacao['Data']
+        sheet[f'C{linha_atual}'] = transacao['Estabelecimento'] + ' - ' + transacao['Observação']
+        sheet[f'D{linha_atual}'] = transacao['Tipo de Despesa']
+        sheet[f'F{linha_atual}'] = "São Jose dos Campos"
+        sheet[f'G{linha_atual}'] = "São Paulo"
+        sheet[f'I{linha_atual}'] = transacao['Valor']
+        linha_atual += 1
+    workbook.save(arquivo_destino)
+
+
+# Retorna a lista de problemas do rodapé do xlsx gerado.
+def conferir_rodape(arquivo, quantidade):
+    import openpyxl
+    sheet = openpyxl.load_workbook(arquivo)[NOME_DA_ABA]
+    _, linha_dos_totais = exportacao.localizar_linhas(sheet)
+    ultima = exportacao.PRIMEIRA_LINHA_TRANSACOES + quantidade - 1
+    problemas = []
+    if linha_dos_totais != max(LINHA_DOS_TOTAIS, ultima + 1):
+        problemas.append(f"totais na linha {linha_dos_totais}")
+    total = str(sheet.cell(linha_dos_totais, 8).value)
+    if total != f"=SUM(I10:I{max(LINHA_DOS_TOTAIS - 1, ultima)})":
+        problemas.append(f"total {total}")
+    resumo = str(sheet.cell(linha_dos_totais + 4, 4).value)
+    fins = {int(n) for n in re.findall(r"\$[DI]\$(\d+)", resumo)}
+    if fins != {11, max(LINHA_DOS_TOTAIS - 1, ultima)}:
+        problemas.append(f"resumo {resumo}")
+    if sheet.cell(ultima, 9).value is None:
+        problemas.append("última transação ausente")
+    return problemas
+
+
+# Melhor de `repeticoes` execuções: a máquina compartilhada oscila bastante.
+def cronometrar(funcao, destino, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(destino)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportação de transações em xlsx, csv e parquet.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    # Os imports pesados (openpyxl, pyarrow) ficam fora da medição.
+    import openpyxl  # noqa: F401
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        pass
+
+    pasta = tempfile.mkdtemp(prefix="benchmark_exportacao_")
+    falhas = []
+    print(f"{'linhas':>7}  {'formato':<14}{'segundos':>10}{'linhas/s':>12}{'KB':>9}  rodapé")
+    try:
+        for quantidade in args.linhas:
+            transacoes = transacoes_sinteticas(quantidade)
+            casos = [
+                ("xlsx antigo", "antigo.xlsx", lambda destino: preencher_antigo(transacoes, destino)),
+                ("xlsx", "novo.xlsx", lambda destino: exportacao.exportar(
+                    transacoes, destino, ARQUIVO_MODELO, NOME_DA_ABA)),
+                ("csv", "novo.csv", lambda destino: exportacao.exportar(transacoes, destino)),
+                ("parquet", "novo.parquet", lambda destino: exportacao.exportar(transacoes, destino)),
+            ]
+            for nome, arquivo, exportar in casos:
+                destino = os.path.join(pasta, f"{quantidade}_{arquivo}")
+                try:
+                    segundos = cronometrar(exportar, destino, args.repeticoes)
+                except RuntimeError as e:
+                    print(f"{quantidade:>7}  {nome:<14}{'-':>10}{'-':>12}{'-':>9}  {e}")
+                    continue
+                rodape = ""
+                if arquivo.endswith(".xlsx"):
+                    problemas = conferir_rodape(destino, quantidade)
+                    rodape = "; ".join(problemas) or "ok"
+                    if problemas and nome == "xlsx":
+                        falhas.append(f"{quantidade} linhas: {rodape}")
+                print(f"{quantidade:>7}  {nome:<14}{segundos:>10.3f}{quantidade / segundos:>12.0f}"
+                      f"{os.path.getsize(destino) / 1024:>9.0f}  {rodape}")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    print()
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    if not falhas:
+        print("OK    rodapé e fórmulas de totais cobrindo todas as transações")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# benchmarks/benchmark_extratores_nfce.py
+# Confere os extratores da página da NFC-e contra o corpus de referência
+# (benchmarks/corpus_nfce/*.html -> *.json; a URL do QR Code vai na primeira
+# linha do HTML, num comentário "<!-- url: ... -->") e mede o tempo de análise
+# por layout, comparado com a análise antiga em BeautifulSoup (se instalado).
+#
+# Uso:
+#   python benchmarks/benchmark_extratores_nfce.py              # confere o corpus + microbenchmark
+#   python benchmarks/benchmark_extratores_nfce.py --atualizar  # regrava os .json de referência
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_CORPUS = os.path.join(PASTA_RAIZ, "benchmarks", "corpus_nfce")
+sys.path.insert(0, PASTA_RAIZ)
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+from extratores_nfce import extrair_dados_html  # noqa: E402
+
+
+def ler_caso(caminho_html):
+    with open(caminho_html, encoding="utf-8") as f:
+        html = f.read()
+    match = re.match(r"<!-- url: (\S+) -->", html)
+    return html, match.group(1) if match else None
+
+
+# --- CORPUS DE REFERÊNCIA ---
+def conferir_corpus(atualizar=False):
+    falhas = 0
+    for caminho_html in sorted(glob.glob(os.path.join(PASTA_CORPUS, "*.html"))):
+        caminho_json = caminho_html[:-5] + ".json"
+        html, url = ler_caso(caminho_html)
+        obtido = extrair_dados_html(html, url)
+        nome = os.path.basename(caminho_html)
+        if atualizar:
+            with open(caminho_json, "w", encoding="utf-8") as f:
+                json.dump(obtido, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            print(f"ATUALIZADO {nome}: {obtido['layout']}, {len(obtido['itens'])} itens")
+            continue
+        with open(caminho_json, encoding="utf-8") as f:
+            esperado = json.load(f)
+        if obtido == esperado:
+            print(f"OK     {nome}: {obtido['layout']}, {len(obtido['itens'])} itens")
+        else:
+            falhas += 1
+            print(f"FALHOU {nome}")
+            print(f"  esperado: {json.dumps(esperado, ensure_ascii=False)}")
+            print(f"  obtido:   {json.dumps(obtido, ensure_ascii=False)}")
+    return falhas
+
+
+# --- MICROBENCHMARK ---
+# Análise de antes dos extratores (só o layout padrão, sem itens), como referência.
+def analisar_bs4(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    nome = soup.select_one("div.txtTopo")
+    cnpj_div = soup.find(lambda tag: tag.name == "div" and "CNPJ:" in tag.text)
+    label_valor = soup.find("label", string=re.compile(r"Valor a pagar", re.IGNORECASE))
+    valor = label_valor.find_next_sibling("span", class_="totalNumb") if label_valor else None
+    emissao = soup.find("strong", string=re.compile(r"Emissão", re.IGNORECASE))
+    return nome, cnpj_div, valor, emissao and emissao.parent.get_text(" ", strip=True)
+
+
+def com_itens(html, quantidade):
+    # Replica as linhas de item para simular cupons longos (supermercado).
+    linhas = re.findall(r"<tr id=\"Item.*?</tr>|<tr><td><h7>.*?</tr>", html, re.DOTALL)
+    if not linhas:
+        return html
+    extras = "".join(linhas[i % len(linhas)] for i in range(quantidade))
+    return html.replace(linhas[-1], linhas[-1] + extras, 1)
+
+
+def medir(funcao, *args, repeticoes=20):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def microbenchmark():
+    try:
+        import bs4  # noqa: F401
+        tem_bs4 = True
+    except ImportError:
+        tem_bs4 = False
+    print(f"\n{'caso':<34}{'layout':>15}{'itens':>7}{'lxml_ms':>10}" + (f"{'bs4_ms':>10}" if tem_bs4 else ""))
+    for caminho_html in sorted(glob.glob(os.path.join(PASTA_CORPUS, "*.html"))):
+        html_base, url = ler_caso(caminho_html)
+        for itens in (0, 100):
+            html = com_itens(html_base, itens) if itens else html_base
+            if itens and html == html_base:
+                continue
+            dados = extrair_dados_html(html, url)
+            linha = (f"{os.path.basename(caminho_html)[:-5] + f'/+{itens}':<34}{dados['layout']:>15}"
+                     f"{len(dados['itens']):>7}{medir(extrair_dados_html, html, url) * 1000:>10.3f}")
+            if tem_bs4:
+                linha += f"{medir(analisar_bs4, html) * 1000:>10.3f}"
+            print(linha)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Corpus de referência e microbenchmark dos extratores de NFC-e.")
+    parser.add_argument("--atualizar", action="store_true", help="Regrava os .json de referência.")
+    parser.add_argument("--sem-benchmark", action="store_true", help="Só confere o corpus.")
+    args = parser.parse_args(argv)
+
+    falhas = conferir_corpus(args.atualizar)
+    if not args.sem_benchmark and not args.atualizar:
+        microbenchmark()
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# benchmarks/benchmark_inicializacao.py
+# Mede o custo de subir o app, cada rodada num interpretador novo:
+#   - import do app.py (o que o gunicorn paga ao iniciar um worker);
+#   - primeira mensagem de texto (cadastro), que não deve carregar nada pesado;
+#   - pré-carregamento do worker (app.precarregar) e o peso de cada parte.
+# Também confere que pandas, OpenCV, lxml etc. não entram no import.
+#
+# Uso:
+#   python benchmarks/benchmark_inicializacao.py --rodadas 5
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS_PESADOS = ("pandas", "cv2", "numpy", "lxml", "openpyxl", "pytesseract", "tesserocr",
+                   "requests", "playwright", "pypdfium2")
+
+# Roda no processo filho e imprime um JSON com os tempos em segundos.
+SCRIPT_FILHO = r"""
+import json, os, sys, time
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+os.environ["ARMAZENAMENTO"] = "memoria"
+os.environ["CACHE_RESULTADOS_DB"] = ":memory:"
+pesados = %r
+medidas = {}
+
+inicio = time.perf_counter()
+import app
+medidas["import_app"] = time.perf_counter() - inicio
+medidas["pesados_no_import"] = [m for m in pesados if m in sys.modules]
+
+cliente = app.app.test_client()
+inicio = time.perf_counter()
+cliente.post("/whatsapp", data={"From": "whatsapp:+5500000000000", "Body": "oi"})
+medidas["primeira_mensagem_texto"] = time.perf_counter() - inicio
+medidas["pesados_apos_texto"] = [m for m in pesados if m in sys.modules]
+
+partes = [
+    ("import_opencv", lambda: __import__("processador_imagem")),
+    ("import_openpyxl", lambda: __import__("openpyxl")),
+    ("extratores_nfce", lambda: __import__("extratores_nfce").escolher_extrator(None)),
+    ("pool_detectores", app.obter_pool_detectores),
+    ("motor_ocr", __import__("processador_pedagio").obter_motor_ocr),
+    ("sessoes_http", lambda: (__import__("processador_cupom").obter_sessao_http(), app.obter_baixador())),
+]
+for nome, funcao in partes:
+    inicio = time.perf_counter()
+    funcao()
+    medidas[nome] = time.perf_counter() - inicio
+inicio = time.perf_counter()
+app.precarregar(navegador=False)
+medidas["precarregar_ja_quente"] = time.perf_counter() - inicio
+print(json.dumps(medidas))
+"""
+
+
+def rodar_filho():
+    saida = subprocess.run([sys.executable, "-c", SCRIPT_FILHO % (MODULOS_PESADOS,)],
+                           cwd=PASTA_RAIZ, capture_output=True, text=True, check=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede o tempo de inicialização do app.")
+    parser.add_argument("--rodadas", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rodadas = [rodar_filho() for _ in range(args.rodadas)]
+    etapas = [chave for chave, valor in rodadas[0].items() if isinstance(valor, float)]
+    print(f"{'etapa':<26}{'mediana (ms)':>14}{'mín (ms)':>12}")
+    for etapa in etapas:
+        valores = [r[etapa] * 1000 for r in rodadas]
+        print(f"{etapa:<26}{statistics.median(valores):>14.1f}{min(valores):>12.1f}")
+
+    falhas = 0
+    for chave in ("pesados_no_import", "pesados_apos_texto"):
+        carregados = rodadas[0][chave]
+        print(f"{'OK  ' if not carregados else 'FALHA'} {chave}: {', '.join(carregados) or 'nenhum'}")
+        falhas += bool(carregados)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# benchmarks/benchmark_parser_pedagio.py
+# Confere o parser de extratos de pedágio contra o corpus de referência
+# (benchmarks/corpus_pedagio/*.txt -> *.json) e mede a vazão em extratos longos.
+#
+# Uso:
+#   python benchmarks/benchmark_parser_pedagio.py              # confere o corpus + microbenchmark
+#   python benchmarks/benchmark_parser_pedagio.py --atualizar  # regrava os .json de referência
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_CORPUS = os.path.join(PASTA_RAIZ, "benchmarks", "corpus_pedagio")
+sys.path.insert(0, PASTA_RAIZ)
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+from processador_pedagio import analisar_e_estruturar_texto, montar_linhas_por_posicao  # noqa: E402
+
+
+def _silencioso(funcao, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return funcao(*args)
+
+
+# --- CORPUS DE REFERÊNCIA ---
+def conferir_corpus(atualizar=False):
+    falhas = 0
+    for caminho_txt in sorted(glob.glob(os.path.join(PASTA_CORPUS, "*.txt"))):
+        caminho_json = caminho_txt[:-4] + ".json"
+        with open(caminho_txt, encoding="utf-8") as f:
+            obtido = _silencioso(analisar_e_estruturar_texto, f.read())
+        nome = os.path.basename(caminho_txt)
+        if atualizar:
+            with open(caminho_json, "w", encoding="utf-8") as f:
+                json.dump(obtido, f, ensure_ascii=False, indent=2)
+                f.write("\n")
+            print(f"ATUALIZADO {nome}: {len(obtido)} transações")
+            continue
+        with open(caminho_json, encoding="utf-8") as f:
+            esperado = json.load(f)
+        if obtido == esperado:
+            print(f"OK     {nome}: {len(obtido)} transações")
+        else:
+            falhas += 1
+            print(f"FALHOU {nome}")
+            print(f"  esperado: {json.dumps(esperado, ensure_ascii=False)}")
+            print(f"  obtido:   {json.dumps(obtido, ensure_ascii=False)}")
+    return falhas
+
+
+# --- MICROBENCHMARK ---
+def gerar_extrato(transacoes, layout):
+    linhas = ["Extrato Sem Parar", "123 - ABC1D23"]
+    descricoes, valores = [], []
+    for i in range(transacoes):
+        if i % 5 == 0:
+            linha_data = f"{i // 5 % 28 + 1} de março"
+            (descricoes if layout == "colunas" else linhas).append(linha_data)
+        descricao = "Estacionamento Shopping" if i % 7 == 0 else "Passagem CCR AutoBan"
+        valor = f"R$ {8 + i % 20},{i % 100:02d}"
+        if layout == "intercalado":
+            linhas.extend([descricao, valor])
+        elif layout == "mesma_linha":
+            linhas.append(f"{descricao} {valor}")
+        else:
+            descricoes.append(descricao)
+            valores.append(valor)
+    return "\n".join(linhas + descricoes + valores)
+
+
+def gerar_palavras(transacoes):
+    palavras = []
+    for i in range(transacoes):
+        topo = 40 * i + (i % 3)
+        palavras.append({"texto": "Passagem", "esquerda": 20, "topo": topo, "largura": 90, "altura": 18})
+        palavras.append({"texto": "R$", "esquerda": 600, "topo": topo + 2, "largura": 20, "altura": 18})
+        palavras.append({"texto": f"{i % 90},50", "esquerda": 630, "topo": topo + 1, "largura": 50, "altura": 18})
+    return palavras
+
+
+def medir(funcao, *args, repeticoes=5):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        _silencioso(funcao, *args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def microbenchmark():
+    print(f"\n{'caso':<36}{'linhas':>10}{'melhor_ms':>12}{'linhas/s':>14}")
+    for layout in ("intercalado", "colunas", "mesma_linha"):
+        for transacoes in (1_000, 10_000, 50_000):
+            texto = gerar_extrato(transacoes, layout)
+            n_linhas = texto.count("\n") + 1
+            segundos = medir(analisar_e_estruturar_texto, texto)
+            print(f"{'parser/' + layout + f'/{transacoes}':<36}{n_linhas:>10}"
+                  f"{segundos * 1000:>12.2f}{n_linhas / segundos:>14,.0f}")
+    for transacoes in (1_000, 10_000):
+        palavras = gerar_palavras(transacoes)
+        segundos = medir(montar_linhas_por_posicao, palavras)
+        print(f"{f'linhas_por_posicao/{transacoes}':<36}{len(palavras):>10}"
+              f"{segundos * 1000:>12.2f}{len(palavras) / segundos:>14,.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Corpus de referência e microbenchmark do parser de pedágio.")
+    parser.add_argument("--atualizar", action="store_true", help="Regrava os .json de referência.")
+    parser.add_argument("--sem-benchmark", action="store_true", help="Só confere o corpus.")
+    args = parser.parse_args(argv)
+
+    falhas = conferir_corpus(args.atualizar)
+    if not args.sem_benchmark and not args.atualizar:
+        microbenchmark()
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+# benchmarks/benchmark_pool_navegador.py
+# Confere o pool do Chromium (pool_navegador.py) contra um portal de NFC-e
+# falso (servidor HTTP local). Cada página servida marca a aba do navegador
+# (window.name sobrevive às navegações na mesma aba), então dá para ver de
+# fora qual página do pool atendeu cada consulta:
+#   - reuso: consultas seguidas usam as mesmas abas, cada uma até
+#     MAX_USOS_PAGINA navegações, e depois a aba é reciclada;
+#   - concorrência: várias threads ao mesmo tempo, nunca mais páginas
+#     abertas no portal do que o tamanho do pool;
+#   - erro: a página que estourou o timeout é descartada e o pool não encolhe;
+#   - health check: com o Chromium derrubado, a próxima consulta relança o
+#     navegador e recria as páginas;
+#   - fechar(): como em processar_lote.py e processador_cupom.py, no pool
+#     nunca iniciado, duas vezes seguidas e antes de reabrir.
+# Também compara a latência de uma consulta com o pool quente e com um
+# Chromium novo por consulta. Sem o Chromium do Playwright instalado
+# (python -m playwright install chromium), avisa e não roda.
+#
+# Uso:
+#   python benchmarks/benchmark_pool_navegador.py
+#   python benchmarks/benchmark_pool_navegador.py --tamanho 3 --max-usos 4 --threads 12
+
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PASTA_RAIZ)
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "ERROR")
+
+import pool_navegador  # noqa: E402
+from pool_navegador import PoolNavegador, obter_pool_navegador  # noqa: E402
+from processador_cupom import analisar_html_cupom  # noqa: E402
+
+
+CHAVE_SP = "35250312345678000190650010000043211123456789"
+# Marca a aba na primeira visita e mostra a marca na página.
+MARCA_ABA = (b'<span id="aba"></span><script>window.name = window.name || String(Math.random()).slice(2);'
+             b'document.getElementById("aba").textContent = window.name;</script>')
+_ABA = re.compile(r'<span id="aba">(\d+)</span>')
+
+with open(os.path.join(PASTA_RAIZ, "benchmarks", "corpus_nfce", "sp_portal_padrao.html"), encoding="utf-8") as f:
+    PAGINA = f.read().encode("utf-8").replace(b"</body>", MARCA_ABA + b"</body>")
+
+
+class _PortalFalso(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latencia = 0.02
+    # Páginas em /lenta demoram mais que o timeout do pool.
+    latencia_lenta = 3.0
+    lock = threading.Lock()
+
+    @classmethod
+    def zerar(cls):
+        cls.em_andamento = 0
+        cls.pico_simultaneas = 0
+        cls.requisicoes = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        cls = type(self)
+        # Só as páginas da NFC-e contam (o Chromium pode pedir o favicon).
+        if not self.path.startswith(("/qrcode", "/lenta")):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with cls.lock:
+            cls.requisicoes += 1
+            cls.em_andamento += 1
+            cls.pico_simultaneas = max(cls.pico_simultaneas, cls.em_andamento)
+        try:
+            time.sleep(cls.latencia_lenta if self.path.startswith("/lenta") else cls.latencia)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(PAGINA)))
+            self.end_headers()
+            self.wfile.write(PAGINA)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with cls.lock:
+                cls.em_andamento -= 1
+
+
+def _subir_portal():
+    _PortalFalso.zerar()
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _PortalFalso)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+def _url(base, i):
+    return f"{base}/qrcode?p={CHAVE_SP}|2|1|{i}|abc"
+
+
+# Consulta pelo pool e retorna (aba que atendeu, cupom lido?).
+def consultar(pool, url, timeout_ms=None):
+    html = pool.obter_html(url, timeout_ms=timeout_ms)
+    aba = _ABA.search(html)
+    return aba.group(1) if aba else None, analisar_html_cupom(html, url)["valor_total"] > 0
+
+
+def _chromium_disponivel():
+    pool = PoolNavegador(tamanho=1)
+    try:
+        pool.iniciar()
+        return True
+    except Exception as e:
+        print(f"AVISO: Chromium do Playwright indisponível ({type(e).__name__}); "
+              "rode `python -m playwright install chromium`.")
+        return False
+    finally:
+        pool.fechar()
+
+
+# Simula a queda do Chromium: o navegador fecha por fora do pool.
+def derrubar_navegador(pool):
+    asyncio.run_coroutine_threadsafe(pool._navegador.close(), pool._loop).result()
+
+
+def _ms(valores):
+    valores = sorted(v * 1000 for v in valores)
+    return statistics.median(valores), valores[min(len(valores) - 1, int(round(0.95 * (len(valores) - 1))))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pool do Chromium contra um portal de NFC-e falso.")
+    parser.add_argument("--tamanho", type=int, default=2, help="Páginas do pool.")
+    parser.add_argument("--max-usos", type=int, default=5, help="Navegações por página antes de reciclar.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--repeticoes", type=int, default=5, help="Consultas com um Chromium novo em cada.")
+    args = parser.parse_args(argv)
+
+    # fechar() antes de qualquer uso é o que processar_lote faz num lote sem cupons.
+    obter_pool_navegador().fechar()
+    if not _chromium_disponivel():
+        return 0
+
+    servidor, base = _subir_portal()
+    falhas = []
+    print(f"pool: {args.tamanho} páginas, até {args.max_usos} navegações cada; "
+          f"portal local com {_PortalFalso.latencia * 1000:.0f} ms por página\n")
+
+    # O singleton, como em processador_cupom, com os parâmetros da linha de comando.
+    os.environ["TAMANHO_POOL_NAVEGADOR"] = str(args.tamanho)
+    os.environ["MAX_USOS_PAGINA"] = str(args.max_usos)
+    pool_navegador._pool = None
+    pool = obter_pool_navegador()
+    pool.iniciar()
+
+    # --- Reuso e reciclagem ---
+    # Duas voltas completas: cada aba atende exatamente max_usos consultas.
+    consultas = 2 * args.tamanho * args.max_usos
+    tempos, abas, lidos = [], [], 0
+    for i in range(consultas):
+        inicio = time.perf_counter()
+        aba, lido = consultar(pool, _url(base, i))
+        tempos.append(time.perf_counter() - inicio)
+        abas.append(aba)
+        lidos += lido
+    usos = Counter(abas)
+    print(f"reuso: {consultas} consultas em {len(usos)} abas, usos por aba {sorted(usos.values())}")
+    if lidos != consultas or None in usos:
+        falhas.append("reuso: toda consulta deveria voltar com o cupom e a marca da aba")
+    if len(usos) != 2 * args.tamanho or set(usos.values()) != {args.max_usos}:
+        falhas.append(f"reuso: esperava {2 * args.tamanho} abas com {args.max_usos} usos cada")
+
+    # --- Concorrência ---
+    _PortalFalso.zerar()
+    por_thread = 4
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        resultados = list(executor.map(lambda i: consultar(pool, _url(base, i)), range(args.threads * por_thread)))
+    ok = sum(lido for _, lido in resultados)
+    print(f"concorrência: {ok}/{len(resultados)} cupons com {args.threads} threads, "
+          f"pico de {_PortalFalso.pico_simultaneas} páginas no portal")
+    if ok != len(resultados) or _PortalFalso.pico_simultaneas > args.tamanho:
+        falhas.append("concorrência: todas as consultas, com no máximo o tamanho do pool no portal")
+    if pool.estatisticas()["livres"] != args.tamanho:
+        falhas.append("concorrência: todas as páginas deveriam voltar ao pool")
+
+    # --- Erro (timeout) ---
+    # Num pool sem reciclagem por uso, para só o erro trocar abas. Com as abas
+    # em fila, a da consulta lenta é a primeira da volta anterior.
+    robusto = PoolNavegador(tamanho=args.tamanho, max_usos=10 ** 6)
+    abas_antes = [consultar(robusto, _url(base, i))[0] for i in range(args.tamanho)]
+    erro = None
+    try:
+        robusto.obter_html(f"{base}/lenta", timeout_ms=500)
+        falhas.append("erro: a página lenta deveria estourar o timeout")
+    except Exception as e:
+        erro = type(e).__name__
+    abas_depois = [consultar(robusto, _url(base, i))[0] for i in range(args.tamanho)]
+    descartadas = set(abas_antes) - set(abas_depois)
+    print(f"erro: {erro} na página lenta; abas descartadas {len(descartadas)}, "
+          f"livres {robusto.estatisticas()['livres']}/{args.tamanho}")
+    if descartadas != {abas_antes[0]} or robusto.estatisticas()["livres"] != args.tamanho:
+        falhas.append("erro: só a aba do timeout deveria ser trocada, sem o pool encolher")
+
+    # --- Health check ---
+    derrubar_navegador(robusto)
+    caido = robusto.estatisticas()["navegador_conectado"]
+    depois_da_queda = [consultar(robusto, _url(base, i)) for i in range(args.tamanho)]
+    print(f"health check: conectado {caido} após a queda, {sum(l for _, l in depois_da_queda)}/{args.tamanho} "
+          f"cupons depois, conectado {robusto.estatisticas()['navegador_conectado']}")
+    if caido or not all(l for _, l in depois_da_queda) or not robusto.estatisticas()["navegador_conectado"]:
+        falhas.append("health check: a consulta seguinte deveria relançar o Chromium")
+    if set(abas_depois) & {aba for aba, _ in depois_da_queda}:
+        falhas.append("health check: as abas do navegador derrubado não deveriam ser reaproveitadas")
+
+    robusto.fechar()
+
+    # --- Latência: pool quente x Chromium novo por consulta ---
+    frios = []
+    for i in range(args.repeticoes):
+        avulso = PoolNavegador(tamanho=1)
+        inicio = time.perf_counter()
+        consultar(avulso, _url(base, i))
+        frios.append(time.perf_counter() - inicio)
+        avulso.fechar()
+    quente, frio = _ms(tempos), _ms(frios)
+    print(f"\n{'consulta':<28}{'p50_ms':>10}{'p95_ms':>10}")
+    print(f"{'pool quente':<28}{quente[0]:>10.1f}{quente[1]:>10.1f}")
+    print(f"{'Chromium novo':<28}{frio[0]:>10.1f}{frio[1]:>10.1f}\n")
+
+    # --- fechar() ---
+    thread = pool._thread
+    obter_pool_navegador().fechar()
+    fechado = not thread.is_alive() and not pool.estatisticas()["navegador_conectado"]
+    obter_pool_navegador().fechar()
+    reaberto = consultar(pool, _url(base, 0))[1]
+    obter_pool_navegador().fechar()
+    print(f"fechar: loop parado e navegador fechado {fechado}, reabre depois {reaberto}")
+    if not fechado or not reaberto or pool._thread is not None:
+        falhas.append("fechar: deveria parar o loop e o Chromium, aceitar repetição e reabrir no próximo uso")
+
+    servidor.shutdown()
+    print()
+    for falha in falhas:
+        print(f"FALHA {falha}")
+    if not falhas:
+        print("OK    reuso, reciclagem, concorrência, erro, health check e fechar")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
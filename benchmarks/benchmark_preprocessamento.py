@@ -0,0 +1,151 @@
+# benchmarks/benchmark_preprocessamento.py
+# Mede latência e acerto de cada etapa de pré-processamento (QR Code e OCR)
+# sobre um conjunto de imagens de amostra.
+#
+# Uso:
+#   python benchmarks/benchmark_preprocessamento.py amostras/ --esperado amostras/esperado.json
+#   python benchmarks/benchmark_preprocessamento.py --sintetico   # gera um conjunto próprio
+#
+# esperado.json: {"cupom1.jpg": {"qr": "https://..."}, "pedagio1.jpg": {"palavras": ["Passagem", "12,30"]}}
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+from processador_cupom import configurar_detector_wechat  # noqa: E402
+from processador_imagem import carregar_imagem, preprocessar_para_ocr, tentativas_qr  # noqa: E402
+
+
+# --- CONJUNTO SINTÉTICO ---
+def gerar_amostras_sinteticas(pasta):
+    esperado = {}
+    url = "https://www.nfce.fazenda.sp.gov.br/qrcode?p=35250212345678000190650010000012341000012345|2|1|1|abc"
+    qr = cv2.QRCodeEncoder.create().encode(url)
+    for i, (lado_qr, inclinacao) in enumerate([(240, 0), (320, 3), (400, -4)]):
+        foto = np.full((3000, 4000, 3), 235, np.uint8)
+        qr_grande = cv2.resize(qr, (lado_qr, lado_qr), interpolation=cv2.INTER_NEAREST)
+        y, x = 1800 + i * 100, 1500 + i * 300
+        foto[y:y + lado_qr, x:x + lado_qr] = cv2.cvtColor(qr_grande, cv2.COLOR_GRAY2BGR)
+        matriz = cv2.getRotationMatrix2D((2000, 1500), inclinacao, 1.0)
+        foto = cv2.warpAffine(foto, matriz, (4000, 3000), borderValue=(235, 235, 235))
+        nome = f"cupom_sintetico_{i}.jpg"
+        cv2.imwrite(os.path.join(pasta, nome), foto)
+        esperado[nome] = {"qr": url}
+
+    linhas = ["12 de marco", "Passagem R$ 8,70", "Estacionamento R$ 15,00", "123 - ABC1D23"]
+    for i, inclinacao in enumerate([0, 4]):
+        folha = np.full((3000, 2200), 250, np.uint8)
+        for j, linha in enumerate(linhas * 3):
+            cv2.putText(folha, linha, (120, 200 + j * 180), cv2.FONT_HERSHEY_SIMPLEX, 2.4, 30, 5)
+        matriz = cv2.getRotationMatrix2D((1100, 1500), inclinacao, 1.0)
+        folha = cv2.warpAffine(folha, matriz, (2200, 3000), borderValue=250)
+        nome = f"pedagio_sintetico_{i}.jpg"
+        cv2.imwrite(os.path.join(pasta, nome), folha)
+        esperado[nome] = {"palavras": ["Passagem", "8,70", "Estacionamento", "15,00", "ABC1D23"]}
+    return esperado
+
+
+# --- MEDIÇÕES ---
+def medir_qr(detector, imagem, esperado_qr):
+    resultados = {}
+
+    inicio = time.perf_counter()
+    codigos, _ = detector.detectAndDecode(imagem.cinza)
+    resultados["resolucao_cheia"] = (time.perf_counter() - inicio, bool(codigos) and codigos[0] == esperado_qr)
+
+    inicio = time.perf_counter()
+    acerto = False
+    for _, matriz in tentativas_qr(imagem):
+        codigos, _ = detector.detectAndDecode(matriz)
+        if codigos:
+            acerto = codigos[0] == esperado_qr
+            break
+    resultados["adaptativo"] = (time.perf_counter() - inicio, acerto)
+    return resultados
+
+
+def medir_ocr(imagem, palavras):
+    import pytesseract
+
+    def acuracia(texto):
+        return sum(1 for p in palavras if p.lower() in texto.lower()) / len(palavras)
+
+    resultados = {}
+    inicio = time.perf_counter()
+    texto = pytesseract.image_to_string(imagem.cinza, lang='por')
+    resultados["cinza_bruto"] = (time.perf_counter() - inicio, acuracia(texto))
+
+    inicio = time.perf_counter()
+    tratada = preprocessar_para_ocr(imagem)
+    tempo_preproc = time.perf_counter() - inicio
+    texto = pytesseract.image_to_string(tratada, lang='por')
+    resultados["preprocessado"] = (time.perf_counter() - inicio, acuracia(texto))
+    resultados["somente_preprocessamento"] = (tempo_preproc, None)
+    return resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pré-processamento de QR Code e OCR.")
+    parser.add_argument("pasta", nargs="?", help="Pasta com as imagens de amostra.")
+    parser.add_argument("--esperado", help="JSON com o resultado esperado por imagem.")
+    parser.add_argument("--sintetico", action="store_true", help="Gera e usa um conjunto sintético.")
+    parser.add_argument("--saida", help="Grava o relatório JSON neste arquivo.")
+    args = parser.parse_args(argv)
+
+    if args.sintetico:
+        pasta = tempfile.mkdtemp(prefix="amostras_preproc_")
+        esperado = gerar_amostras_sinteticas(pasta)
+    elif args.pasta and args.esperado:
+        pasta = args.pasta
+        with open(args.esperado, encoding="utf-8") as f:
+            esperado = json.load(f)
+    else:
+        parser.error("Informe a pasta e --esperado, ou use --sintetico.")
+
+    detector = configurar_detector_wechat()
+    medicoes = {}
+    for nome, alvo in sorted(esperado.items()):
+        imagem = carregar_imagem(os.path.join(pasta, nome))
+        if "qr" in alvo:
+            for estrategia, valor in medir_qr(detector, imagem, alvo["qr"]).items():
+                medicoes.setdefault(f"qr/{estrategia}", []).append(valor)
+        if "palavras" in alvo:
+            try:
+                for estrategia, valor in medir_ocr(imagem, alvo["palavras"]).items():
+                    medicoes.setdefault(f"ocr/{estrategia}", []).append(valor)
+            except Exception as e:
+                print(f"AVISO: OCR ignorado em {nome} ({e}).")
+
+    relatorio = {}
+    print(f"\n{'etapa':<32}{'n':>4}{'media_ms':>12}{'p95_ms':>12}{'acerto':>10}")
+    for etapa, valores in sorted(medicoes.items()):
+        tempos = sorted(t * 1000 for t, _ in valores)
+        acertos = [float(a) for _, a in valores if a is not None]
+        p95 = tempos[min(len(tempos) - 1, int(round(0.95 * (len(tempos) - 1))))]
+        relatorio[etapa] = {
+            "n": len(valores),
+            "media_ms": round(statistics.mean(tempos), 2),
+            "p95_ms": round(p95, 2),
+            "acerto": round(statistics.mean(acertos), 3) if acertos else None,
+        }
+        acerto_txt = f"{relatorio[etapa]['acerto']:.0%}" if acertos else "-"
+        print(f"{etapa:<32}{len(valores):>4}{relatorio[etapa]['media_ms']:>12.1f}{p95:>12.1f}{acerto_txt:>10}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
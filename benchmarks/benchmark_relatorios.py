@@ -0,0 +1,155 @@
+# benchmarks/benchmark_relatorios.py
+# Mede os comandos "total" e "resumo" e a exportação de período sobre um
+# banco SQLite sintético (vários usuários, cupons e passagens de pedágio):
+# - migração: tempo para indexar um banco no formato antigo (só JSON);
+# - consultas: latência p50/p95 de total e resumo pelas colunas indexadas,
+#   comparada com listar todas as transações do usuário e somar em Python;
+# - exportação: tempo e pico de memória (tracemalloc) do csv de um período
+#   grande em fluxo, comparado com montar a lista inteira antes.
+#
+# Uso:
+#   python benchmarks/benchmark_relatorios.py
+#   python benchmarks/benchmark_relatorios.py --usuarios 100 --transacoes 2000
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PASTA_RAIZ)
+# Só avisos e erros dos módulos: a saída do benchmark fica legível.
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+import exportacao  # noqa: E402
+import relatorios  # noqa: E402
+from armazenamento_estado import ArmazenamentoSQLite  # noqa: E402
+
+CONSULTAS = ("total", "resumo", "resumo dia 03/2025", "total 01/02/2025 15/02/2025")
+
+
+def transacao_sintetica(aleatorio):
+    if aleatorio.random() < 0.3:
+        return {"Data": f"{aleatorio.randint(1, 28):02d}/{aleatorio.randint(1, 6):02d}/2025",
+                "Tipo de Despesa": "Combustivel/Alimentação", "Estabelecimento": "POSTO TESTE LTDA",
+                "Valor": round(aleatorio.uniform(10, 300), 2), "Observação": "CNPJ: 12.345.678/0001-90"}
+    return {"ID_Transacao": f"{aleatorio.random():.8f}",
+            "Data": f"{aleatorio.randint(1, 28)} de {aleatorio.choice(['jan', 'fev', 'marco', 'abril'])}",
+            "Tipo de Despesa": aleatorio.choice(["Passagem", "Passagem", "Estacionamento"]),
+            "Estabelecimento": "Concessionaria 123", "Valor": round(aleatorio.uniform(5, 40), 2),
+            "Observação": f"Placa: ABC1D{aleatorio.randint(10, 12)}"}
+
+
+# Banco no formato de antes das colunas indexadas, preenchido direto pelo sqlite3.
+def criar_banco_antigo(caminho, usuarios, por_usuario):
+    aleatorio = random.Random(42)
+    conexao = sqlite3.connect(caminho)
+    conexao.executescript("""
+        CREATE TABLE transacoes (id INTEGER PRIMARY KEY AUTOINCREMENT, numero TEXT NOT NULL,
+                                 dados TEXT NOT NULL, criado_em REAL NOT NULL);
+        CREATE INDEX idx_transacoes_numero ON transacoes (numero, id);
+    """)
+    criado_em = time.mktime((2025, 6, 30, 12, 0, 0, 0, 0, -1))
+    for usuario in range(usuarios):
+        conexao.executemany(
+            "INSERT INTO transacoes (numero, dados, criado_em) VALUES (?, ?, ?)",
+            [(f"whatsapp:+55{usuario:011d}", json.dumps(transacao_sintetica(aleatorio), ensure_ascii=False),
+              criado_em) for _ in range(por_usuario)])
+    conexao.commit()
+    conexao.close()
+
+
+# Sem as colunas indexadas: todas as transações do usuário e a soma em Python.
+def total_sem_indice(armazenamento, numero, inicio, fim):
+    from transacao import data_iso
+    total, quantidade = 0.0, 0
+    for transacao in armazenamento.listar_transacoes(numero):
+        data = data_iso(transacao["Data"])
+        if inicio and (data is None or not inicio <= data <= fim):
+            continue
+        total += transacao["Valor"]
+        quantidade += 1
+    return quantidade, total
+
+
+def _ms(valores):
+    valores = sorted(v * 1000 for v in valores)
+    return statistics.median(valores), valores[min(len(valores) - 1, int(round(0.95 * (len(valores) - 1))))]
+
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+# O tracemalloc deixa tudo bem mais lento: o tempo vem de uma execução sem ele.
+def tempo_e_pico_memoria(funcao):
+    inicio = time.perf_counter()
+    funcao()
+    segundos = time.perf_counter() - inicio
+    tracemalloc.start()
+    try:
+        funcao()
+        return segundos, tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Total, resumo e exportação de período sobre o armazenamento.")
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--transacoes", type=int, default=2000, help="Transações por usuário.")
+    parser.add_argument("--grande", type=int, default=100000, help="Transações do usuário da exportação.")
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix="benchmark_relatorios_")
+    try:
+        banco = os.path.join(pasta, "estado.db")
+        criar_banco_antigo(banco, args.usuarios, args.transacoes)
+        inicio = time.perf_counter()
+        armazenamento = ArmazenamentoSQLite(banco)
+        total_linhas = args.usuarios * args.transacoes
+        print(f"migração: {total_linhas} transações indexadas em {time.perf_counter() - inicio:.2f} s")
+
+        numeros = [f"whatsapp:+55{u:011d}" for u in range(args.usuarios)]
+        print(f"\n{'consulta':<32}{'p50_ms':>10}{'p95_ms':>10}{'sem_indice_p50_ms':>20}")
+        for texto in CONSULTAS:
+            consulta = relatorios.interpretar_consulta(texto)
+            aleatorio = random.Random(7)
+            tempos = cronometrar(lambda: relatorios.consultar(armazenamento, aleatorio.choice(numeros), consulta),
+                                 args.repeticoes)
+            base = cronometrar(lambda: total_sem_indice(armazenamento, aleatorio.choice(numeros),
+                                                        consulta["inicio"], consulta["fim"]),
+                               max(3, args.repeticoes // 10))
+            p50, p95 = _ms(tempos)
+            print(f"{texto:<32}{p50:>10.2f}{p95:>10.2f}{_ms(base)[0]:>20.1f}")
+
+        # Um usuário com um período grande, exportado em csv.
+        grande = "whatsapp:+5500000000000grande"
+        aleatorio = random.Random(1)
+        for _ in range(0, args.grande, 10000):
+            armazenamento.adicionar_transacoes(grande, [transacao_sintetica(aleatorio) for _ in range(10000)])
+        destino = os.path.join(pasta, "periodo.csv")
+        fluxo = tempo_e_pico_memoria(lambda: relatorios.exportar_periodo(armazenamento, grande, destino))
+        lista = tempo_e_pico_memoria(lambda: exportacao.exportar(armazenamento.listar_transacoes(grande), destino))
+        print(f"\n{'exportação csv':<32}{'segundos':>10}{'pico_mb':>10}")
+        print(f"{'em fluxo (iterar_transacoes)':<32}{fluxo[0]:>10.2f}{fluxo[1]:>10.1f}")
+        print(f"{'lista inteira':<32}{lista[0]:>10.2f}{lista[1]:>10.1f}")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
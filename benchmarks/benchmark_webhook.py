@@ -0,0 +1,314 @@
+# benchmarks/benchmark_webhook.py
+# Teste de carga de ponta a ponta do webhook /whatsapp. Reproduz posts da
+# Twilio gravados (benchmarks/corpus_webhook/conversa.json: cadastro, foto de
+# cupom, foto de extrato de pedágio e "exportar") para vários usuários ao
+# mesmo tempo, com um servidor local no lugar do host de mídia da Twilio e do
+# portal da SEFAZ. Para cada etapa mede latência p50/p95/p99, vazão e pico de
+# RSS, numa rodada com uma thread e em rodadas concorrentes.
+#
+# Latência das mídias e do "exportar" = do POST até a resposta final sair
+# pelo enviador (o webhook responde na hora e o trabalho segue na fila). O pico de RSS é
+# o máximo do processo até o fim da etapa (as etapas rodam nesta ordem), cada
+# rodada num interpretador novo e já pré-carregado como um worker do gunicorn.
+#
+# Uso:
+#   python benchmarks/benchmark_webhook.py --usuarios 20 --threads 1 4
+#   python benchmarks/benchmark_webhook.py --salvar base.json           # guarda a referência
+#   python benchmarks/benchmark_webhook.py --comparar base.json         # falha se piorar além da tolerância
+
+import argparse
+import json
+import os
+import queue
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PASTA_RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_BENCHMARKS = os.path.join(PASTA_RAIZ, "benchmarks")
+sys.path.insert(0, PASTA_RAIZ)
+
+ETAPAS = ("cadastro", "cupom", "pedagio", "exportar")
+# Etapas cuja resposta final chega depois, pelo enviador.
+ETAPAS_NA_FILA = ("cupom", "pedagio", "exportar")
+RESPOSTAS_DE_ERRO = ("❌", "Ocorreu um erro")
+# Etapas de menos de um milissegundo oscilam muito: só conta piora acima disso.
+FOLGA_P95_MS = 5.0
+
+
+# --- MÍDIAS E PORTAL DE MENTIRA ---
+def _fundo(usuario, altura, largura):
+    import cv2
+    import numpy as np
+    # Fundo claro em blocos, diferente por usuário, como fotos de verdade.
+    blocos = np.random.default_rng(usuario).integers(190, 256, (8, 9), dtype=np.uint8)
+    fundo = cv2.resize(blocos, (largura, altura), interpolation=cv2.INTER_NEAREST)
+    return cv2.cvtColor(fundo, cv2.COLOR_GRAY2BGR)
+
+
+def gerar_cupom(usuario, url_sefaz):
+    import cv2
+    from decodificador_nfce import digito_verificador
+    chave43 = f"3525031234567800019065001{usuario:09d}1{usuario:08d}"
+    chave = chave43 + str(digito_verificador(chave43))
+    qr = cv2.QRCodeEncoder.create().encode(f"{url_sefaz}?p={chave}|2|1|1|{usuario:040x}")
+    foto = _fundo(usuario, 1200, 1600)
+    lado = 360
+    qr = cv2.resize(qr, (lado, lado), interpolation=cv2.INTER_NEAREST)
+    y, x = 420, 620
+    foto[y - 40:y + lado + 40, x - 40:x + lado + 40] = 255
+    foto[y:y + lado, x:x + lado] = cv2.cvtColor(qr, cv2.COLOR_GRAY2BGR)
+    return cv2.imencode(".jpg", foto, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def gerar_pedagio(usuario):
+    import cv2
+    foto = _fundo(usuario, 1600, 1200)
+    linhas = ["Extrato Sem Parar", "123 - ABC1D23"]
+    for i in range(6):
+        if i % 3 == 0:
+            linhas.append(f"{(usuario + i) % 28 + 1} de marco")
+        linhas.append("Passagem CCR AutoBan")
+        linhas.append(f"R$ {8 + (usuario + i) % 20},{(usuario * 7 + i) % 100:02d}")
+    for n, linha in enumerate(linhas):
+        cv2.putText(foto, linha, (80, 120 + n * 90), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (20, 20, 20), 3, cv2.LINE_AA)
+    return cv2.imencode(".jpg", foto, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+class _ServidorLocal(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latencia_midia = 0.0
+    latencia_sefaz = 0.0
+    base = ""
+    pagina = b""
+    midias = {}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        caminho = self.path.split("?")[0]
+        if caminho.startswith("/sefaz/"):
+            time.sleep(self.latencia_sefaz)
+            return self._responder(200, self.pagina, "text/html; charset=utf-8")
+        tipo, _, arquivo = caminho.strip("/").partition("/")
+        if tipo not in ("cupom", "pedagio") or not arquivo.split(".")[0].isdigit():
+            return self._responder(404, b"", "text/plain")
+        time.sleep(self.latencia_midia)
+        with self.lock:
+            if caminho not in self.midias:
+                usuario = int(arquivo.split(".")[0])
+                self.midias[caminho] = (gerar_cupom(usuario, f"{self.base}/sefaz/qrcode") if tipo == "cupom"
+                                        else gerar_pedagio(usuario))
+            conteudo = self.midias[caminho]
+        self._responder(200, conteudo, "image/jpeg")
+
+    def _responder(self, status, corpo, tipo):
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+
+def subir_servidor(latencia_midia, latencia_sefaz):
+    with open(os.path.join(PASTA_BENCHMARKS, "corpus_nfce", "sp_portal_padrao.html"), encoding="utf-8") as f:
+        _ServidorLocal.pagina = f.read().encode("utf-8")
+    _ServidorLocal.latencia_midia = latencia_midia
+    _ServidorLocal.latencia_sefaz = latencia_sefaz
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), _ServidorLocal)
+    servidor.daemon_threads = True
+    _ServidorLocal.base = f"http://127.0.0.1:{servidor.server_address[1]}"
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, _ServidorLocal.base
+
+
+# --- PROCESSO FILHO (o bot) ---
+class _EnviadorCronometrado:
+    def __init__(self, destinos):
+        self._caixas = {destino: queue.Queue() for destino in destinos}
+
+    def enviar(self, destino, texto):
+        self._caixas[destino].put((time.perf_counter(), texto))
+
+    def aguardar(self, destino, timeout):
+        return self._caixas[destino].get(timeout=timeout)
+
+
+def _preencher(form, usuario, midias):
+    numero = f"+55119{usuario:08d}"
+    valores = {"numero": numero, "wa_id": numero[1:], "usuario": usuario, "midias": midias,
+               "sid": f"SM{usuario:08d}{time.perf_counter_ns():024x}"[:34]}
+    return {campo: valor.format(**valores) for campo, valor in form.items()}
+
+
+def _ocr_disponivel():
+    import numpy as np
+    from processador_pedagio import reconhecer_palavras
+    try:
+        reconhecer_palavras(np.full((60, 200), 255, np.uint8))
+        return True
+    except Exception:
+        return False
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def executar_filho(config):
+    os.environ.update({
+        "LOG_NIVEL": "ERROR",
+        "ARMAZENAMENTO": "memoria",
+        "CACHE_RESULTADOS_DB": ":memory:",
+        "NUM_WORKERS_FILA": str(config["workers"]),
+        # O portal é local: o agendador não deve ser o gargalo medido.
+        "SEFAZ_REQ_POR_SEGUNDO": "0",
+        "SEFAZ_MAX_SIMULTANEAS": "64",
+    })
+    for variavel in ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_WHATSAPP_NUMBER"):
+        os.environ.pop(variavel, None)
+    import app
+
+    usuarios = list(range(config["usuarios"]))
+    app.PASTA_PLANILHAS = tempfile.mkdtemp(prefix="benchmark_webhook_")
+    app.enviador = _EnviadorCronometrado([f"whatsapp:+55119{u:08d}" for u in usuarios])
+    app.precarregar(navegador=False)
+    cliente = app.app.test_client()
+
+    with open(os.path.join(PASTA_BENCHMARKS, "corpus_webhook", "conversa.json"), encoding="utf-8") as f:
+        conversa = json.load(f)
+    pular = set()
+    if not _ocr_disponivel():
+        pular.add("pedagio")
+
+    def rodar_usuario(usuario, mensagens):
+        latencias, erros = [], 0
+        for mensagem in mensagens:
+            form = _preencher(mensagem["form"], usuario, config["midias"])
+            inicio = time.perf_counter()
+            resposta = cliente.post("/whatsapp", data=form)
+            fim, texto = time.perf_counter(), resposta.get_data(as_text=True)
+            if resposta.status_code == 200 and mensagem["etapa"] in ETAPAS_NA_FILA:
+                fim, texto = app.enviador.aguardar(form["From"], timeout=config["timeout"])
+            latencias.append(fim - inicio)
+            erros += resposta.status_code != 200 or any(erro in texto for erro in RESPOSTAS_DE_ERRO)
+        return latencias, erros
+
+    resultados = {}
+    for etapa in ETAPAS:
+        if etapa in pular:
+            resultados[etapa] = {"pulada": "sem motor de OCR"}
+            continue
+        mensagens = [m for m in conversa if m["etapa"] == etapa]
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=config["threads"]) as executor:
+            por_usuario = list(executor.map(lambda u: rodar_usuario(u, mensagens), usuarios))
+        duracao = time.perf_counter() - inicio
+        latencias = [lat for lats, _ in por_usuario for lat in lats]
+        resultados[etapa] = {
+            "n": len(latencias),
+            "p50_ms": _percentil(latencias, 50) * 1000,
+            "p95_ms": _percentil(latencias, 95) * 1000,
+            "p99_ms": _percentil(latencias, 99) * 1000,
+            "rps": len(latencias) / duracao,
+            # ru_maxrss vem em KB no Linux.
+            "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "erros": sum(erros for _, erros in por_usuario),
+        }
+    app.fila.parar()
+    print(json.dumps(resultados))
+
+
+# --- PROCESSO PRINCIPAL ---
+def rodar_rodada(config):
+    saida = subprocess.run([sys.executable, os.path.abspath(__file__), "--filho", json.dumps(config)],
+                           cwd=PASTA_RAIZ, capture_output=True, text=True)
+    if saida.returncode != 0:
+        raise RuntimeError(f"Rodada com {config['threads']} thread(s) falhou:\n{saida.stderr[-2000:]}")
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def comparar(atual, referencia, tolerancia):
+    regressoes = []
+    for rodada, etapas in referencia.items():
+        for etapa, base in etapas.items():
+            medido = atual.get(rodada, {}).get(etapa)
+            if not medido or "pulada" in base or "pulada" in medido:
+                continue
+            if medido["p95_ms"] > max(base["p95_ms"] * (1 + tolerancia), base["p95_ms"] + FOLGA_P95_MS):
+                regressoes.append(f"{rodada}/{etapa}: p95 {base['p95_ms']:.1f} -> {medido['p95_ms']:.1f} ms")
+            if medido["rps"] < base["rps"] * (1 - tolerancia):
+                regressoes.append(f"{rodada}/{etapa}: vazão {base['rps']:.1f} -> {medido['rps']:.1f} req/s")
+            if medido["rss_mb"] > base["rss_mb"] * (1 + tolerancia):
+                regressoes.append(f"{rodada}/{etapa}: RSS {base['rss_mb']:.0f} -> {medido['rss_mb']:.0f} MB")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga de ponta a ponta do webhook /whatsapp.")
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4],
+                        help="Clientes simultâneos de cada rodada (também os workers da fila).")
+    parser.add_argument("--latencia-midia", type=float, default=0.02)
+    parser.add_argument("--latencia-sefaz", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--salvar", help="Grava os resultados em JSON (referência).")
+    parser.add_argument("--comparar", help="Compara com uma referência gravada por --salvar.")
+    parser.add_argument("--tolerancia", type=float, default=0.25)
+    parser.add_argument("--filho", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.filho:
+        executar_filho(json.loads(args.filho))
+        return 0
+
+    servidor, base = subir_servidor(args.latencia_midia, args.latencia_sefaz)
+    # Gera as fotos antes: a primeira rodada não paga a geração dentro da latência.
+    for usuario in range(args.usuarios):
+        _ServidorLocal.midias[f"/cupom/{usuario}.jpg"] = gerar_cupom(usuario, f"{base}/sefaz/qrcode")
+        _ServidorLocal.midias[f"/pedagio/{usuario}.jpg"] = gerar_pedagio(usuario)
+    print(f"{args.usuarios} usuários, {os.cpu_count()} núcleos, mídia +{args.latencia_midia * 1000:.0f} ms, "
+          f"SEFAZ +{args.latencia_sefaz * 1000:.0f} ms\n")
+    print(f"{'rodada':<12}{'etapa':<10}{'n':>5}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}"
+          f"{'req/s':>9}{'rss_mb':>9}{'erros':>7}")
+    resultados = {}
+    for threads in args.threads:
+        rodada = f"{threads}_thread" + ("s" if threads > 1 else "")
+        resultados[rodada] = rodar_rodada({
+            "usuarios": args.usuarios, "threads": threads, "workers": threads,
+            "midias": base, "timeout": args.timeout})
+        for etapa, r in resultados[rodada].items():
+            if "pulada" in r:
+                print(f"{rodada:<12}{etapa:<10}  (pulada: {r['pulada']})")
+                continue
+            print(f"{rodada:<12}{etapa:<10}{r['n']:>5}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+                  f"{r['rps']:>9.1f}{r['rss_mb']:>9.0f}{r['erros']:>7}")
+    servidor.shutdown()
+
+    falhas = sum(r.get("erros", 0) for etapas in resultados.values() for r in etapas.values())
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regressoes = comparar(resultados, json.load(f), args.tolerancia)
+        print()
+        for regressao in regressoes:
+            print(f"REGRESSÃO {regressao}")
+        if not regressoes:
+            print(f"OK sem regressões acima de {args.tolerancia:.0%}")
+        falhas += len(regressoes)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
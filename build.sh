@@ -3,4 +3,5 @@
 set -o errexit
 
 apt-get update
-apt-get install -y tesseract-ocr tesseract-ocr-por
\ No newline at end of file
+# libtesseract-dev e libleptonica-dev: o tesserocr compila contra eles onde não houver wheel.
+apt-get install -y tesseract-ocr tesseract-ocr-por libtesseract-dev libleptonica-dev pkg-config
\ No newline at end of file
@@ -0,0 +1,128 @@
+# cache_resultados.py
+# Cache persistente (SQLite) dos resultados já extraídos, endereçado pelo
+# conteúdo: hash dos bytes da imagem, chave de acesso da NFC-e (44 dígitos) e,
+# para extratos de pedágio, hash das transações lidas. Um acerto pula detecção
+# do QR, consulta à SEFAZ e OCR, e permite avisar o usuário que o comprovante
+# é repetido.
+# Só chaves exatas: hash perceptual não serve, porque extratos diferentes com
+# o mesmo layout geram o mesmo dHash. A mesma foto reencaminhada (bytes
+# diferentes) é reconhecida depois de lida, pela chave de acesso do cupom ou
+# pelas transações do extrato.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from decodificador_nfce import REGEX_CHAVE, decodificar_chave
+from observabilidade import CACHE, obter_logger
+
+
+log = obter_logger("cache")
+
+
+# --- CHAVES ---
+# Só chave com dígito verificador válido: um QR mal lido não vira chave de cache.
+def extrair_chave_acesso(url_qr):
+    if not url_qr:
+        return None
+    match = REGEX_CHAVE.search(url_qr)
+    return match.group(1) if match and decodificar_chave(match.group(1)) else None
+
+
+def hash_bytes(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+def chaves_da_imagem(conteudo):
+    return [f"img:{hash_bytes(conteudo)}"]
+
+
+# Mesmo extrato = mesmas transações (data, tipo, valor, placa), em qualquer ordem.
+def chave_do_extrato(transacoes):
+    campos = sorted((str(t.get("Data")), str(t.get("Tipo de Despesa")), f"{t.get('Valor', 0):.2f}",
+                     str(t.get("Observação", ""))) for t in transacoes)
+    return f"extrato:{hash_bytes(json.dumps(campos, ensure_ascii=False).encode('utf-8'))}"
+
+
+# --- CACHE ---
+class CacheResultados:
+    def __init__(self, caminho, ttl_segundos=None, max_entradas=None):
+        self.caminho = caminho
+        self.ttl_segundos = ttl_segundos or int(os.environ.get("CACHE_TTL_SEGUNDOS", 30 * 24 * 3600))
+        self.max_entradas = max_entradas or int(os.environ.get("CACHE_MAX_ENTRADAS", 10000))
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("""
+            CREATE TABLE IF NOT EXISTS resultados (
+                chave TEXT PRIMARY KEY,
+                resultado TEXT NOT NULL,
+                remetentes TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL
+            )""")
+        self._conexao.execute(
+            "CREATE INDEX IF NOT EXISTS idx_resultados_acesso ON resultados (acessado_em)")
+        self._conexao.commit()
+
+    # Retorna {"resultado": ..., "remetentes": [...]} da primeira chave encontrada.
+    def buscar(self, chaves):
+        agora = time.time()
+        with self._lock:
+            for chave in chaves:
+                linha = self._conexao.execute(
+                    "SELECT resultado, remetentes, criado_em FROM resultados WHERE chave = ?",
+                    (chave,)).fetchone()
+                if not linha:
+                    continue
+                resultado, remetentes, criado_em = linha
+                if agora - criado_em > self.ttl_segundos:
+                    self._conexao.execute("DELETE FROM resultados WHERE chave = ?", (chave,))
+                    self._conexao.commit()
+                    continue
+                self._conexao.execute(
+                    "UPDATE resultados SET acessado_em = ? WHERE chave = ?", (agora, chave))
+                self._conexao.commit()
+                tipo_chave = chave.split(':')[0]
+                log.info("Cache hit.", extra={"chave": tipo_chave})
+                CACHE.inc(resultado="hit", chave=tipo_chave)
+                return {"resultado": json.loads(resultado), "remetentes": json.loads(remetentes)}
+        CACHE.inc(resultado="miss", chave="-")
+        return None
+
+    # Grava o resultado sob todas as chaves e marca o remetente como já lançado.
+    def salvar(self, chaves, resultado, remetente):
+        agora = time.time()
+        resultado_json = json.dumps(resultado, ensure_ascii=False)
+        with self._lock:
+            for chave in chaves:
+                linha = self._conexao.execute(
+                    "SELECT remetentes FROM resultados WHERE chave = ?", (chave,)).fetchone()
+                remetentes = json.loads(linha[0]) if linha else []
+                if remetente not in remetentes:
+                    remetentes.append(remetente)
+                self._conexao.execute(
+                    """INSERT INTO resultados (chave, resultado, remetentes, criado_em, acessado_em)
+                       VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT(chave) DO UPDATE SET
+                           resultado = excluded.resultado,
+                           remetentes = excluded.remetentes,
+                           acessado_em = excluded.acessado_em""",
+                    (chave, resultado_json, json.dumps(remetentes), agora, agora))
+            self._evictar(agora)
+            self._conexao.commit()
+
+    def _evictar(self, agora):
+        # TTL primeiro; depois LRU pelo último acesso se passar do limite.
+        self._conexao.execute(
+            "DELETE FROM resultados WHERE criado_em < ?", (agora - self.ttl_segundos,))
+        total = self._conexao.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+        excesso = total - self.max_entradas
+        if excesso > 0:
+            self._conexao.execute(
+                """DELETE FROM resultados WHERE chave IN (
+                       SELECT chave FROM resultados ORDER BY acessado_em ASC LIMIT ?)""",
+                (excesso,))
@@ -0,0 +1,150 @@
+# classificador_midia.py
+# Classificação barata da imagem antes do QR Code e do OCR: cupom fiscal,
+# extrato de pedágio ou desconhecido, com uma confiança de 0 a 1. Tudo é
+# medido numa miniatura (lado maior CLASSIFICADOR_LADO, padrão 800 px):
+# - padrões de localização do QR (três quadrados aninhados em "L") indicam cupom;
+# - várias linhas de texto sobre fundo liso, sem ruído de câmera, indicam
+#   extrato (captura de tela do app da concessionária).
+# Só uma classificação com confiança >= CLASSIFICADOR_LIMIAR muda o caminho:
+# extrato confiante faz uma única tentativa barata de QR antes do OCR (as
+# outras só voltam se o OCR não achar transações); cupom confiante ganha as
+# tentativas caras de QR e não cai no OCR de pedágio.
+# Abaixo do limiar, o fluxo é o de sempre.
+
+import os
+
+import cv2
+import numpy as np
+
+from observabilidade import CLASSIFICACAO, obter_logger
+from processador_imagem import (ESFORCO_QR_MAXIMO, ESFORCO_QR_MINIMO, ESFORCO_QR_PADRAO,
+                                obter_imagem, redimensionar_lado_max)
+
+
+log = obter_logger("classificador")
+
+CUPOM = "cupom"
+PEDAGIO = "pedagio"
+DESCONHECIDO = "desconhecido"
+
+ATIVO = os.environ.get("CLASSIFICADOR_MIDIA", "1") == "1"
+LADO_MINIATURA = int(os.environ.get("CLASSIFICADOR_LADO", 800))
+LIMIAR_CONFIANCA = float(os.environ.get("CLASSIFICADOR_LIMIAR", 0.8))
+
+
+# --- PADRÕES DE LOCALIZAÇÃO DO QR ---
+# Contorno escuro com um buraco e um quadrado escuro dentro (7x7, 5x5 e 3x3
+# módulos). Letras têm no máximo um nível de buraco.
+def _localizadores_qr(binaria):
+    contornos, hierarquia = cv2.findContours(binaria, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarquia is None:
+        return []
+    hierarquia = hierarquia[0]
+    candidatos = []
+    for i, (_, _, filho, _) in enumerate(hierarquia):
+        if filho < 0 or hierarquia[filho][2] < 0:
+            continue
+        x, y, largura, altura = cv2.boundingRect(contornos[i])
+        if min(largura, altura) < 6 or not 0.7 <= largura / altura <= 1.4:
+            continue
+        area = cv2.contourArea(contornos[i])
+        area_centro = cv2.contourArea(contornos[hierarquia[filho][2]])
+        if area <= 0 or not 0.08 <= area_centro / area <= 0.4:
+            continue
+        centro = (x + largura / 2, y + altura / 2, max(largura, altura))
+        # O mesmo padrão pode aparecer duas vezes (contornos aninhados).
+        if all(abs(centro[0] - c[0]) + abs(centro[1] - c[1]) > centro[2] / 2 for c in candidatos):
+            candidatos.append(centro)
+    return candidatos
+
+
+# Três localizadores de tamanho parecido formando um triângulo retângulo
+# isósceles (os cantos do QR).
+def _tem_triangulo_qr(candidatos):
+    candidatos = candidatos[:12]
+    for i, a in enumerate(candidatos):
+        for j in range(i + 1, len(candidatos)):
+            b = candidatos[j]
+            for c in candidatos[j + 1:]:
+                lados = [a[2], b[2], c[2]]
+                if max(lados) > 1.5 * min(lados):
+                    continue
+                distancias = sorted(np.hypot(p[0] - q[0], p[1] - q[1]) for p, q in ((a, b), (a, c), (b, c)))
+                perna1, perna2, hipotenusa = distancias
+                if perna1 < 2 * min(lados) or perna2 > 1.3 * perna1:
+                    continue
+                if abs(hipotenusa - np.hypot(perna1, perna2)) <= 0.15 * hipotenusa:
+                    return True
+    return False
+
+
+# --- MEDIDAS DA MINIATURA ---
+def _medidas(miniatura):
+    binaria = cv2.adaptiveThreshold(miniatura, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                    cv2.THRESH_BINARY_INV, 31, 10)
+    candidatos = _localizadores_qr(binaria)
+
+    # Foto de câmera tem ruído e sombras em toda parte; captura de tela é lisa
+    # fora do texto.
+    laplaciano = np.abs(cv2.Laplacian(miniatura, cv2.CV_16S))
+    fundo_liso = np.count_nonzero(laplaciano <= 1) / miniatura.size
+
+    # Linhas de texto: faixas horizontais com tinta separadas por faixas vazias.
+    tinta_por_linha = binaria.mean(axis=1) / 255
+    com_tinta = tinta_por_linha > 0.01
+    linhas_texto = int(np.count_nonzero(com_tinta[1:] & ~com_tinta[:-1]) + com_tinta[0])
+
+    return {
+        "localizadores_qr": len(candidatos),
+        "triangulo_qr": _tem_triangulo_qr(candidatos),
+        "fundo_liso": round(float(fundo_liso), 3),
+        "linhas_texto": linhas_texto,
+        "densidade_texto": round(float(binaria.mean() / 255), 3),
+    }
+
+
+def _pontuar(medidas):
+    if medidas["triangulo_qr"]:
+        cupom = 0.95
+    else:
+        cupom = min(0.7, 0.25 * medidas["localizadores_qr"])
+    pedagio = 0.0
+    if not medidas["localizadores_qr"]:
+        # Sem várias linhas de texto não é extrato, por mais limpa que seja a imagem.
+        pedagio = min(1.0, medidas["linhas_texto"] / 6) * (0.5 + 0.5 * medidas["fundo_liso"])
+    return cupom, round(pedagio, 3)
+
+
+# `imagem` pode ser o caminho, um ndarray ou uma ImagemDecodificada.
+def classificar_imagem(imagem):
+    cinza = obter_imagem(imagem).cinza
+    miniatura = redimensionar_lado_max(cinza, LADO_MINIATURA)
+    medidas = _medidas(miniatura)
+    cupom, pedagio = _pontuar(medidas)
+    if max(cupom, pedagio) < 0.5:
+        tipo, confianca = DESCONHECIDO, max(cupom, pedagio)
+    elif cupom >= pedagio:
+        tipo, confianca = CUPOM, cupom
+    else:
+        tipo, confianca = PEDAGIO, pedagio
+    classificacao = {"tipo": tipo, "confianca": confianca, "medidas": medidas}
+    CLASSIFICACAO.inc(tipo=tipo, confianca="alta" if confiante(classificacao) else "baixa")
+    log.info("Imagem classificada.", extra={"tipo": tipo, "confianca": confianca, **medidas})
+    return classificacao
+
+
+def confiante(classificacao):
+    return (classificacao is not None and classificacao["tipo"] != DESCONHECIDO
+            and classificacao["confianca"] >= LIMIAR_CONFIANCA)
+
+
+# Quanto esforço gastar na detecção do QR (ver processador_imagem.tentativas_qr).
+def esforco_qr(classificacao):
+    if not ATIVO or not confiante(classificacao):
+        return ESFORCO_QR_PADRAO
+    return ESFORCO_QR_MAXIMO if classificacao["tipo"] == CUPOM else ESFORCO_QR_MINIMO
+
+
+# Cupom confiante sem QR legível: o OCR de pedágio não acharia nada.
+def cupom_sem_qr(classificacao):
+    return ATIVO and confiante(classificacao) and classificacao["tipo"] == CUPOM
@@ -0,0 +1,160 @@
+# decodificador_nfce.py
+# Extrai os dados da NFC-e direto da URL do QR Code, sem acessar a rede.
+#
+# A chave de acesso (44 dígitos) traz: UF (2), ano/mês de emissão (AAMM),
+# CNPJ do emitente (14), modelo (65 = NFC-e), série (3), número (9), tipo de
+# emissão (1), código numérico (8) e dígito verificador (1, módulo 11).
+#
+# Formatos do parâmetro do QR Code:
+#   v1:            ?chNFe=<chave>&nVersao=100&tpAmb=1&dhEmi=<hex>&vNF=12.34&...
+#   v2/v3 online:  ?p=<chave>|2|<tpAmb>|<token>|<hash>            (sem valor nem dia)
+#   v2/v3 offline: ?p=<chave>|2|<tpAmb>|<dia>|<vNF>|<digVal>|...  (contingência)
+# Só o nome do estabelecimento nunca vem no QR: para ele ainda é preciso a página.
+
+import re
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+UFS = {
+    "11": "RO", "12": "AC", "13": "AM", "14": "RR", "15": "PA", "16": "AP", "17": "TO",
+    "21": "MA", "22": "PI", "23": "CE", "24": "RN", "25": "PB", "26": "PE", "27": "AL",
+    "28": "SE", "29": "BA", "31": "MG", "32": "ES", "33": "RJ", "35": "SP", "41": "PR",
+    "42": "SC", "43": "RS", "50": "MS", "51": "MT", "52": "GO", "53": "DF",
+}
+TIPO_EMISSAO_OFFLINE = "9"
+
+REGEX_CHAVE = re.compile(r"(?<!\d)(\d{44})(?!\d)")
+REGEX_DATA_ISO = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
+
+
+# --- CHAVE DE ACESSO ---
+def digito_verificador(chave43):
+    pesos = [2, 3, 4, 5, 6, 7, 8, 9]
+    soma = sum(int(d) * pesos[i % 8] for i, d in enumerate(reversed(chave43)))
+    resto = soma % 11
+    return 0 if resto < 2 else 11 - resto
+
+
+def formatar_cnpj(cnpj):
+    return f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+
+
+def decodificar_chave(chave):
+    if not chave or len(chave) != 44 or not chave.isdigit():
+        return None
+    if digito_verificador(chave[:43]) != int(chave[43]):
+        return None
+    return {
+        "chave": chave,
+        "uf": UFS.get(chave[:2], chave[:2]),
+        "ano": 2000 + int(chave[2:4]),
+        "mes": int(chave[4:6]),
+        "cnpj": formatar_cnpj(chave[6:20]),
+        "modelo": chave[20:22],
+        "serie": int(chave[22:25]),
+        "numero": int(chave[25:34]),
+        "tipo_emissao": chave[34],
+    }
+
+
+# --- PAYLOAD DO QR CODE ---
+def _valor(texto):
+    try:
+        return float(texto.replace(",", "."))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _data_de_hex(dh_emi_hex):
+    try:
+        texto = bytes.fromhex(dh_emi_hex).decode("ascii")
+    except (ValueError, UnicodeDecodeError):
+        texto = dh_emi_hex
+    match = REGEX_DATA_ISO.search(texto)
+    return f"{match.group(3)}/{match.group(2)}/{match.group(1)}" if match else None
+
+
+# Retorna os campos que o QR Code permite saber sem rede, no mesmo formato de
+# analisar_html_cupom ("data_emissao", "cnpj", "valor_total"...), ou None se a
+# URL não tiver uma chave de acesso válida. Campos ausentes ficam como None.
+def decodificar_qr_nfce(url_qr):
+    if not url_qr:
+        return None
+    consulta = parse_qs(urlsplit(url_qr).query, keep_blank_values=True)
+    parametro_p = unquote(consulta["p"][0]) if consulta.get("p") else None
+    partes = parametro_p.split("|") if parametro_p else []
+
+    if partes:
+        chave = partes[0]
+    elif consulta.get("chNFe"):
+        chave = consulta["chNFe"][0]
+    else:
+        match = REGEX_CHAVE.search(url_qr)
+        chave = match.group(1) if match else None
+
+    dados_chave = decodificar_chave(chave)
+    if not dados_chave:
+        return None
+
+    data_emissao = None
+    valor_total = None
+    versao = None
+    if partes:
+        versao = partes[1] if len(partes) > 1 else None
+        # Contingência offline: dia da emissão e valor total vêm no próprio QR.
+        if dados_chave["tipo_emissao"] == TIPO_EMISSAO_OFFLINE and len(partes) >= 5 and partes[3].isdigit():
+            data_emissao = f"{int(partes[3]):02d}/{dados_chave['mes']:02d}/{dados_chave['ano']}"
+            valor_total = _valor(partes[4])
+    else:
+        versao = (consulta.get("nVersao") or [None])[0]
+        if consulta.get("dhEmi"):
+            data_emissao = _data_de_hex(consulta["dhEmi"][0])
+        if consulta.get("vNF"):
+            valor_total = _valor(consulta["vNF"][0])
+
+    return dict(
+        dados_chave,
+        versao_qr=versao,
+        data_emissao=data_emissao,
+        valor_total=valor_total,
+        nome_estabelecimento=None,
+    )
+
+
+# O QR Code basta para lançar o cupom quando traz valor e data.
+def qr_tem_dados_de_lancamento(dados_qr):
+    return bool(dados_qr) and bool(dados_qr["valor_total"]) and bool(dados_qr["data_emissao"])
+
+
+# Completa os dados da página com o que veio do QR (o QR é assinado e tem
+# prioridade para valor e data; a página é a única fonte do nome).
+def completar_com_qr(dados_pagina, dados_qr):
+    if not dados_qr:
+        return dados_pagina
+    dados = dict(dados_pagina or {})
+    if dados_qr["valor_total"]:
+        dados["valor_total"] = dados_qr["valor_total"]
+    if dados_qr["data_emissao"]:
+        dados["data_emissao"] = dados_qr["data_emissao"]
+    if dados.get("cnpj") in (None, "NÃO ENCONTRADO"):
+        dados["cnpj"] = dados_qr["cnpj"]
+    dados.setdefault("nome_estabelecimento", "NÃO ENCONTRADO")
+    dados["chave_acesso"] = dados_qr["chave"]
+    dados["uf"] = dados_qr["uf"]
+    return dados
+
+
+# Dados do cupom só com o QR Code, no formato de analisar_html_cupom. O nome
+# fica provisório (CNPJ do emitente) até a consulta à página em segundo plano.
+def dados_nota_do_qr(dados_qr, url_qr):
+    return {
+        "data_emissao": dados_qr["data_emissao"],
+        "nome_estabelecimento": f"Emitente CNPJ {dados_qr['cnpj']}",
+        "cnpj": dados_qr["cnpj"],
+        "valor_total": dados_qr["valor_total"],
+        "chave_acesso": dados_qr["chave"],
+        "uf": dados_qr["uf"],
+        "fonte": "qr",
+        "nome_pendente": True,
+        "url_qr": url_qr,
+    }
@@ -0,0 +1,42 @@
+# enviador_mensagens.py
+# Envio de mensagens de saída (fora da resposta TwiML do webhook).
+# Em produção usa a API REST da Twilio; em testes/local usa um stub em memória.
+
+import os
+import threading
+
+from observabilidade import obter_logger
+
+
+log = obter_logger("enviador")
+
+
+class EnviadorTwilio:
+    def __init__(self, account_sid, auth_token, remetente):
+        from twilio.rest import Client
+        self.cliente = Client(account_sid, auth_token)
+        self.remetente = remetente
+
+    def enviar(self, destino, texto):
+        self.cliente.messages.create(from_=self.remetente, to=destino, body=texto)
+
+
+class EnviadorStub:
+    def __init__(self):
+        self.mensagens = []
+        self._lock = threading.Lock()
+
+    def enviar(self, destino, texto):
+        with self._lock:
+            self.mensagens.append({"destino": destino, "texto": texto})
+        log.info("[stub] Mensagem enviada.", extra={"destino": destino, "texto": texto})
+
+
+def criar_enviador():
+    account_sid = os.environ.get("TWILIO_ACCOUNT_SID")
+    auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
+    remetente = os.environ.get("TWILIO_WHATSAPP_NUMBER")
+    if all([account_sid, auth_token, remetente]):
+        return EnviadorTwilio(account_sid, auth_token, remetente)
+    log.warning("TWILIO_WHATSAPP_NUMBER não configurado. Usando enviador stub (mensagens só no log).")
+    return EnviadorStub()
@@ -0,0 +1,286 @@
+# exportacao.py
+# Camada única de exportação das transações:
+# - xlsx: preenche o modelo de reembolso preservando o layout. Quando os
+#   lançamentos passam da área de dados, o rodapé inteiro (TOTAL A RECEBER,
+#   resumo por tipo, aprovações) desce de uma vez só para logo depois da
+#   última transação, com as células mescladas, alturas, validações e as
+#   fórmulas de totais recalculadas para cobrir todas as linhas. A linha de
+#   totais é localizada pelo rótulo, sem número de linha fixo.
+# - csv: separador ";" e vírgula decimal (abre direto no Excel em pt-BR).
+# - parquet: tabela colunar via pyarrow (dependência opcional).
+# As linhas são montadas uma vez a partir de `Transacao` e escritas em bloco
+# (`sheet.cell` por coordenada numérica, `writerows`, colunas do pyarrow).
+# csv e parquet aceitam qualquer iterável (ex.: o gerador de
+# armazenamento.iterar_transacoes) e gravam em fluxo, sem montar a lista
+# inteira: relatórios de períodos grandes usam memória constante.
+
+import csv
+import os
+import re
+import tempfile
+from copy import copy
+
+from observabilidade import medir, obter_logger
+from transacao import Transacao
+
+
+log = obter_logger("exportacao")
+
+
+PRIMEIRA_LINHA_TRANSACOES = 10
+ROTULO_TOTAIS = "TOTAL A RECEBER"
+# Colunas da planilha: DATA, CLIENTE, TIPO DE DESPESA, ORIGEM, DESTINO, VALOR.
+COLUNAS_PLANILHA = (2, 3, 4, 6, 7, 9)
+COLUNA_ROTULOS = 2
+
+CAMPOS_TABELA = ("data", "tipo_despesa", "estabelecimento", "observacao", "origem", "destino", "valor")
+
+FORMATOS = {".xlsx": "xlsx", ".csv": "csv", ".parquet": "parquet"}
+# Linhas por grupo do arquivo Parquet (e por lote lido do iterável).
+LOTE_PARQUET = 10000
+
+# Referência de célula numa fórmula (A1, $I$45, Plan2!D50), sem pegar nomes de função.
+_REFERENCIA = re.compile(r"(?<![A-Za-z0-9_.])(\$?[A-Z]{1,3}\$?)(\d+)(?![\d(A-Za-z_])")
+
+
+def linhas_planilha(transacoes):
+    return [(t.data, t.cliente, t.tipo_despesa, t.origem, t.destino, t.valor)
+            for t in map(Transacao.de, transacoes)]
+
+
+# --- XLSX ---
+def escrever_dados_iniciais(sheet, dados):
+    sheet["H3"] = dados.get("nome", "")
+    sheet["H4"] = dados.get("cpf_cnpj", "")
+    sheet["H5"] = dados.get("banco", "")
+    sheet["H6"] = dados.get("agencia_cc", "")
+    sheet["H7"] = dados.get("pix", "")
+    sheet["F4"] = dados.get("data_inicial", "")
+    sheet["F5"] = dados.get("data_final", "")
+
+
+def _eh_rotulo_totais(valor):
+    return str(valor or "").strip().upper() == ROTULO_TOTAIS
+
+
+# Varre a coluna B uma vez e retorna (próxima linha livre, linha de totais).
+# Sem o rótulo no modelo, usa `linha_dos_totais_padrao` ou trata a planilha
+# como sem rodapé.
+def localizar_linhas(sheet, linha_dos_totais_padrao=None):
+    proxima_linha = None
+    colunas = sheet.iter_rows(min_row=PRIMEIRA_LINHA_TRANSACOES, min_col=COLUNA_ROTULOS,
+                              max_col=COLUNA_ROTULOS, values_only=True)
+    for linha, (valor,) in enumerate(colunas, start=PRIMEIRA_LINHA_TRANSACOES):
+        if _eh_rotulo_totais(valor):
+            return proxima_linha or linha, linha
+        if valor is None and proxima_linha is None:
+            proxima_linha = linha
+    proxima_linha = proxima_linha or max(sheet.max_row + 1, PRIMEIRA_LINHA_TRANSACOES)
+    if linha_dos_totais_padrao and linha_dos_totais_padrao >= proxima_linha:
+        return proxima_linha, linha_dos_totais_padrao
+    return proxima_linha, max(sheet.max_row, proxima_linha) + 1
+
+
+def _deslocar_formula(formula, a_partir_de, delta):
+    def deslocar(ref):
+        linha = int(ref.group(2))
+        return ref.group(0) if linha < a_partir_de else f"{ref.group(1)}{linha + delta}"
+    return _REFERENCIA.sub(deslocar, formula)
+
+
+# Desce o rodapé (da linha de totais até o fim) para `nova_linha`. As
+# referências à última linha de dados passam a apontar para a nova última
+# linha, então SUM/SUMIF continuam cobrindo todos os lançamentos.
+def deslocar_rodape(sheet, linha_dos_totais, nova_linha):
+    from openpyxl.utils import get_column_letter
+
+    delta = nova_linha - linha_dos_totais
+    ultima_linha_dados = linha_dos_totais - 1
+    ultima_coluna = sheet.max_column
+    ultima_linha = sheet.max_row
+    if linha_dos_totais <= ultima_linha:
+        sheet.move_range(f"A{linha_dos_totais}:{get_column_letter(ultima_coluna)}{ultima_linha}", rows=delta)
+
+    for linha in sheet.iter_rows(min_row=nova_linha, max_row=ultima_linha + delta):
+        for celula in linha:
+            if isinstance(celula.value, str) and celula.value.startswith("="):
+                celula.value = _deslocar_formula(celula.value, ultima_linha_dados, delta)
+
+    for intervalo in sheet.merged_cells.ranges:
+        if intervalo.min_row >= linha_dos_totais:
+            intervalo.shift(row_shift=delta)
+
+    for validacao in sheet.data_validations.dataValidation:
+        for intervalo in validacao.sqref.ranges:
+            if intervalo.max_row >= ultima_linha_dados and intervalo.min_row < linha_dos_totais:
+                intervalo.expand(down=delta)
+            elif intervalo.min_row >= linha_dos_totais:
+                intervalo.shift(row_shift=delta)
+        for atributo in ("formula1", "formula2"):
+            formula = getattr(validacao, atributo)
+            if formula:
+                setattr(validacao, atributo, _deslocar_formula(formula, ultima_linha_dados, delta))
+
+    alturas = {linha: dimensao for linha, dimensao in sheet.row_dimensions.items() if linha >= linha_dos_totais}
+    for linha in alturas:
+        del sheet.row_dimensions[linha]
+    for linha, dimensao in alturas.items():
+        dimensao.index = linha + delta
+        sheet.row_dimensions[linha + delta] = dimensao
+
+    sheet.parent.calculation.fullCalcOnLoad = True
+    return nova_linha
+
+
+# Escreve as transações a partir de `proxima_linha` e retorna a nova
+# (próxima linha, linha de totais). O rodapé só se move se faltar espaço; as
+# linhas abertas no lugar dele herdam o estilo da última linha de dados do
+# modelo, copiado célula a célula como no `copy_worksheet` do openpyxl.
+def escrever_transacoes(sheet, transacoes, proxima_linha, linha_dos_totais):
+    linhas = linhas_planilha(transacoes)
+    fim = proxima_linha + len(linhas)
+    primeira_nova = linha_dos_totais
+    estilos = []
+    if fim > linha_dos_totais:
+        estilos = [sheet.cell(linha_dos_totais - 1, coluna)._style for coluna in range(1, sheet.max_column + 1)]
+        linha_dos_totais = deslocar_rodape(sheet, linha_dos_totais, fim)
+
+    celula = sheet.cell
+    for linha, valores in enumerate(linhas, start=proxima_linha):
+        if linha < primeira_nova:
+            for coluna, valor in zip(COLUNAS_PLANILHA, valores):
+                celula(linha, coluna, valor)
+            continue
+        por_coluna = dict(zip(COLUNAS_PLANILHA, valores))
+        for coluna, estilo in enumerate(estilos, start=1):
+            celula(linha, coluna, por_coluna.get(coluna))._style = copy(estilo)
+    return fim, linha_dos_totais
+
+
+def carregar_modelo(arquivo_modelo, nome_da_aba):
+    # openpyxl só é carregado quando uma planilha é gerada de fato.
+    import openpyxl
+    workbook = openpyxl.load_workbook(arquivo_modelo)
+    return workbook, workbook[nome_da_aba]
+
+
+# Grava em arquivo temporário na mesma pasta e troca com os.replace.
+def _gravar_atomico(arquivo_destino, gravar, sufixo):
+    pasta = os.path.dirname(os.path.abspath(arquivo_destino))
+    os.makedirs(pasta, exist_ok=True)
+    descritor, caminho_temp = tempfile.mkstemp(dir=pasta, suffix=sufixo + ".tmp")
+    os.close(descritor)
+    try:
+        gravar(caminho_temp)
+        os.replace(caminho_temp, arquivo_destino)
+    except BaseException:
+        if os.path.exists(caminho_temp):
+            os.remove(caminho_temp)
+        raise
+
+
+def salvar_workbook(workbook, arquivo_destino):
+    with medir("salvar_planilha"):
+        _gravar_atomico(arquivo_destino, workbook.save, ".xlsx")
+
+
+# O modelo é preenchido em memória (openpyxl), então o xlsx materializa as
+# transações; para períodos grandes, prefira csv ou parquet.
+# `linha_dos_totais` só é usada em modelos sem o rótulo TOTAL A RECEBER.
+def exportar_xlsx(transacoes, arquivo_destino, arquivo_modelo, nome_da_aba, dados=None, linha_dos_totais=None):
+    transacoes = list(transacoes)
+    workbook, sheet = carregar_modelo(arquivo_modelo, nome_da_aba)
+    if dados:
+        escrever_dados_iniciais(sheet, dados)
+    proxima_linha, linha_dos_totais = localizar_linhas(sheet, linha_dos_totais)
+    escrever_transacoes(sheet, transacoes, proxima_linha, linha_dos_totais)
+    salvar_workbook(workbook, arquivo_destino)
+    return len(transacoes)
+
+
+# --- CSV ---
+def _valor_brl(valor):
+    return f"{valor:.2f}".replace(".", ",") if isinstance(valor, (int, float)) else valor
+
+
+def _linhas_tabela(transacoes):
+    for t in map(Transacao.de, transacoes):
+        yield tuple(getattr(t, campo) for campo in CAMPOS_TABELA)
+
+
+def exportar_csv(transacoes, arquivo_destino):
+    gravadas = 0
+
+    def gravar(caminho):
+        nonlocal gravadas
+        # utf-8-sig: o Excel reconhece os acentos ao abrir o arquivo.
+        with open(caminho, "w", encoding="utf-8-sig", newline="") as f:
+            escritor = csv.writer(f, delimiter=";")
+            escritor.writerow(CAMPOS_TABELA)
+            for linha in _linhas_tabela(transacoes):
+                escritor.writerow(linha[:-1] + (_valor_brl(linha[-1]),))
+                gravadas += 1
+
+    with medir("exportar_csv"):
+        _gravar_atomico(arquivo_destino, gravar, ".csv")
+    return gravadas
+
+
+# --- Parquet ---
+def exportar_parquet(transacoes, arquivo_destino):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Exportar em Parquet requer o pacote pyarrow (pip install pyarrow).") from e
+
+    tipos = {campo: pa.string() for campo in CAMPOS_TABELA}
+    tipos["valor"] = pa.float64()
+    esquema = pa.schema([(campo, tipos[campo]) for campo in CAMPOS_TABELA])
+    gravadas = 0
+
+    # Um grupo de linhas por lote de LOTE_PARQUET transações.
+    def gravar(caminho):
+        nonlocal gravadas
+        with pq.ParquetWriter(caminho, esquema) as escritor:
+            lote = []
+            for linha in _linhas_tabela(transacoes):
+                lote.append(linha)
+                if len(lote) == LOTE_PARQUET:
+                    escritor.write_table(_tabela_parquet(pa, esquema, lote))
+                    gravadas += len(lote)
+                    lote = []
+            if lote or not gravadas:
+                escritor.write_table(_tabela_parquet(pa, esquema, lote))
+                gravadas += len(lote)
+
+    with medir("exportar_parquet"):
+        _gravar_atomico(arquivo_destino, gravar, ".parquet")
+    return gravadas
+
+
+def _tabela_parquet(pa, esquema, linhas):
+    colunas = list(zip(*linhas)) or [()] * len(esquema)
+    return pa.table([pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)], schema=esquema)
+
+
+def formato_do_arquivo(arquivo_destino):
+    extensao = os.path.splitext(arquivo_destino)[1].lower()
+    if extensao not in FORMATOS:
+        raise ValueError(f"Formato de exportação desconhecido: '{extensao}' (use .xlsx, .csv ou .parquet).")
+    return FORMATOS[extensao]
+
+
+# Exporta no formato indicado pela extensão do destino e retorna quantas
+# transações foram gravadas. O xlsx precisa do modelo e da aba; csv e parquet não.
+def exportar(transacoes, arquivo_destino, arquivo_modelo=None, nome_da_aba=None, dados=None):
+    formato = formato_do_arquivo(arquivo_destino)
+    if formato == "xlsx":
+        gravadas = exportar_xlsx(transacoes, arquivo_destino, arquivo_modelo, nome_da_aba, dados)
+    elif formato == "csv":
+        gravadas = exportar_csv(transacoes, arquivo_destino)
+    else:
+        gravadas = exportar_parquet(transacoes, arquivo_destino)
+    log.info("Transações exportadas.", extra={
+        "transacoes": gravadas, "formato": formato, "arquivo": os.path.basename(arquivo_destino)})
+    return gravadas
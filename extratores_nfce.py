@@ -0,0 +1,272 @@
+# extratores_nfce.py
+# Registro de extratores da página de consulta da NFC-e, um por layout de
+# portal da SEFAZ, escolhido pelo host da URL do QR Code (ou pela UF da chave
+# de acesso). Cada extrator usa expressões XPath compiladas uma única vez
+# sobre o lxml, em vez de percorrer a árvore inteira a cada cupom, e devolve
+# também os itens da nota.
+#
+# Formato devolvido (o mesmo de antes, mais "itens" e "layout"):
+#   {"nome_estabelecimento", "cnpj", "data_emissao", "valor_total",
+#    "itens": [{"descricao", "quantidade", "unidade", "valor_unitario", "valor_total"}],
+#    "layout"}
+#
+# Para um portal novo: criar uma subclasse de ExtratorNFCe com os XPaths do
+# layout e registrar com registrar_extrator(Extrator(), hosts=[...], ufs=[...]).
+
+import re
+import threading
+from urllib.parse import urlsplit
+
+from decodificador_nfce import decodificar_qr_nfce, formatar_cnpj
+
+
+NAO_ENCONTRADO = "NÃO ENCONTRADO"
+NAO_ENCONTRADA = "NÃO ENCONTRADA"
+
+REGEX_CNPJ = re.compile(r"(\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})")
+REGEX_DATA = re.compile(r"(\d{2}/\d{2}/\d{4})")
+REGEX_NUMERO = re.compile(r"\d{1,3}(?:\.\d{3})+,\d+|\d+(?:[.,]\d+)?")
+
+
+def _xpath(expressao):
+    from lxml import etree
+    return etree.XPath(expressao)
+
+
+def valor_brl(texto):
+    # "1.234,56" -> 1234.56; "5,99" -> 5.99; sem vírgula o ponto é decimal: "0.450" -> 0.45
+    if not texto:
+        return None
+    match = REGEX_NUMERO.search(texto.replace("R$", " "))
+    if not match:
+        return None
+    numero = match.group(0)
+    if "," in numero:
+        numero = numero.replace(".", "").replace(",", ".")
+    try:
+        return float(numero)
+    except ValueError:
+        return None
+
+
+def _cnpj(texto):
+    match = REGEX_CNPJ.search(texto)
+    return formatar_cnpj(re.sub(r"\D", "", match.group(1))) if match else NAO_ENCONTRADO
+
+
+def _texto(nos):
+    if not nos:
+        return ""
+    no = nos[0]
+    texto = no if isinstance(no, str) else no.text_content()
+    return " ".join(texto.split())
+
+
+def _analisar_html(html):
+    from lxml import html as lxml_html
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+    return lxml_html.fromstring(html)
+
+
+# --- EXTRATORES ---
+class ExtratorNFCe:
+    nome = "base"
+    # XPaths do layout; None quando o layout não tem o campo.
+    xpath_nome = None
+    xpath_cnpj = None
+    xpath_data = None
+    xpath_total = None
+    xpath_itens = None
+    # Relativos a cada item.
+    xpath_item_descricao = None
+    xpath_item_quantidade = None
+    xpath_item_unidade = None
+    xpath_item_valor_unitario = None
+    xpath_item_valor_total = None
+
+    def __init__(self):
+        self._compilados = {}
+        for campo in ("nome", "cnpj", "data", "total", "itens", "item_descricao", "item_quantidade",
+                      "item_unidade", "item_valor_unitario", "item_valor_total"):
+            expressao = getattr(self, f"xpath_{campo}")
+            self._compilados[campo] = _xpath(expressao) if expressao else None
+
+    def _buscar(self, campo, no):
+        xpath = self._compilados[campo]
+        return xpath(no) if xpath is not None else []
+
+    def extrair(self, html):
+        raiz = _analisar_html(html)
+        nome = _texto(self._buscar("nome", raiz)) or NAO_ENCONTRADO
+        data = REGEX_DATA.search(_texto(self._buscar("data", raiz)))
+        itens = [self._extrair_item(no) for no in self._buscar("itens", raiz)]
+        return {
+            "data_emissao": data.group(1) if data else NAO_ENCONTRADA,
+            "nome_estabelecimento": nome,
+            "cnpj": _cnpj(_texto(self._buscar("cnpj", raiz))),
+            "valor_total": valor_brl(_texto(self._buscar("total", raiz))) or 0.0,
+            "itens": [item for item in itens if item["descricao"]],
+            "layout": self.nome,
+        }
+
+    def _extrair_item(self, no):
+        quantidade = valor_brl(_texto(self._buscar("item_quantidade", no)))
+        unidade = _texto(self._buscar("item_unidade", no))
+        return {
+            "descricao": _texto(self._buscar("item_descricao", no)),
+            "quantidade": quantidade,
+            "unidade": re.sub(r"^UN:\s*", "", unidade, flags=re.IGNORECASE),
+            "valor_unitario": valor_brl(_texto(self._buscar("item_valor_unitario", no))),
+            "valor_total": valor_brl(_texto(self._buscar("item_valor_total", no))),
+        }
+
+
+# Layout do portal de consulta padrão (usado por SP e pela maioria das SEFAZ
+# que seguem o modelo nacional): div.txtTopo, table#tabResult, span.totalNumb.
+class ExtratorPortalPadrao(ExtratorNFCe):
+    nome = "portal_padrao"
+    xpath_nome = "(//div[contains(concat(' ', normalize-space(@class), ' '), ' txtTopo ')])[1]"
+    xpath_cnpj = ("(//div[contains(concat(' ', normalize-space(@class), ' '), ' text ')]"
+                  "[contains(., 'CNPJ')])[1]")
+    xpath_data = "(//strong[contains(., 'Emissão')]/..)[1]"
+    xpath_total = ("(//label[contains(translate(., 'VALORPAG', 'valorpag'), 'valor a pagar')]"
+                   "/following-sibling::span[contains(@class, 'totalNumb')])[1]")
+    xpath_itens = "//table[@id='tabResult']//tr[starts-with(@id, 'Item')]"
+    xpath_item_descricao = ".//span[contains(@class, 'txtTit')][1]"
+    xpath_item_quantidade = ".//span[contains(@class, 'Rqtd')]"
+    xpath_item_unidade = ".//span[contains(@class, 'RUN')]"
+    xpath_item_valor_unitario = ".//span[contains(@class, 'RvlUnit')]"
+    xpath_item_valor_total = ".//span[contains(@class, 'valor')]"
+
+
+# Layout do portal de Minas Gerais (portalsped): cabeçalho em tabela com o
+# nome em <h4><b>, itens em table#myTable e totais em linhas "Valor total R$".
+class ExtratorPortalMG(ExtratorNFCe):
+    nome = "portal_mg"
+    xpath_nome = "(//th//h4/b | //th//h4)[1]"
+    xpath_cnpj = "(//td[contains(., 'CNPJ')])[1]"
+    xpath_data = "(//td[contains(., 'Emissão')] | //*[contains(text(), 'Data Emissão')])[1]"
+    xpath_total = ("(//strong[contains(., 'Valor total R$')]/following-sibling::*[1]"
+                   " | //div[strong[contains(., 'Valor total R$')]]/following-sibling::div[1])[1]")
+    xpath_itens = "//table[@id='myTable']/tbody/tr"
+    xpath_item_descricao = "./td[1]/h7"
+    xpath_item_quantidade = "./td[2]"
+    xpath_item_unidade = "./td[3]"
+    xpath_item_valor_unitario = None
+    xpath_item_valor_total = "./td[4]"
+
+    def _extrair_item(self, no):
+        item = super()._extrair_item(no)
+        # O portal não mostra o valor unitário: deriva do total e da quantidade.
+        if item["quantidade"] and item["valor_total"] is not None:
+            item["valor_unitario"] = round(item["valor_total"] / item["quantidade"], 4)
+        return item
+
+
+# Último recurso para portais sem extrator: procura os rótulos no texto da página.
+class ExtratorGenerico(ExtratorNFCe):
+    nome = "generico"
+    REGEX_TOTAL = re.compile(r"Valor\s+(?:a\s+pagar|total)[^\d]{0,20}(\d[\d.]*,\d{2})", re.IGNORECASE)
+
+    def extrair(self, html):
+        raiz = _analisar_html(html)
+        for descartavel in raiz.xpath("//script | //style"):
+            descartavel.drop_tree()
+        texto = " ".join(raiz.text_content().split())
+        data = REGEX_DATA.search(texto[texto.find("Emiss"):] if "Emiss" in texto else texto)
+        total = self.REGEX_TOTAL.search(texto)
+        titulo = raiz.xpath("(//h1 | //h2 | //h3 | //h4)[1]")
+        return {
+            "data_emissao": data.group(1) if data else NAO_ENCONTRADA,
+            "nome_estabelecimento": _texto(titulo) or NAO_ENCONTRADO,
+            "cnpj": _cnpj(texto[texto.find("CNPJ"):]) if "CNPJ" in texto else NAO_ENCONTRADO,
+            "valor_total": valor_brl(total.group(1)) if total else 0.0,
+            "itens": [],
+            "layout": self.nome,
+        }
+
+
+# --- REGISTRO ---
+_extratores_por_host = {}
+_extratores_por_uf = {}
+_extrator_generico = None
+_registro_lock = threading.Lock()
+
+
+def registrar_extrator(extrator, hosts=(), ufs=()):
+    for host in hosts:
+        _extratores_por_host[host.lower()] = extrator
+    for uf in ufs:
+        _extratores_por_uf[uf.upper()] = extrator
+    return extrator
+
+
+# Os XPaths são compilados uma vez, no primeiro cupom (lxml só carrega aí).
+def _registrar_padroes():
+    global _extrator_generico
+    with _registro_lock:
+        if _extrator_generico is None:
+            _registrar_extratores_padrao()
+            _extrator_generico = ExtratorGenerico()
+
+
+def _registrar_extratores_padrao():
+    registrar_extrator(ExtratorPortalPadrao(), hosts=[
+        "www.nfce.fazenda.sp.gov.br", "nfce.fazenda.sp.gov.br",
+        "www.sefaz.rs.gov.br", "nfce.sefaz.ba.gov.br", "nfce.sefaz.pe.gov.br",
+        "www.sefaz.go.gov.br", "nfce.sefaz.am.gov.br", "www.fazenda.pr.gov.br",
+        "sat.sef.sc.gov.br", "www.sefaz.mt.gov.br", "www.dfe.ms.gov.br", "www.nfce.se.gov.br",
+    ], ufs=["SP", "RS", "BA", "PE", "GO", "AM", "PR", "SC", "MT", "MS", "SE"])
+    registrar_extrator(ExtratorPortalMG(), hosts=["portalsped.fazenda.mg.gov.br"], ufs=["MG"])
+
+
+def _uf_da_url(url):
+    dados_qr = decodificar_qr_nfce(url)
+    return dados_qr["uf"] if dados_qr else None
+
+
+# Escolhe pelo host da URL; se o host não for conhecido, pela UF da chave de
+# acesso; senão, o extrator genérico.
+def escolher_extrator(url):
+    _registrar_padroes()
+    host = (urlsplit(url or "").hostname or "").lower()
+    if host in _extratores_por_host:
+        return _extratores_por_host[host]
+    uf = _uf_da_url(url) if url else None
+    if uf in _extratores_por_uf:
+        return _extratores_por_uf[uf]
+    return _extrator_generico
+
+
+def dados_completos(dados):
+    return bool(dados) and dados["nome_estabelecimento"] != NAO_ENCONTRADO and dados["valor_total"] > 0
+
+
+# Confiança (0 a 1) nos dados da página: campos essenciais, layout próprio do
+# portal e coerência com o QR Code (valor e CNPJ vêm assinados na nota).
+def confianca_cupom(dados, dados_qr=None):
+    if not dados:
+        return 0.0
+    pontos = (0.3 * (dados["nome_estabelecimento"] != NAO_ENCONTRADO)
+              + 0.3 * (dados["valor_total"] > 0)
+              + 0.1 * (dados["data_emissao"] != NAO_ENCONTRADA)
+              + 0.1 * (dados["cnpj"] != NAO_ENCONTRADO)
+              + 0.2 * (dados.get("layout") != ExtratorGenerico.nome))
+    if dados_qr:
+        if dados_qr["valor_total"] and abs(dados_qr["valor_total"] - dados["valor_total"]) > 0.01:
+            pontos -= 0.3
+        if dados["cnpj"] != NAO_ENCONTRADO and dados["cnpj"] != dados_qr["cnpj"]:
+            pontos -= 0.2
+    return round(max(0.0, pontos), 2)
+
+
+# Extrai com o extrator da URL e recorre ao genérico se o layout não bateu.
+def extrair_dados_html(html, url=None):
+    extrator = escolher_extrator(url)
+    dados = extrator.extrair(html)
+    if not dados_completos(dados) and extrator is not _extrator_generico:
+        alternativa = _extrator_generico.extrair(html)
+        if dados_completos(alternativa):
+            return alternativa
+    return dados
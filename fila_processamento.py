@@ -0,0 +1,170 @@
+# fila_processamento.py
+# Fila de tarefas em memória com um pool de workers (threads) para tirar o
+# processamento pesado (download, QR, navegador, OCR) de dentro do webhook.
+
+import contextvars
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from observabilidade import DURACAO_ETAPAS, contador, histograma, medidor, obter_logger
+
+
+log = obter_logger("fila")
+
+TAREFAS = contador("reembolso_tarefas_total", "Tarefas da fila finalizadas por resultado.")
+ESPERA_FILA = histograma("reembolso_fila_espera_segundos", "Tempo entre enfileirar e começar a tarefa.")
+
+
+# --- TAREFA ---
+class Tarefa:
+    def __init__(self, funcao, args, kwargs):
+        self.id = uuid.uuid4().hex[:12]
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs
+        self.criada_em = time.perf_counter()
+        self.iniciada_em = None
+        self.finalizada_em = None
+        self.etapas = {}
+        self.erro = None
+        # Contexto de quem enfileirou (id da requisição): o worker roda a tarefa dentro dele.
+        self.contexto = contextvars.copy_context()
+
+    @property
+    def tempo_espera(self):
+        if self.iniciada_em is None:
+            return time.perf_counter() - self.criada_em
+        return self.iniciada_em - self.criada_em
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            self.etapas[nome] = self.etapas.get(nome, 0.0) + duracao
+            DURACAO_ETAPAS.observar(duracao, etapa=nome)
+
+
+# --- FILA COM POOL DE WORKERS ---
+class FilaProcessamento:
+    def __init__(self, num_workers=None, tamanho_maximo=0):
+        self.num_workers = num_workers or int(os.environ.get("NUM_WORKERS_FILA", 2))
+        self._fila = queue.Queue(maxsize=tamanho_maximo)
+        self._workers = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._em_execucao = 0
+        self._concluidas = 0
+        self._falhas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._etapas = defaultdict(lambda: {"contagem": 0, "total": 0.0, "max": 0.0})
+        medidor("reembolso_fila_profundidade", "Tarefas aguardando um worker.", self._fila.qsize)
+        medidor("reembolso_fila_em_execucao", "Tarefas sendo processadas agora.", lambda: self._em_execucao)
+
+    def iniciar(self):
+        # Threads não sobrevivem a um fork (gunicorn), então os workers são
+        # (re)criados no processo que de fato enfileira as tarefas.
+        with self._lock:
+            if self._pid == os.getpid() and self._workers:
+                return
+            self._pid = os.getpid()
+            self._workers = []
+            for i in range(self.num_workers):
+                worker = threading.Thread(
+                    target=self._executar_worker, name=f"fila-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        log.info("Fila de processamento iniciada.", extra={"workers": self.num_workers})
+
+    # Agenda funcao(tarefa, *args, **kwargs) e retorna a Tarefa criada.
+    def enfileirar(self, funcao, *args, **kwargs):
+        self.iniciar()
+        tarefa = Tarefa(funcao, args, kwargs)
+        self._fila.put_nowait(tarefa)
+        return tarefa
+
+    # Enfileira depois de `atraso` segundos, sem ocupar um worker esperando
+    # (novas tentativas de tarefas que dependem de um serviço fora do ar).
+    def enfileirar_depois(self, atraso, funcao, *args, **kwargs):
+        contexto = contextvars.copy_context()
+        temporizador = threading.Timer(atraso, contexto.run, (self.enfileirar, funcao, *args), kwargs)
+        temporizador.daemon = True
+        temporizador.start()
+        return temporizador
+
+    # Bloqueia até todas as tarefas enfileiradas terminarem.
+    def aguardar(self):
+        self._fila.join()
+
+    def parar(self):
+        for _ in self._workers:
+            self._fila.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def _executar_worker(self):
+        while True:
+            tarefa = self._fila.get()
+            if tarefa is None:
+                self._fila.task_done()
+                return
+            tarefa.iniciada_em = time.perf_counter()
+            with self._lock:
+                self._em_execucao += 1
+            try:
+                tarefa.contexto.run(tarefa.funcao, tarefa, *tarefa.args, **tarefa.kwargs)
+            except Exception as e:
+                tarefa.erro = e
+                tarefa.contexto.run(log.exception, "Erro na tarefa.", extra={"tarefa": tarefa.id})
+            finally:
+                tarefa.finalizada_em = time.perf_counter()
+                self._registrar(tarefa)
+                self._fila.task_done()
+
+    def _registrar(self, tarefa):
+        with self._lock:
+            self._em_execucao -= 1
+            if tarefa.erro is None:
+                self._concluidas += 1
+            else:
+                self._falhas += 1
+            espera = tarefa.tempo_espera
+            TAREFAS.inc(resultado="ok" if tarefa.erro is None else "falha")
+            ESPERA_FILA.observar(espera)
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+            for nome, duracao in tarefa.etapas.items():
+                etapa = self._etapas[nome]
+                etapa["contagem"] += 1
+                etapa["total"] += duracao
+                etapa["max"] = max(etapa["max"], duracao)
+
+    def estatisticas(self):
+        with self._lock:
+            finalizadas = self._concluidas + self._falhas
+            return {
+                "workers": self.num_workers,
+                "profundidade": self._fila.qsize(),
+                "em_execucao": self._em_execucao,
+                "concluidas": self._concluidas,
+                "falhas": self._falhas,
+                "espera_media_s": (self._espera_total / finalizadas) if finalizadas else 0.0,
+                "espera_max_s": self._espera_max,
+                "etapas": {
+                    nome: {
+                        "contagem": e["contagem"],
+                        "media_s": e["total"] / e["contagem"],
+                        "max_s": e["max"],
+                    }
+                    for nome, e in self._etapas.items()
+                },
+            }
@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+# O app é importado sem carregar modelos nem bibliotecas pesadas (ver
+# app.precarregar). Aqui cada worker, logo depois do fork, pré-carrega o
+# detector WeChat, o motor de OCR e as sessões HTTP, para que a primeira
+# mídia não pague esse custo. Com PRECARREGAR=0 tudo fica sob demanda.
+#
+# O pré-carregamento é feito no worker, e não no master (preload_app), porque
+# threads, instâncias do Tesseract e o Chromium não sobrevivem ao fork.
+
+import os
+
+
+def post_fork(server, worker):
+    if os.environ.get("PRECARREGAR", "1") != "1":
+        return
+    import app
+    try:
+        app.precarregar()
+    except Exception as e:
+        # Sem pré-carregamento o worker continua funcionando: tudo é carregado no primeiro uso.
+        server.log.warning("Falha ao pré-carregar o worker %s: %s", worker.pid, e)
@@ -0,0 +1,223 @@
+# observabilidade.py
+# Métricas e logs estruturados do bot.
+# - Contadores e histogramas em memória (por processo), expostos no formato
+#   texto do Prometheus pela rota /metrics, sem dependência extra.
+# - `medir(etapa)` cronometra um trecho e alimenta o histograma de etapas.
+# - Logs em JSON (uma linha por evento) com o id da mensagem que está sendo
+#   processada, propagado por contextvars da requisição até os workers.
+
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+# --- ID DA REQUISIÇÃO ---
+id_requisicao = contextvars.ContextVar("id_requisicao", default="-")
+
+
+@contextmanager
+def com_id_requisicao(valor):
+    token = id_requisicao.set(valor)
+    try:
+        yield
+    finally:
+        id_requisicao.reset(token)
+
+
+# --- MÉTRICAS ---
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos_texto(rotulos):
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos) + "}"
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor=1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def amostras(self):
+        with self._lock:
+            return [(self.nome, chave, valor) for chave, valor in self._valores.items()]
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, buckets=BUCKETS_PADRAO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = {"contagens": [0] * len(self.buckets), "soma": 0.0, "total": 0}
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie["contagens"][i] += 1
+            serie["soma"] += valor
+            serie["total"] += 1
+
+    def amostras(self):
+        resultado = []
+        with self._lock:
+            for chave, serie in self._series.items():
+                for limite, contagem in zip(self.buckets, serie["contagens"]):
+                    resultado.append((f"{self.nome}_bucket", chave + (("le", repr(limite)),), contagem))
+                resultado.append((f"{self.nome}_bucket", chave + (("le", "+Inf"),), serie["total"]))
+                resultado.append((f"{self.nome}_sum", chave, serie["soma"]))
+                resultado.append((f"{self.nome}_count", chave, serie["total"]))
+        return resultado
+
+
+# Valor lido na hora da coleta (ex.: profundidade da fila).
+class Medidor:
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, funcao):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.funcao = funcao
+
+    def amostras(self):
+        try:
+            return [(self.nome, (), self.funcao())]
+        except Exception:
+            return []
+
+
+_metricas = {}
+_metricas_lock = threading.Lock()
+
+
+def _registrar(metrica):
+    with _metricas_lock:
+        return _metricas.setdefault(metrica.nome, metrica)
+
+
+def contador(nome, ajuda):
+    return _registrar(Contador(nome, ajuda))
+
+
+def histograma(nome, ajuda, buckets=BUCKETS_PADRAO):
+    return _registrar(Histograma(nome, ajuda, buckets))
+
+
+def medidor(nome, ajuda, funcao):
+    with _metricas_lock:
+        _metricas[nome] = Medidor(nome, ajuda, funcao)
+        return _metricas[nome]
+
+
+def exportar_prometheus():
+    with _metricas_lock:
+        metricas = list(_metricas.values())
+    linhas = []
+    for metrica in metricas:
+        linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        for nome, rotulos, valor in metrica.amostras():
+            linhas.append(f"{nome}{_rotulos_texto(rotulos)} {valor}")
+    return "\n".join(linhas) + "\n"
+
+
+# Métricas compartilhadas pelos módulos do pipeline.
+DURACAO_ETAPAS = histograma(
+    "reembolso_etapa_duracao_segundos", "Duração de cada etapa do processamento.")
+QR_CODE = contador(
+    "reembolso_qr_code_total", "Imagens com QR Code encontrado ou não.")
+OCR = contador(
+    "reembolso_ocr_total", "Execuções do OCR por resultado (sucesso, vazio, falha).")
+CACHE = contador(
+    "reembolso_cache_total", "Consultas ao cache de resultados (hit/miss).")
+FONTES_NFCE = contador(
+    "reembolso_pagina_nfce_total", "Páginas de NFC-e obtidas por camada (http, navegador, falha).")
+MENSAGENS = contador(
+    "reembolso_mensagens_total", "Mensagens recebidas no webhook por tipo.")
+CLASSIFICACAO = contador(
+    "reembolso_classificacao_total", "Imagens por tipo previsto (cupom, pedagio, desconhecido) e confiança (alta, baixa).")
+ESCALADAS = contador(
+    "reembolso_escaladas_total", "Tentativas caras disparadas por baixa confiança, por etapa (qr, ocr, navegador).")
+
+
+@contextmanager
+def medir(etapa):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        DURACAO_ETAPAS.observar(time.perf_counter() - inicio, etapa=etapa)
+
+
+# --- LOGS ESTRUTURADOS ---
+class FormatadorJSON(logging.Formatter):
+    CAMPOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, registro):
+        evento = {
+            "ts": round(registro.created, 3),
+            "nivel": registro.levelname,
+            "modulo": registro.name,
+            "id_requisicao": id_requisicao.get(),
+            "msg": registro.getMessage(),
+        }
+        # Campos passados em extra={...} viram chaves do JSON.
+        for chave, valor in vars(registro).items():
+            if chave not in self.CAMPOS_PADRAO:
+                evento[chave] = valor
+        if registro.exc_info:
+            evento["excecao"] = self.formatException(registro.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+class _FiltroIdRequisicao(logging.Filter):
+    def filter(self, registro):
+        registro.id_requisicao = id_requisicao.get()
+        return True
+
+
+def configurar_logs():
+    raiz = logging.getLogger("reembolso")
+    if raiz.handlers:
+        return
+    saida = logging.StreamHandler(sys.stdout)
+    if os.environ.get("LOG_FORMATO", "json").lower() == "texto":
+        saida.addFilter(_FiltroIdRequisicao())
+        saida.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s [%(id_requisicao)s] %(name)s: %(message)s"))
+    else:
+        saida.setFormatter(FormatadorJSON())
+    raiz.addHandler(saida)
+    raiz.setLevel(os.environ.get("LOG_NIVEL", "INFO").upper())
+    raiz.propagate = False
+
+
+def obter_logger(modulo):
+    configurar_logs()
+    return logging.getLogger(f"reembolso.{modulo}")
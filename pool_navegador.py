@@ -0,0 +1,166 @@
+# pool_navegador.py
+# Pool de navegador headless (Playwright/Chromium) compartilhado entre as
+# requisições. O Chromium é lançado uma única vez e mantém um número limitado
+# de páginas "quentes"; cada consulta custa só o tempo de navegação.
+#
+# A API assíncrona do Playwright roda num event loop dedicado (thread própria);
+# qualquer thread pode pedir uma página com obter_html(), que é thread-safe.
+
+import asyncio
+import os
+import threading
+
+from observabilidade import obter_logger
+
+
+log = obter_logger("navegador")
+
+
+class _Slot:
+    def __init__(self, contexto, pagina):
+        self.contexto = contexto
+        self.pagina = pagina
+        self.usos = 0
+
+
+class PoolNavegador:
+    def __init__(self, tamanho=None, max_usos=None, timeout_ms=60000):
+        self.tamanho = tamanho or int(os.environ.get("TAMANHO_POOL_NAVEGADOR", 2))
+        self.max_usos = max_usos or int(os.environ.get("MAX_USOS_PAGINA", 50))
+        self.timeout_ms = timeout_ms
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._thread = None
+        self._playwright = None
+        self._navegador = None
+        self._livres = None
+        self._lock_navegador = None
+
+    # --- Ciclo de vida ---
+    def iniciar(self):
+        with self._lock:
+            # Um fork (gunicorn) não leva a thread do loop junto: recria no processo atual.
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._loop.run_forever, name="pool-navegador", daemon=True)
+            self._thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._iniciar(), self._loop).result()
+            except Exception:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._thread = None
+                self._pid = None
+                raise
+        log.info("Pool de navegador iniciado.", extra={"paginas": self.tamanho})
+
+    def fechar(self):
+        with self._lock:
+            if not self._loop or not self._thread or not self._thread.is_alive():
+                return
+            asyncio.run_coroutine_threadsafe(self._fechar(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+            self._pid = None
+
+    def obter_html(self, url, timeout_ms=None):
+        self.iniciar()
+        timeout_ms = timeout_ms or self.timeout_ms
+        futuro = asyncio.run_coroutine_threadsafe(self._obter_html(url, timeout_ms), self._loop)
+        # Margem extra para a espera por uma página livre no pool.
+        return futuro.result(timeout=timeout_ms / 1000 + 30)
+
+    def estatisticas(self):
+        return {
+            "tamanho": self.tamanho,
+            "livres": self._livres.qsize() if self._livres else 0,
+            "navegador_conectado": bool(self._navegador and self._navegador.is_connected()),
+        }
+
+    # --- Implementação (roda no event loop do pool) ---
+    async def _iniciar(self):
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        self._lock_navegador = asyncio.Lock()
+        self._livres = asyncio.Queue()
+        await self._lancar_navegador()
+        for _ in range(self.tamanho):
+            self._livres.put_nowait(await self._novo_slot())
+
+    async def _fechar(self):
+        if self._navegador:
+            await self._navegador.close()
+        if self._playwright:
+            await self._playwright.stop()
+        self._navegador = None
+        self._playwright = None
+
+    async def _lancar_navegador(self):
+        self._navegador = await self._playwright.chromium.launch(headless=True)
+
+    async def _novo_slot(self):
+        contexto = await self._navegador.new_context()
+        pagina = await contexto.new_page()
+        return _Slot(contexto, pagina)
+
+    async def _garantir_saudavel(self, slot):
+        # Health check: se o Chromium caiu, relança uma vez (o lock evita que
+        # várias páginas relancem ao mesmo tempo) e recria a página.
+        if not self._navegador.is_connected():
+            async with self._lock_navegador:
+                if not self._navegador.is_connected():
+                    log.warning("Navegador desconectado. Relançando Chromium.")
+                    await self._lancar_navegador()
+            return await self._novo_slot()
+        if slot.pagina is None:
+            return await self._novo_slot()
+        if slot.pagina.is_closed():
+            return await self._reciclar(slot)
+        return slot
+
+    async def _reciclar(self, slot):
+        try:
+            if slot.contexto:
+                await slot.contexto.close()
+        except Exception as e:
+            log.warning("Falha ao fechar contexto reciclado: %s", e)
+        return await self._novo_slot()
+
+    async def _obter_html(self, url, timeout_ms):
+        slot = await self._livres.get()
+        try:
+            slot = await self._garantir_saudavel(slot)
+            await slot.pagina.goto(url, timeout=timeout_ms)
+            slot.usos += 1
+            return await slot.pagina.content()
+        except Exception:
+            # Página em estado desconhecido depois de um erro: descarta.
+            slot.usos = self.max_usos
+            raise
+        finally:
+            if slot.usos >= self.max_usos:
+                try:
+                    slot = await self._reciclar(slot)
+                except Exception as e:
+                    # Devolve um slot vazio para o pool não encolher; a página
+                    # é recriada no próximo uso.
+                    log.error("Erro ao reciclar página do pool: %s", e)
+                    slot = _Slot(None, None)
+            self._livres.put_nowait(slot)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool_navegador():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolNavegador()
+        return _pool
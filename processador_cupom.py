@@ -1,145 +1,228 @@
 # processador_cupom.py (Versão final só com reembolso)
 
-import cv2
 import os
-import re
-import requests
-import openpyxl
-from bs4 import BeautifulSoup
-from shutil import copyfile
-from playwright.sync_api import sync_playwright
+import queue
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pool_navegador import obter_pool_navegador
+from agendador_sefaz import PortalIndisponivel, obter_agendador_sefaz
+from decodificador_nfce import decodificar_qr_nfce
+from extratores_nfce import confianca_cupom, dados_completos, extrair_dados_html
+from observabilidade import ESCALADAS, FONTES_NFCE, QR_CODE, medidor, medir, obter_logger
+from transacao import Transacao
+
+# OpenCV, requests e lxml são importados no primeiro uso:
+# o webhook sobe (e responde o cadastro) sem carregar nenhum deles.
+
+log = obter_logger("cupom")
 
 # --- CONFIGURAÇÃO DO DETECTOR WECHAT (usa pasta local) ---
 def configurar_detector_wechat():
-    print("INFO: Configurando o detector de QR Code avançado (WeChat)...")
-    model_dir = "wechat_qr_models"
+    log.info("Configurando o detector de QR Code avançado (WeChat).")
+    model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wechat_qr_models")
     model_files = [
         os.path.join(model_dir, "detect.prototxt"), os.path.join(model_dir, "detect.caffemodel"),
         os.path.join(model_dir, "sr.prototxt"), os.path.join(model_dir, "sr.caffemodel")
     ]
     if not all(os.path.exists(f) for f in model_files):
-        print(f"ERRO FATAL: Arquivos de modelo não encontrados na pasta '{model_dir}'.")
+        log.critical("Arquivos de modelo do detector não encontrados.", extra={"pasta": model_dir})
         return None
     try:
-        print("INFO: Modelos encontrados. Inicializando detector...")
+        import cv2
         return cv2.wechat_qrcode_WeChatQRCode(*model_files)
     except Exception as e:
-        print(f"ERRO FATAL: Não foi possível inicializar o detector. Erro: {e}")
+        log.critical("Não foi possível inicializar o detector: %s", e)
         return None
 
+# --- POOL DE DETECTORES ---
+# O WeChatQRCode não é garantidamente thread-safe: cada thread pega uma
+# instância emprestada e a devolve ao terminar. As instâncias são criadas uma
+# vez (no primeiro uso ou no pré-carregamento do worker) e reaproveitadas.
+class PoolDetectores:
+    def __init__(self, tamanho=None):
+        self.tamanho = tamanho or int(os.environ.get(
+            "TAMANHO_POOL_DETECTOR", os.environ.get("NUM_WORKERS_FILA", 2)))
+        self._livres = queue.Queue()
+        for _ in range(self.tamanho):
+            detector = configurar_detector_wechat()
+            if detector is None:
+                raise RuntimeError("Detector WeChat indisponível.")
+            self._livres.put(detector)
+        log.info("Pool de detectores WeChat carregado.", extra={"instancias": self.tamanho})
+
+    @contextmanager
+    def emprestar(self):
+        with medir("espera_detector"):
+            detector = self._livres.get()
+        try:
+            yield detector
+        finally:
+            self._livres.put(detector)
+
+    def livres(self):
+        return self._livres.qsize()
+
+_pool_detectores = None
+_pool_detectores_pid = None
+_pool_detectores_lock = threading.Lock()
+
+def obter_pool_detectores():
+    global _pool_detectores, _pool_detectores_pid
+    with _pool_detectores_lock:
+        if _pool_detectores is None or _pool_detectores_pid != os.getpid():
+            _pool_detectores = PoolDetectores()
+            _pool_detectores_pid = os.getpid()
+            medidor("reembolso_detectores_livres", "Detectores WeChat livres no pool.",
+                    _pool_detectores.livres)
+        return _pool_detectores
+
 # --- LER QR CODE ---
-def ler_qr_code(detector, caminho_imagem):
-    imagem = cv2.imread(caminho_imagem)
-    if imagem is None:
-        raise FileNotFoundError(f"Imagem não encontrada: {caminho_imagem}")
+# `imagem` pode ser o caminho, um ndarray ou uma ImagemDecodificada já em memória.
+# Tenta primeiro numa cópia reduzida e só escala (resolução cheia, recortes) se não achar.
+# `esforco` limita ou estende essa escada (ver processador_imagem.tentativas_qr).
+# `detector` pode ser uma instância (uso de uma thread só) ou um PoolDetectores.
+def ler_qr_code(detector, imagem, config=None, esforco=None):
+    if isinstance(detector, PoolDetectores):
+        with detector.emprestar() as instancia:
+            return ler_qr_code(instancia, imagem, config, esforco)
+    from processador_imagem import ESFORCO_QR_PADRAO, tentativas_qr
+    for tentativa, matriz in tentativas_qr(imagem, config, esforco or ESFORCO_QR_PADRAO):
+        if tentativa == "realce":
+            ESCALADAS.inc(etapa="qr")
+        # O WeChat converte para cinza internamente; a versão em cinza compartilhada evita refazer isso.
+        with medir("deteccao_wechat"):
+            codigos, _ = detector.detectAndDecode(matriz)
+        if codigos:
+            log.info("QR Code encontrado.", extra={"tentativa": tentativa})
+            QR_CODE.inc(resultado="encontrado", tentativa=tentativa)
+            return codigos[0]
+    QR_CODE.inc(resultado="nao_encontrado", tentativa="-")
+    return None
 
-    codigos, _ = detector.detectAndDecode(imagem)
-    return codigos[0] if codigos else None
+# --- SESSÃO HTTP COMPARTILHADA (keep-alive com os portais da SEFAZ) ---
+_sessao_http = None
+_sessao_lock = threading.Lock()
 
-# --- EXTRAIR DADOS DO CUPOM ---
-def extrair_dados_pagina(url):
-    print(f"Acessando URL: {url}")
-    try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(url, timeout=60000)
-            html_content = page.content()
-            browser.close()
-
-        soup = BeautifulSoup(html_content, "html.parser")
-        
-        nome_estabelecimento = "NÃO ENCONTRADO"
-        cnpj = "NÃO ENCONTRADO"
-        valor_texto = "0.0"
-        data_emissao = "NÃO ENCONTRADA"
-
-        # Nome
-        nome_elem = soup.select_one('div.txtTopo')
-        if nome_elem:
-            nome_estabelecimento = nome_elem.text.strip()
-
-        # CNPJ
-        cnpj_div = soup.find(lambda tag: tag.name == 'div' and 'CNPJ:' in tag.text)
-        if cnpj_div:
-            cnpj_match = re.search(r'(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2})', cnpj_div.text)
-            if cnpj_match:
-                cnpj = cnpj_match.group(1)
-
-        # Valor Total
-        label_valor = soup.find('label', string=re.compile(r'Valor a pagar', re.IGNORECASE))
-        if label_valor:
-            valor_span = label_valor.find_next_sibling('span', class_='totalNumb')
-            if valor_span:
-                valor_texto = valor_span.text.strip().replace(',', '.')
-
-        # Data de emissão
-        strong_emissao = soup.find('strong', string=re.compile(r'Emissão', re.IGNORECASE))
-        if strong_emissao:
-            texto_completo = strong_emissao.parent.get_text(" ", strip=True)
-            match_data = re.search(r'(\d{2}/\d{2}/\d{4})', texto_completo)
-            if match_data:
-                data_emissao = match_data.group(1)
-
-        valor_float = float(valor_texto) if valor_texto else 0.0
-
-        print("\n--- DADOS EXTRAÍDOS ---")
-        print(f"Estabelecimento: {nome_estabelecimento}")
-        print(f"CNPJ: {cnpj}")
-        print(f"Valor Total: R$ {valor_texto}")
-        print(f"Data de Emissão: {data_emissao}")
+def obter_sessao_http():
+    global _sessao_http
+    with _sessao_lock:
+        if _sessao_http is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=10, pool_maxsize=10)
+            sessao.mount("http://", adaptador)
+            sessao.mount("https://", adaptador)
+            sessao.headers["User-Agent"] = (
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+            _sessao_http = sessao
+        return _sessao_http
+
+def baixar_html_http(url, timeout=15):
+    r = obter_sessao_http().get(url, timeout=timeout)
+    r.raise_for_status()
+    if "charset" not in r.headers.get("Content-Type", "").lower():
+        r.encoding = r.apparent_encoding
+    return r.text
+
+def baixar_html_navegador(url):
+    # Página "quente" do pool compartilhado: não lança um Chromium por cupom.
+    timeout_ms = int(float(os.environ.get("TIMEOUT_NAVEGADOR_NFCE", 30)) * 1000)
+    return obter_pool_navegador().obter_html(url, timeout_ms=timeout_ms)
 
+# --- ESTATÍSTICAS DE QUAL CAMADA ATENDEU CADA CUPOM ---
+_fontes = Counter()
+_fontes_lock = threading.Lock()
+
+def _registrar_fonte(fonte):
+    FONTES_NFCE.inc(fonte=fonte)
+    with _fontes_lock:
+        _fontes[fonte] += 1
+
+def estatisticas_fontes():
+    with _fontes_lock:
+        total = sum(_fontes.values())
         return {
-            "data_emissao": data_emissao,
-            "nome_estabelecimento": nome_estabelecimento,
-            "cnpj": cnpj,
-            "valor_total": valor_float
+            "http": _fontes["http"],
+            "navegador": _fontes["navegador"],
+            "falha": _fontes["falha"],
+            "taxa_http": (_fontes["http"] / total) if total else 0.0,
         }
-    except Exception as e:
-        print(f"ERRO ao extrair dados da página: {e}")
-        return None
 
-# --- PREENCHER PLANILHA DE REEMBOLSO ---
-def preencher_planilha_reembolso(transacoes, arquivo_modelo, arquivo_destino, nome_da_aba, linha_dos_totais):
-    if not transacoes:
-        print("AVISO: Nenhuma transação para preencher.")
-        return
+# --- EXTRAIR DADOS DO CUPOM ---
+# Camada 1: GET simples (a maioria dos portais entrega o HTML pronto).
+# Camada 2: só se a confiança nos dados da camada 1 ficar abaixo de
+# NFCE_LIMIAR_CONFIANCA (campos faltando, layout genérico, valor ou CNPJ
+# diferentes do QR Code), renderiza no Chromium. Fica o resultado mais confiável.
+# As duas camadas passam pelo agendador do host (limites, coalescência, disjuntor).
+LIMIAR_CONFIANCA_NFCE = float(os.environ.get("NFCE_LIMIAR_CONFIANCA", 0.7))
 
-    print(f"INFO: Preenchendo {len(transacoes)} transações em '{arquivo_destino}'...")
+def extrair_dados_pagina(url):
+    log.info("Acessando a página da NFC-e.", extra={"url": url})
+    agendador = obter_agendador_sefaz()
+    dados_qr = decodificar_qr_nfce(url)
+    dados_http = None
+    try:
+        with medir("pagina_http"):
+            html = agendador.executar(url, baixar_html_http, url, camada="http")
+        with medir("analise_html"):
+            dados = analisar_html_cupom(html, url)
+        dados["confianca"] = confianca_cupom(dados, dados_qr)
+        if dados["confianca"] >= LIMIAR_CONFIANCA_NFCE:
+            log.info("Cupom atendido pela camada HTTP.", extra={"confianca": dados["confianca"]})
+            dados["fonte"] = "http"
+            _registrar_fonte("http")
+            return dados
+        if dados_completos(dados):
+            dados_http = dict(dados, fonte="http")
+        log.info("HTML estático com baixa confiança. Renderizando com o navegador.",
+                 extra={"confianca": dados["confianca"]})
+    except PortalIndisponivel as e:
+        # Portal fora do ar: o navegador iria para o mesmo host, então nem tenta.
+        log.warning("%s", e)
+        _registrar_fonte("falha")
+        return None
+    except Exception as e:
+        log.warning("Falha na camada HTTP (%s). Renderizando com o navegador.", e)
 
-    if not os.path.exists(arquivo_destino):
-        copyfile(arquivo_modelo, arquivo_destino)
-    
+    ESCALADAS.inc(etapa="navegador")
     try:
-        workbook = openpyxl.load_workbook(arquivo_destino)
-        sheet = workbook[nome_da_aba]
-
-        linha_atual = 10
-        while sheet[f'B{linha_atual}'].value is not None:
-            linha_atual += 1
-        
-        print(f"INFO: Inserindo dados a partir da linha {linha_atual}.")
-
-        linhas_necessarias = len(transacoes)
-        espaco_disponivel = linha_dos_totais - linha_atual
-        if linhas_necessarias > espaco_disponivel:
-            linhas_para_inserir = linhas_necessarias - espaco_disponivel
-            sheet.insert_rows(linha_dos_totais, amount=linhas_para_inserir)
-
-        for transacao in transacoes:
-            sheet[f'B{linha_atual}'] = transacao['Data']
-            sheet[f'C{linha_atual}'] = transacao['Estabelecimento']
-            sheet[f'D{linha_atual}'] = transacao['Tipo de Despesa']
-            sheet[f'F{linha_atual}'] = "São Paulo"
-            sheet[f'G{linha_atual}'] = "São Paulo"
-            sheet[f'I{linha_atual}'] = transacao['Valor']
-            
-            linha_atual += 1
-
-        workbook.save(arquivo_destino)
-        print("INFO: Planilha de reembolso atualizada com sucesso!")
+        with medir("navegador"):
+            html = agendador.executar(url, baixar_html_navegador, url, camada="navegador")
+        with medir("analise_html"):
+            dados = analisar_html_cupom(html, url)
+        dados["confianca"] = confianca_cupom(dados, dados_qr)
+        dados["fonte"] = "navegador"
     except Exception as e:
-        print(f"ERRO CRÍTICO ao preencher a planilha: {e}")
+        log.error("Erro ao extrair dados da página: %s", e)
+        dados = None
+    if dados_http and (dados is None or dados_http["confianca"] > dados["confianca"]):
+        log.info("Mantido o resultado da camada HTTP.", extra={"confianca": dados_http["confianca"]})
+        dados = dados_http
+    _registrar_fonte(dados["fonte"] if dados else "falha")
+    return dados
+
+# --- ANALISAR HTML DO CUPOM ---
+# O extrator é escolhido pelo host da URL (ver extratores_nfce.py).
+def analisar_html_cupom(html_content, url=None):
+    dados = extrair_dados_html(html_content, url)
+    log.info("Dados do cupom extraídos.", extra={
+        "estabelecimento": dados["nome_estabelecimento"], "cnpj": dados["cnpj"],
+        "valor_total": dados["valor_total"], "data_emissao": dados["data_emissao"],
+        "itens": len(dados["itens"]), "layout": dados["layout"]})
+    return dados
+
+# --- MAPEAR CUPOM PARA TRANSAÇÃO ---
+def transacao_do_cupom(dados_nota):
+    return Transacao(
+        data=dados_nota['data_emissao'],
+        tipo_despesa="Combustivel/Alimentação",
+        estabelecimento=dados_nota['nome_estabelecimento'],
+        valor=dados_nota['valor_total'],
+        observacao=f"CNPJ: {dados_nota.get('cnpj', 'N/A')}",
+    ).como_dict()
 
 # --- EXECUÇÃO PRINCIPAL ---
 if __name__ == "__main__":
@@ -149,7 +232,6 @@ if __name__ == "__main__":
     ARQUIVO_MODELO = "planilha_reembolso_branco.xlsx"
     ARQUIVO_DESTINO = "reembolso_preenchido.xlsx"
     NOME_DA_ABA = "Plan2"
-    LINHA_DOS_TOTAIS = 46
 
     imagens_para_processar = [
         os.path.join(pasta_de_imagens, f)
@@ -164,21 +246,12 @@ if __name__ == "__main__":
         if url_nota:
             dados_da_nota = extrair_dados_pagina(url_nota)
             if dados_da_nota and dados_da_nota.get('valor_total', 0) > 0:
-                transacao_mapeada = {
-                    "Data": dados_da_nota['data_emissao'],
-                    "Tipo de Despesa": "Combustivel/Alimentação",
-                    "Estabelecimento": dados_da_nota['nome_estabelecimento'],
-                    "Valor": dados_da_nota['valor_total'],
-                }
-                todas_as_transacoes_mapeadas.append(transacao_mapeada)
+                todas_as_transacoes_mapeadas.append(transacao_do_cupom(dados_da_nota))
 
     if todas_as_transacoes_mapeadas:
-        preencher_planilha_reembolso(
-            todas_as_transacoes_mapeadas,
-            ARQUIVO_MODELO,
-            ARQUIVO_DESTINO,
-            NOME_DA_ABA,
-            LINHA_DOS_TOTAIS
-        )
+        from exportacao import exportar_xlsx
+        exportar_xlsx(todas_as_transacoes_mapeadas, ARQUIVO_DESTINO, ARQUIVO_MODELO, NOME_DA_ABA)
+        print(f"INFO: {len(todas_as_transacoes_mapeadas)} transações gravadas em '{ARQUIVO_DESTINO}'.")
 
+    obter_pool_navegador().fechar()
     print("\nProcessamento concluído.")
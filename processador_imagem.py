@@ -0,0 +1,207 @@
+# processador_imagem.py
+# Imagem decodificada uma única vez e compartilhada entre as etapas (QR Code e
+# OCR). Os bytes baixados são decodificados direto da memória com cv2.imdecode,
+# sem arquivo temporário, e a versão em tons de cinza é calculada uma vez só.
+# Também concentra o pré-processamento adaptativo antes da detecção e do OCR.
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+
+class ImagemDecodificada:
+    def __init__(self, bgr):
+        self.bgr = bgr
+        self._cinza = None
+
+    @property
+    def cinza(self):
+        if self._cinza is None:
+            if self.bgr.ndim == 2:
+                self._cinza = self.bgr
+            else:
+                self._cinza = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._cinza
+
+    @property
+    def formato(self):
+        return self.bgr.shape[:2]
+
+
+def decodificar_imagem(conteudo):
+    buffer = np.frombuffer(conteudo, dtype=np.uint8)
+    bgr = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    return ImagemDecodificada(bgr) if bgr is not None else None
+
+
+def carregar_imagem(caminho_imagem):
+    bgr = cv2.imread(caminho_imagem)
+    if bgr is None:
+        raise FileNotFoundError(f"Imagem não encontrada: {caminho_imagem}")
+    return ImagemDecodificada(bgr)
+
+
+# Aceita caminho, ndarray ou ImagemDecodificada (compatível com quem ainda passa o caminho).
+def obter_imagem(entrada):
+    if isinstance(entrada, ImagemDecodificada):
+        return entrada
+    if isinstance(entrada, np.ndarray):
+        return ImagemDecodificada(entrada)
+    return carregar_imagem(entrada)
+
+
+# --- CONFIGURAÇÃO DO PRÉ-PROCESSAMENTO ---
+def _env_bool(nome, padrao):
+    return os.environ.get(nome, "1" if padrao else "0").lower() in ("1", "true", "sim", "yes")
+
+
+CONFIG_PREPROCESSAMENTO = {
+    # QR Code: tenta primeiro numa cópia reduzida; só escala para a resolução
+    # cheia e depois para recortes (ROI) quando não encontra nada.
+    "qr_lado_max": int(os.environ.get("PREPROC_QR_LADO_MAX", 1280)),
+    "qr_recortes": _env_bool("PREPROC_QR_RECORTES", True),
+    # OCR: normaliza a resolução (largura alvo ~300 DPI numa folha A4),
+    # corrige a inclinação e binariza com limiar adaptativo.
+    "ocr_largura_alvo": int(os.environ.get("PREPROC_OCR_LARGURA", 2000)),
+    "ocr_deskew": _env_bool("PREPROC_OCR_DESKEW", True),
+    "ocr_binarizar": _env_bool("PREPROC_OCR_BINARIZAR", True),
+    "ocr_bloco_limiar": int(os.environ.get("PREPROC_OCR_BLOCO", 31)),
+    "ocr_constante_limiar": int(os.environ.get("PREPROC_OCR_CONSTANTE", 15)),
+}
+
+
+# --- TRANSFORMAÇÕES ---
+def redimensionar_lado_max(imagem, lado_max):
+    altura, largura = imagem.shape[:2]
+    escala = lado_max / max(altura, largura)
+    if escala >= 1:
+        return imagem
+    # INTER_LINEAR: INTER_AREA com fator não inteiro custa ~15x mais numa foto de
+    # 12 MP e os módulos do QR são grandes o bastante para não perder nitidez.
+    return cv2.resize(imagem, (int(largura * escala), int(altura * escala)), interpolation=cv2.INTER_LINEAR)
+
+
+def normalizar_largura(imagem, largura_alvo):
+    altura, largura = imagem.shape[:2]
+    escala = largura_alvo / largura
+    # Pequenas diferenças não compensam o custo do resize.
+    if 0.8 <= escala <= 1.25:
+        return imagem
+    interpolacao = cv2.INTER_AREA if escala < 1 else cv2.INTER_CUBIC
+    return cv2.resize(imagem, (largura_alvo, int(altura * escala)), interpolation=interpolacao)
+
+
+def recortes_roi(imagem):
+    # Centro e quatro quadrantes com sobreposição: o QR costuma ocupar uma
+    # parte pequena da foto do cupom e fica mais fácil de achar isolado.
+    altura, largura = imagem.shape[:2]
+    h, w = int(altura * 0.6), int(largura * 0.6)
+    y0, x0 = (altura - h) // 2, (largura - w) // 2
+    yield "roi_centro", imagem[y0:y0 + h, x0:x0 + w]
+    for nome, y, x in (("roi_sup_esq", 0, 0), ("roi_sup_dir", 0, largura - w),
+                       ("roi_inf_esq", altura - h, 0), ("roi_inf_dir", altura - h, largura - w)):
+        yield nome, imagem[y:y + h, x:x + w]
+
+
+def corrigir_inclinacao(cinza):
+    invertida = cv2.threshold(cinza, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)[1]
+    pontos = cv2.findNonZero(invertida)
+    if pontos is None:
+        return cinza
+    angulo = cv2.minAreaRect(pontos)[-1]
+    if angulo > 45:
+        angulo -= 90
+    # Fora dessa faixa é mais provável erro de estimativa do que foto torta.
+    if abs(angulo) < 0.5 or abs(angulo) > 15:
+        return cinza
+    altura, largura = cinza.shape[:2]
+    matriz = cv2.getRotationMatrix2D((largura / 2, altura / 2), angulo, 1.0)
+    return cv2.warpAffine(cinza, matriz, (largura, altura),
+                          flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def binarizar(cinza, bloco, constante):
+    suavizada = cv2.medianBlur(cinza, 3)
+    return cv2.adaptiveThreshold(suavizada, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, bloco | 1, constante)
+
+
+def realcar_contraste(cinza):
+    return cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(cinza)
+
+
+# --- PIPELINES ---
+# Esforço da detecção do QR: 1 = só a primeira tentativa (cópia reduzida);
+# 2 = + resolução cheia e recortes (padrão); 3 = + contraste realçado, na
+# imagem inteira e nos recortes (só quando a foto quase certamente é um cupom).
+ESFORCO_QR_MINIMO = 1
+ESFORCO_QR_PADRAO = 2
+ESFORCO_QR_MAXIMO = 3
+
+
+# Gera as tentativas de detecção do QR, da mais barata para a mais cara.
+def tentativas_qr(imagem, config=None, esforco=ESFORCO_QR_PADRAO):
+    config = config or CONFIG_PREPROCESSAMENTO
+    imagem = obter_imagem(imagem)
+    cinza = imagem.cinza
+    if max(cinza.shape[:2]) > config["qr_lado_max"]:
+        yield "reduzida", redimensionar_lado_max(cinza, config["qr_lado_max"])
+        if esforco <= ESFORCO_QR_MINIMO:
+            return
+    yield "completa", cinza
+    if esforco <= ESFORCO_QR_MINIMO:
+        return
+    if config["qr_recortes"]:
+        yield from recortes_roi(cinza)
+    if esforco >= ESFORCO_QR_MAXIMO:
+        realcada = realcar_contraste(cinza)
+        yield "realce", realcada
+        if config["qr_recortes"]:
+            for nome, recorte in recortes_roi(realcada):
+                yield f"realce_{nome}", recorte
+
+
+def preprocessar_para_ocr(imagem, config=None):
+    config = config or CONFIG_PREPROCESSAMENTO
+    cinza = obter_imagem(imagem).cinza
+    if config["ocr_largura_alvo"]:
+        cinza = normalizar_largura(cinza, config["ocr_largura_alvo"])
+    if config["ocr_deskew"]:
+        cinza = corrigir_inclinacao(cinza)
+    if config["ocr_binarizar"]:
+        cinza = binarizar(cinza, config["ocr_bloco_limiar"], config["ocr_constante_limiar"])
+    return cinza
+
+
+# --- PDF ---
+def eh_pdf(conteudo, tipo_conteudo=""):
+    return "pdf" in (tipo_conteudo or "").lower() or conteudo[:5] == b"%PDF-"
+
+
+# O PDFium não é thread-safe e os workers da fila abrem PDFs ao mesmo tempo:
+# todas as chamadas ficam atrás de um lock do módulo. As páginas são
+# rasterizadas e o documento fechado antes de devolver a primeira imagem, para
+# o lock não ficar preso enquanto o OCR roda em cada página.
+_LOCK_PDFIUM = threading.Lock()
+
+
+def paginas_do_pdf(conteudo, dpi=200):
+    import pypdfium2 as pdfium
+    matrizes = []
+    with _LOCK_PDFIUM:
+        pdf = pdfium.PdfDocument(conteudo)
+        try:
+            for indice in range(len(pdf)):
+                pagina = pdf[indice]
+                try:
+                    bitmap = pagina.render(scale=dpi / 72, grayscale=True)
+                    matrizes.append(bitmap.to_numpy().copy())
+                    bitmap.close()
+                finally:
+                    pagina.close()
+        finally:
+            pdf.close()
+    for matriz in matrizes:
+        yield ImagemDecodificada(matriz)
@@ -1,137 +1,373 @@
-import cv2
-import pytesseract
-import pandas as pd
 import re
 import os
-import locale
-from shutil import copyfile
-import openpyxl
+import queue
+import threading
+from collections import Counter
+from observabilidade import ESCALADAS, OCR, medir, obter_logger
+from transacao import Transacao
 
+# pytesseract, tesserocr e o OpenCV (via processador_imagem) são
+# importados no primeiro uso: o webhook sobe sem pagar por eles.
 
-try:
-    # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-    locale.setlocale(locale.LC_TIME, 'pt_BR.UTF-8')
-except Exception as e:
-    print(f"AVISO de configuração: {e}")
+log = obter_logger("pedagio")
 
-def extrair_texto_da_imagem(caminho_imagem):
-    print(f"\nINFO: Lendo a imagem com OCR: {caminho_imagem}")
+# --- MOTORES DE OCR ---
+# pytesseract: abre um processo `tesseract` e recarrega o por.traineddata a cada imagem.
+class MotorPytesseract:
+    nome = "pytesseract"
+
+    def reconhecer_palavras(self, imagem_cinza, psm=None):
+        import pytesseract
+        # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+        dados = pytesseract.image_to_data(imagem_cinza, lang='por', config=f"--psm {psm}" if psm else "",
+                                          output_type=pytesseract.Output.DICT)
+        palavras = []
+        for i, texto in enumerate(dados["text"]):
+            if texto.strip():
+                palavras.append({
+                    "texto": texto.strip(),
+                    "esquerda": dados["left"][i],
+                    "topo": dados["top"][i],
+                    "largura": dados["width"][i],
+                    "altura": dados["height"][i],
+                    "confianca": max(0.0, float(dados["conf"][i])),
+                })
+        return palavras
+
+
+# O wheel do tesserocr traz a libtesseract, mas procura os idiomas em "./": usa
+# TESSDATA_PREFIX ou a pasta do pacote tesseract-ocr-por (build.sh).
+PASTAS_TESSDATA = ("/usr/share/tesseract-ocr/5/tessdata", "/usr/share/tesseract-ocr/4.00/tessdata",
+                   "/usr/share/tessdata")
+
+
+def pasta_tessdata(tesserocr, idioma):
+    candidatas = [os.environ.get("TESSDATA_PREFIX"), tesserocr.get_languages()[0], *PASTAS_TESSDATA]
+    for pasta in filter(None, candidatas):
+        if os.path.exists(os.path.join(pasta, f"{idioma}.traineddata")):
+            return pasta.rstrip("/") + "/"
+    raise RuntimeError(f"{idioma}.traineddata não encontrado (instale tesseract-ocr-{idioma} ou defina TESSDATA_PREFIX)")
+
+
+# tesserocr (API C do Tesseract): pool limitado de instâncias já carregadas, então
+# cada imagem custa só o reconhecimento. O GIL é liberado durante o OCR.
+class MotorTesserocr:
+    nome = "tesserocr"
+
+    def __init__(self, tamanho, idioma='por'):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self._instancias = queue.Queue()
+        pasta = pasta_tessdata(tesserocr, idioma)
+        for _ in range(tamanho):
+            self._instancias.put(tesserocr.PyTessBaseAPI(path=pasta, lang=idioma))
+        log.info("Pool de OCR (tesserocr) carregado.", extra={"instancias": tamanho})
+
+    def reconhecer_palavras(self, imagem_cinza, psm=None):
+        nivel = self._tesserocr.RIL.WORD
+        api = self._instancias.get()
+        psm_anterior = api.GetPageSegMode()
+        try:
+            if psm:
+                api.SetPageSegMode(psm)
+            altura, largura = imagem_cinza.shape[:2]
+            api.SetImageBytes(imagem_cinza.tobytes(), largura, altura, 1, largura)
+            api.Recognize()
+            palavras = []
+            for item in self._tesserocr.iterate_level(api.GetIterator(), nivel):
+                texto = (item.GetUTF8Text(nivel) or "").strip()
+                caixa = item.BoundingBox(nivel)
+                if texto and caixa:
+                    x1, y1, x2, y2 = caixa
+                    palavras.append({"texto": texto, "esquerda": x1, "topo": y1,
+                                     "largura": x2 - x1, "altura": y2 - y1,
+                                     "confianca": item.Confidence(nivel)})
+            return palavras
+        finally:
+            api.SetPageSegMode(psm_anterior)
+            self._instancias.put(api)
+
+
+_motor_ocr = None
+_motor_pid = None
+_motor_lock = threading.Lock()
+
+
+def obter_motor_ocr():
+    global _motor_ocr, _motor_pid
+    with _motor_lock:
+        # Instâncias do Tesseract não atravessam um fork: recria por processo.
+        if _motor_ocr is not None and _motor_pid == os.getpid():
+            return _motor_ocr
+        escolha = os.environ.get("MOTOR_OCR", "auto").lower()
+        motor = None
+        if escolha in ("auto", "tesserocr"):
+            try:
+                # Só as threads da fila fazem OCR: uma instância por worker basta.
+                tamanho = int(os.environ.get("TAMANHO_POOL_OCR", os.environ.get("NUM_WORKERS_FILA", 2)))
+                motor = MotorTesserocr(tamanho)
+            except Exception as e:
+                log.warning("Pool de OCR (tesserocr) indisponível (%s). Usando pytesseract, "
+                            "com um processo tesseract por imagem.", e)
+        _motor_ocr = motor or MotorPytesseract()
+        _motor_pid = os.getpid()
+        return _motor_ocr
+
+
+# `psm`: modo de segmentação de página do Tesseract (None = o padrão, 3).
+def reconhecer_palavras(imagem_cinza, psm=None):
+    motor = obter_motor_ocr()
     try:
-        imagem = cv2.imread(caminho_imagem)
-        if imagem is None:
-            return None
-        imagem_cinza = cv2.cvtColor(imagem, cv2.COLOR_BGR2GRAY)
-        texto_bruto = pytesseract.image_to_string(imagem_cinza, lang='por')
-        return texto_bruto if texto_bruto.strip() else None
+        return motor.reconhecer_palavras(imagem_cinza, psm)
     except Exception as e:
-        print(f"ERRO durante o OCR: {e}")
-        return None
+        if isinstance(motor, MotorPytesseract):
+            raise
+        log.warning("Falha no %s (%s). Tentando com pytesseract.", motor.nome, e)
+        return MotorPytesseract().reconhecer_palavras(imagem_cinza, psm)
 
-# --- Função de análise (mantida) ---
-def analisar_e_estruturar_texto(texto_bruto):
-    print("INFO: Analisando com a lógica de pareamento por ordem (a que funciona)...")
-    transacoes_finais = []
-    
-    linhas = texto_bruto.strip().split('\n')
-    
-    regex_data = re.compile(r"(\d{1,2} de \w+)")
-    regex_valor = re.compile(r"R\$\s*(\d+[,.]?\d*)")
-    regex_identificador = re.compile(r"(\d{3})\s*-?\s*([A-Z0-9]{7})")
-    regex_descricao = re.compile(r"(Passagem|Estacionamento)", re.IGNORECASE)
 
-    datas = [{'linha': i, 'data': m.group(1).strip()} for i, l in enumerate(linhas) if (m := regex_data.search(l))]
-    valores = [{'linha': i, 'valor': m.group(1)} for i, l in enumerate(linhas) if (m := regex_valor.search(l))]
-    identificadores = [{'linha': i, 'match': m} for i, l in enumerate(linhas) if (m := regex_identificador.search(l))]
-    descricoes = [{'linha': i, 'desc': m.group(1)} for i, l in enumerate(linhas) if (m := regex_descricao.search(l))]
+# --- Reconstrução das linhas pela posição das palavras ---
+# O Tesseract costuma ler um extrato em colunas (todas as descrições, depois
+# todos os valores). Agrupando as palavras pela altura na página, descrição e
+# valor da mesma transação voltam a ficar na mesma linha de texto.
+def montar_linhas_por_posicao(palavras):
+    if not palavras:
+        return []
+    alturas = sorted(p["altura"] for p in palavras)
+    tolerancia = max(alturas[len(alturas) // 2] * 0.6, 1)
+    linhas = []
+    for palavra in sorted(palavras, key=lambda p: p["topo"] + p["altura"] / 2):
+        centro = palavra["topo"] + palavra["altura"] / 2
+        if linhas and centro - linhas[-1]["centro"] <= tolerancia:
+            linha = linhas[-1]
+            linha["palavras"].append(palavra)
+            linha["centro"] += (centro - linha["centro"]) / len(linha["palavras"])
+        else:
+            linhas.append({"centro": centro, "palavras": [palavra]})
+    return [" ".join(p["texto"] for p in sorted(linha["palavras"], key=lambda p: p["esquerda"]))
+            for linha in linhas]
+
+
+# Retorna o texto e a confiança média do motor nas palavras (0 a 1).
+def reconhecer_texto_e_confianca(imagem_cinza, psm=None):
+    palavras = reconhecer_palavras(imagem_cinza, psm)
+    confianca = sum(p["confianca"] for p in palavras) / len(palavras) / 100 if palavras else 0.0
+    return "\n".join(montar_linhas_por_posicao(palavras)), confianca
+
+
+def reconhecer_texto(imagem_cinza, psm=None):
+    return reconhecer_texto_e_confianca(imagem_cinza, psm)[0]
+
+
+def _ocr(imagem, config=None, psm=None):
+    from processador_imagem import preprocessar_para_ocr
+    log.info("Lendo a imagem com OCR.", extra={
+        "origem": imagem if isinstance(imagem, str) else "memoria", "psm": psm})
+    try:
+        with medir("preprocessamento_ocr"):
+            imagem_tratada = preprocessar_para_ocr(imagem, config)
+        with medir("motor_ocr"):
+            texto_bruto, confianca = reconhecer_texto_e_confianca(imagem_tratada, psm)
+    except Exception as e:
+        log.error("Erro durante o OCR: %s", e)
+        OCR.inc(resultado="falha")
+        return None, None
+    if not texto_bruto.strip():
+        OCR.inc(resultado="vazio")
+        return None, 0.0
+    OCR.inc(resultado="sucesso")
+    return texto_bruto, confianca
+
+
+# `imagem` pode ser o caminho, um ndarray ou uma ImagemDecodificada já em memória.
+def extrair_texto_da_imagem(imagem, config=None, psm=None):
+    return _ocr(imagem, config, psm)[0]
+
+# --- Função de análise ---
+# Passada única sobre as linhas: guarda a data corrente e monta os pares
+# descrição/valor conforme aparecem, então o custo é linear no tamanho do extrato.
+REGEX_DATA = re.compile(r"(\d{1,2} de \w+)")
+REGEX_VALOR = re.compile(r"R\$\s*(\d+[,.]?\d*)")
+REGEX_IDENTIFICADOR = re.compile(r"(\d{3})\s*-?\s*([A-Z0-9]{7})")
+REGEX_DESCRICAO = re.compile(r"(Passagem|Estacionamento)", re.IGNORECASE)
 
-    print(f"INFO: Mapeamento: {len(datas)} Datas, {len(descricoes)} Descrições, {len(valores)} Valores, {len(identificadores)} Identificadores")
-    
-    carro_padrao, placa_padrao = None, None
-    if identificadores:
-        match_id_padrao = identificadores[0]['match']
-        carro_padrao = match_id_padrao.group(1).strip()
-        placa_padrao = match_id_padrao.group(2).strip()
 
-    if not carro_padrao:
+def _normalizar_valor(valor_bruto_str):
+    valor_corrigido_str = valor_bruto_str.replace(',', '.')
+    if '.' not in valor_corrigido_str and len(valor_corrigido_str) > 2:
+        valor_corrigido_str = valor_corrigido_str[:-2] + '.' + valor_corrigido_str[-2:]
+    return valor_corrigido_str
+
+
+def _parear_bloco(descricoes, valores):
+    n = min(len(descricoes), len(valores))
+    # Sobrando descrições (valor perdido no OCR), os valores ficam com as
+    # descrições mais próximas deles, as últimas do bloco. Sobrando valores
+    # (ex.: um total), ficam os primeiros, logo abaixo das descrições.
+    if n:
+        yield from zip(descricoes[len(descricoes) - n:], valores[:n])
+
+
+# Gera ((data, descrição), valor) na ordem em que cada par se completa.
+# Descrição e valor na mesma linha formam par direto. Senão, um bloco de
+# descrições é pareado com o bloco de valores que vem logo depois (texto em
+# colunas), e um valor que se perdeu no OCR não desloca os blocos seguintes.
+def _pares_do_texto(linhas, estado):
+    data_atual = None
+    descricoes, valores = [], []
+    for linha in linhas:
+        if estado["identificador"] is None:
+            estado["identificador"] = REGEX_IDENTIFICADOR.search(linha)
+        if (m := REGEX_DATA.search(linha)):
+            data_atual = m.group(1).strip()
+        desc = REGEX_DESCRICAO.search(linha)
+        valor = REGEX_VALOR.search(linha)
+
+        if desc and valor:
+            yield from _parear_bloco(descricoes, valores)
+            descricoes, valores = [], []
+            yield (data_atual, desc.group(1)), valor.group(1)
+        elif desc:
+            if valores:
+                yield from _parear_bloco(descricoes, valores)
+                descricoes, valores = [], []
+            descricoes.append((data_atual, desc.group(1)))
+        elif valor and descricoes:
+            # Valores antes de qualquer descrição (saldo, cabeçalho) não têm par.
+            valores.append(valor.group(1))
+    yield from _parear_bloco(descricoes, valores)
+
+
+def analisar_e_estruturar_texto(texto_bruto):
+    estado = {"identificador": None}
+    pares = list(_pares_do_texto(texto_bruto.strip().split('\n'), estado))
+
+    match_id_padrao = estado["identificador"]
+    if not match_id_padrao:
         return []
+    carro_padrao = match_id_padrao.group(1).strip()
+    placa_padrao = match_id_padrao.group(2).strip()
 
-    num_pares = min(len(descricoes), len(valores))
-    for i in range(num_pares):
-        desc_info = descricoes[i]
-        val_info = valores[i]
-        linha_ref = desc_info['linha']
-        data_correta = next((d['data'] for d in reversed(datas) if d['linha'] <= linha_ref), None)
-        
-        if data_correta:
-            valor_bruto_str = val_info['valor']
-            valor_corrigido_str = valor_bruto_str.replace(',', '.')
-            if '.' not in valor_corrigido_str and len(valor_corrigido_str) > 2:
-                valor_corrigido_str = valor_corrigido_str[:-2] + '.' + valor_corrigido_str[-2:]
-            
-            descricao_limpa = "Estacionamento" if "Estacionamento" in desc_info['desc'] else "Passagem"
-            
-            # Gera um ID único para evitar que transações iguais sejam descartadas
-            id_transacao = f"{data_correta}_{valor_corrigido_str}_{i}"
-            
-            transacao_mapeada = {
-                "ID_Transacao": id_transacao,
-                "Data": data_correta,
-                "Tipo de Despesa": descricao_limpa,
-                "Estabelecimento": f"Concessionaria {carro_padrao}",
-                "Valor": float(valor_corrigido_str),
-                "Observação": f"Placa: {placa_padrao}"
-            }
-            transacoes_finais.append(transacao_mapeada)
-            
+    transacoes_finais = []
+    for i, ((data_correta, descricao), valor_bruto_str) in enumerate(pares):
+        if not data_correta:
+            continue
+        valor_corrigido_str = _normalizar_valor(valor_bruto_str)
+        descricao_limpa = "Estacionamento" if descricao.lower() == "estacionamento" else "Passagem"
+
+        # Gera um ID único para evitar que transações iguais sejam descartadas
+        id_transacao = f"{data_correta}_{valor_corrigido_str}_{i}"
+
+        transacoes_finais.append(Transacao(
+            id_transacao=id_transacao,
+            data=data_correta,
+            tipo_despesa=descricao_limpa,
+            estabelecimento=f"Concessionaria {carro_padrao}",
+            valor=float(valor_corrigido_str),
+            observacao=f"Placa: {placa_padrao}",
+        ).como_dict())
+
+    log.info("Extrato analisado.", extra={"transacoes": len(transacoes_finais)})
     return transacoes_finais
 
-# --- Função de preenchimento da planilha ---
-def preencher_planilha_reembolso(transacoes, arquivo_modelo, arquivo_destino, nome_da_aba, linha_dos_totais):
+# --- Confiança e escalada do OCR ---
+# A leitura padrão (segmentação automática, imagem binarizada) resolve a maioria
+# dos extratos. Só quando a confiança fica abaixo de OCR_LIMIAR_CONFIANCA o OCR
+# roda de novo com outros modos de segmentação e com a imagem sem binarizar,
+# um de cada vez, e fica a leitura mais confiável.
+LIMIAR_CONFIANCA_OCR = float(os.environ.get("OCR_LIMIAR_CONFIANCA", 0.6))
+ESCALADA_OCR = (
+    ("psm4", {"psm": 4}),  # uma coluna de texto com tamanhos variados
+    ("psm6", {"psm": 6}),  # um bloco de texto uniforme
+    ("sem_binarizar", {"binarizar": False}),
+)
+
+
+# Média entre a confiança do motor nas palavras e a fração das descrições
+# (Passagem/Estacionamento) lidas que viraram transação.
+def confianca_extrato(texto, transacoes, confianca_ocr):
     if not transacoes:
-        print("AVISO: Nenhuma transação para preencher.")
-        return
+        return 0.0
+    descricoes = len(REGEX_DESCRICAO.findall(texto))
+    cobertura = min(1.0, len(transacoes) / descricoes) if descricoes else 0.0
+    return round(0.5 * confianca_ocr + 0.5 * cobertura, 3)
 
-    print(f"INFO: Preenchendo {len(transacoes)} transações em '{arquivo_destino}' na aba '{nome_da_aba}'...")
 
-    if not os.path.exists(arquivo_destino):
-        copyfile(arquivo_modelo, arquivo_destino)
-    
-    try:
-        workbook = openpyxl.load_workbook(arquivo_destino)
-        sheet = workbook[nome_da_aba]
+def _config_ocr(ajustes):
+    if ajustes.get("binarizar", True):
+        return None
+    from processador_imagem import CONFIG_PREPROCESSAMENTO
+    return dict(CONFIG_PREPROCESSAMENTO, ocr_binarizar=False)
 
-        linha_atual = 10
-        while sheet[f'B{linha_atual}'].value is not None:
-            linha_atual += 1
-        
-        print(f"INFO: Inserindo dados a partir da linha {linha_atual}.")
 
-        linhas_necessarias = len(transacoes)
-        espaco_disponivel = linha_dos_totais - linha_atual
-        if linhas_necessarias > espaco_disponivel:
-            linhas_para_inserir = linhas_necessarias - espaco_disponivel
-            sheet.insert_rows(linha_dos_totais, amount=linhas_para_inserir)
+# Lê e analisa o extrato. Retorna {"texto", "transacoes", "confianca",
+# "tentativa"} da melhor leitura, ou None se nenhuma achou texto.
+def ler_extrato(imagem, escalar=True):
+    melhor = None
+    tentativas = (("padrao", {}),) + (ESCALADA_OCR if escalar else ())
+    for i, (nome, ajustes) in enumerate(tentativas):
+        if i:
+            ESCALADAS.inc(etapa="ocr")
+            log.info("Leitura do extrato com baixa confiança. Tentando de novo.", extra={
+                "tentativa": nome, "confianca": melhor["confianca"] if melhor else 0.0})
+        texto, confianca_ocr = _ocr(imagem, _config_ocr(ajustes), ajustes.get("psm"))
+        if confianca_ocr is None:
+            # Erro do motor (não é questão de confiança): repetir não adianta.
+            break
+        if texto is None:
+            continue
+        transacoes = analisar_e_estruturar_texto(texto)
+        leitura = {"texto": texto, "transacoes": transacoes, "tentativa": nome,
+                   "confianca": confianca_extrato(texto, transacoes, confianca_ocr)}
+        if melhor is None or leitura["confianca"] > melhor["confianca"]:
+            melhor = leitura
+        if melhor["confianca"] >= LIMIAR_CONFIANCA_OCR:
+            break
+    if melhor:
+        log.info("Extrato lido.", extra={"tentativa": melhor["tentativa"], "confianca": melhor["confianca"],
+                                         "transacoes": len(melhor["transacoes"])})
+    return melhor
 
-        for transacao in transacoes:
-            sheet[f'B{linha_atual}'] = transacao['Data']
-            sheet[f'C{linha_atual}'] = transacao['Estabelecimento'] + ' - ' + transacao['Observação']
-            sheet[f'D{linha_atual}'] = transacao['Tipo de Despesa']
-            sheet[f'F{linha_atual}'] = "São Jose dos Campos"
-            sheet[f'G{linha_atual}'] = "São Paulo"
-            sheet[f'I{linha_atual}'] = transacao['Valor']
-            
-            linha_atual += 1
-
-        workbook.save(arquivo_destino)
-        print("INFO: Planilha de reembolso atualizada com sucesso!")
 
-    except Exception as e:
-        print(f"ERRO CRÍTICO ao preencher a planilha: {e}")
+# --- Extratos com várias páginas (PDF ou várias fotos) ---
+# Gera a lista de transações de cada página assim que ela é lida.
+def transacoes_das_paginas(paginas):
+    for numero, pagina in enumerate(paginas, start=1):
+        leitura = ler_extrato(pagina)
+        transacoes = leitura["transacoes"] if leitura else []
+        log.info("Página do extrato lida.", extra={"pagina": numero, "transacoes": len(transacoes)})
+        yield transacoes
+
+
+# Junta as páginas removendo as transações repetidas entre elas (fotos que se
+# sobrepõem). Dentro de uma página, transações iguais são legítimas (duas
+# passagens no mesmo pedágio no dia), então vale o maior número de ocorrências
+# de cada transação numa mesma página.
+def mesclar_paginas_extrato(paginas):
+    ocorrencias_mescladas = Counter()
+    transacoes_finais = []
+    for transacoes in paginas:
+        ocorrencias_pagina = Counter()
+        for transacao in transacoes:
+            chave = (transacao["Data"], transacao["Tipo de Despesa"], transacao["Valor"], transacao["Observação"])
+            ocorrencias_pagina[chave] += 1
+            if ocorrencias_pagina[chave] > ocorrencias_mescladas[chave]:
+                ocorrencias_mescladas[chave] = ocorrencias_pagina[chave]
+                transacoes_finais.append(dict(transacao))
+    for i, transacao in enumerate(transacoes_finais):
+        transacao["ID_Transacao"] = f"{transacao['Data']}_{transacao['Valor']:.2f}_{i}"
+    return transacoes_finais
 
 # --- Bloco principal ---
 if __name__ == "__main__":
+    import locale
+
+    try:
+        locale.setlocale(locale.LC_TIME, 'pt_BR.UTF-8')
+    except Exception as e:
+        print(f"AVISO de configuração: {e}")
+
     NOME_DA_ABA = "Plan2"
-    LINHA_DOS_TOTAIS = 46
     ARQUIVO_MODELO = "planilha_reembolso_branco.xlsx"
     ARQUIVO_DESTINO = "reembolso_preenchido.xlsx"
     
@@ -154,17 +390,19 @@ if __name__ == "__main__":
                     todas_as_transacoes.extend(lista_de_transacoes)
         
         if todas_as_transacoes:
-            df_final = pd.DataFrame(todas_as_transacoes)
-            
-            print(f"\n--- RESUMO FINAL COM {len(df_final)} TRANSAÇÕES ---")
-            print(df_final[["ID_Transacao", "Data", "Tipo de Despesa", "Valor"]])
-            
-            preencher_planilha_reembolso(
-                df_final.to_dict('records'),
-                ARQUIVO_MODELO,
-                ARQUIVO_DESTINO,
-                NOME_DA_ABA,
-                LINHA_DOS_TOTAIS
-            )
+            from armazenamento_estado import ArmazenamentoMemoria
+            from relatorios import consultar, interpretar_consulta
+
+            print(f"\n--- RESUMO FINAL COM {len(todas_as_transacoes)} TRANSAÇÕES ---")
+            for t in todas_as_transacoes:
+                print(f"{t['ID_Transacao']:<28}{t['Data']:<16}{t['Tipo de Despesa']:<16}{t['Valor']:>10.2f}")
+            # Mesmo resumo do comando "resumo" do WhatsApp.
+            armazenamento = ArmazenamentoMemoria()
+            armazenamento.adicionar_transacoes("local", todas_as_transacoes)
+            print(consultar(armazenamento, "local", interpretar_consulta("resumo tipo placa dia")))
+
+            from exportacao import exportar_xlsx
+            exportar_xlsx(todas_as_transacoes, ARQUIVO_DESTINO, ARQUIVO_MODELO, NOME_DA_ABA)
+            print(f"INFO: Planilha de reembolso gravada em '{ARQUIVO_DESTINO}'.")
 
         print("\nINFO: Processo finalizado.")
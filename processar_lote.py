@@ -0,0 +1,236 @@
+# processar_lote.py
+# Processamento em lote (fechamento do mês): recebe pastas, arquivos ou globs
+# de imagens e PDFs de extrato, roda detecção de QR e OCR num pool de processos (um detector
+# WeChat por worker), consulta as páginas de NFC-e em paralelo e grava tudo na
+# planilha numa única escrita no final. Imprime o progresso e um resumo JSON.
+#
+# Uso:
+#   python processar_lote.py notas_fiscais/ "pedagios/*.jpg" --workers 4 --resumo resumo.json
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+
+# No terminal, logs em texto (os workers herdam o ambiente).
+os.environ.setdefault("LOG_FORMATO", "texto")
+
+EXTENSOES_IMAGEM = ('.png', '.jpg', '.jpeg', '.pdf')
+
+_detector_qr = None
+
+
+# --- ENTRADAS ---
+def listar_imagens(entradas):
+    imagens = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = [os.path.join(entrada, f) for f in sorted(os.listdir(entrada))]
+        elif os.path.isfile(entrada):
+            candidatos = [entrada]
+        else:
+            candidatos = sorted(glob.glob(entrada, recursive=True))
+        imagens.extend(c for c in candidatos if c.lower().endswith(EXTENSOES_IMAGEM))
+    # Remove repetidos mantendo a ordem (a mesma imagem pode casar com dois globs).
+    return list(dict.fromkeys(imagens))
+
+
+# --- WORKERS (processos) ---
+def _inicializar_worker():
+    global _detector_qr
+    # Cada processo lê uma imagem por vez: uma instância do Tesseract por processo.
+    os.environ["TAMANHO_POOL_OCR"] = "1"
+    from processador_cupom import configurar_detector_wechat
+    _detector_qr = configurar_detector_wechat()
+
+
+def _processar_imagem(caminho):
+    from classificador_midia import classificar_imagem, cupom_sem_qr, esforco_qr
+    from processador_cupom import ler_qr_code
+    from processador_pedagio import ler_extrato, transacoes_das_paginas, mesclar_paginas_extrato
+    from processador_imagem import ESFORCO_QR_MINIMO, ESFORCO_QR_PADRAO, carregar_imagem, paginas_do_pdf
+
+    resultado = {"caminho": caminho, "tipo": None, "url": None, "transacoes": [], "erro": None, "tempos": {}}
+    try:
+        if caminho.lower().endswith('.pdf'):
+            # Extratos em PDF: páginas rasterizadas e lidas uma a uma.
+            resultado["tipo"] = "pedagio"
+            inicio = time.perf_counter()
+            with open(caminho, "rb") as f:
+                conteudo = f.read()
+            resultado["transacoes"] = mesclar_paginas_extrato(transacoes_das_paginas(paginas_do_pdf(conteudo)))
+            resultado["tempos"]["ocr"] = time.perf_counter() - inicio
+            if not resultado["transacoes"]:
+                resultado["erro"] = "Nenhuma transação válida encontrada no PDF."
+            return resultado
+
+        inicio = time.perf_counter()
+        imagem = carregar_imagem(caminho)
+        resultado["tempos"]["decodificacao"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        classificacao = classificar_imagem(imagem)
+        resultado["tempos"]["classificacao"] = time.perf_counter() - inicio
+        resultado["classificacao"] = {k: classificacao[k] for k in ("tipo", "confianca")}
+        esforco = esforco_qr(classificacao)
+
+        inicio = time.perf_counter()
+        url_nota = ler_qr_code(_detector_qr, imagem, esforco=esforco)
+        resultado["tempos"]["qr_code"] = time.perf_counter() - inicio
+        if url_nota:
+            resultado["tipo"] = "cupom"
+            resultado["url"] = url_nota
+            return resultado
+        if cupom_sem_qr(classificacao):
+            resultado["tipo"] = "cupom"
+            resultado["erro"] = "Parece um cupom fiscal, mas o QR Code não foi lido."
+            return resultado
+
+        resultado["tipo"] = "pedagio"
+        inicio = time.perf_counter()
+        leitura = ler_extrato(imagem)
+        resultado["tempos"]["ocr"] = time.perf_counter() - inicio
+        if not (leitura and leitura["transacoes"]) and esforco == ESFORCO_QR_MINIMO:
+            # O OCR não confirmou o extrato: tentativas de QR que foram puladas.
+            inicio = time.perf_counter()
+            url_nota = ler_qr_code(_detector_qr, imagem, esforco=ESFORCO_QR_PADRAO)
+            resultado["tempos"]["qr_code"] += time.perf_counter() - inicio
+            if url_nota:
+                resultado["tipo"] = "cupom"
+                resultado["url"] = url_nota
+                return resultado
+        if not leitura:
+            resultado["erro"] = "Nenhum texto lido na imagem."
+            return resultado
+        resultado["transacoes"] = leitura["transacoes"]
+        if not resultado["transacoes"]:
+            resultado["erro"] = "Nenhuma transação válida encontrada."
+    except Exception as e:
+        resultado["erro"] = str(e)
+    return resultado
+
+
+# --- PÁGINAS DE NFC-e (threads, I/O) ---
+def _consultar_cupom(resultado):
+    from processador_cupom import extrair_dados_pagina, transacao_do_cupom
+    from decodificador_nfce import completar_com_qr, dados_nota_do_qr, decodificar_qr_nfce, qr_tem_dados_de_lancamento
+    inicio = time.perf_counter()
+    dados_nota = extrair_dados_pagina(resultado["url"])
+    resultado["tempos"]["pagina_nfce"] = time.perf_counter() - inicio
+    # O QR Code completa o que a página não trouxe (CNPJ, data, valor).
+    dados_qr = decodificar_qr_nfce(resultado["url"])
+    if dados_nota:
+        dados_nota = completar_com_qr(dados_nota, dados_qr)
+    elif qr_tem_dados_de_lancamento(dados_qr):
+        dados_nota = dados_nota_do_qr(dados_qr, resultado["url"])
+    if dados_nota and dados_nota.get('valor_total', 0) > 0:
+        resultado["transacoes"] = [transacao_do_cupom(dados_nota)]
+        resultado["fonte"] = dados_nota.get("fonte")
+    else:
+        resultado["erro"] = "QR Code lido, mas falhou ao extrair os dados do site."
+    return resultado
+
+
+# --- EXECUÇÃO ---
+def processar_lote(entradas, arquivo_destino, arquivo_modelo, nome_da_aba, linha_dos_totais=None,
+                   workers=None, conexoes=8):
+    import exportacao
+
+    inicio_total = time.perf_counter()
+    imagens = listar_imagens(entradas)
+    total = len(imagens)
+    print(f"INFO: {total} imagens para processar com {workers or os.cpu_count()} processos.")
+
+    resultados = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_worker) as pool_processos, \
+            ThreadPoolExecutor(max_workers=conexoes) as pool_conexoes:
+        consultas = []
+        futuros = [pool_processos.submit(_processar_imagem, caminho) for caminho in imagens]
+        for i, futuro in enumerate(as_completed(futuros), start=1):
+            resultado = futuro.result()
+            print(f"[{i}/{total}] {resultado['caminho']} -> {resultado['tipo'] or 'falha'}"
+                  + (f" ({resultado['erro']})" if resultado["erro"] else ""))
+            if resultado["tipo"] == "cupom" and not resultado["erro"]:
+                # A consulta à SEFAZ começa assim que o QR é lido, sem esperar o resto do lote.
+                consultas.append(pool_conexoes.submit(_consultar_cupom, resultado))
+            else:
+                resultados.append(resultado)
+        for i, futuro in enumerate(as_completed(consultas), start=1):
+            resultado = futuro.result()
+            print(f"[NFC-e {i}/{len(consultas)}] {resultado['caminho']} -> "
+                  + (resultado["erro"] or f"ok via {resultado.get('fonte')}"))
+            resultados.append(resultado)
+
+    if consultas:
+        from pool_navegador import obter_pool_navegador
+        obter_pool_navegador().fechar()
+
+    todas_as_transacoes = [t for r in sorted(resultados, key=lambda r: r["caminho"]) for t in r["transacoes"]]
+
+    inicio_escrita = time.perf_counter()
+    if todas_as_transacoes and exportacao.formato_do_arquivo(arquivo_destino) != "xlsx":
+        exportacao.exportar(todas_as_transacoes, arquivo_destino)
+    elif todas_as_transacoes:
+        exportacao.exportar_xlsx(todas_as_transacoes, arquivo_destino, arquivo_modelo, nome_da_aba,
+                                 linha_dos_totais=linha_dos_totais)
+    tempo_escrita = time.perf_counter() - inicio_escrita
+
+    duracao = time.perf_counter() - inicio_total
+    tempos_etapas = {}
+    for resultado in resultados:
+        for etapa, segundos in resultado["tempos"].items():
+            tempos_etapas.setdefault(etapa, []).append(segundos)
+
+    return {
+        "imagens": total,
+        "cupons": sum(1 for r in resultados if r["tipo"] == "cupom" and not r["erro"]),
+        "pedagios": sum(1 for r in resultados if r["tipo"] == "pedagio" and not r["erro"]),
+        "transacoes": len(todas_as_transacoes),
+        "falhas": [{"caminho": r["caminho"], "erro": r["erro"]} for r in resultados if r["erro"]],
+        "duracao_s": round(duracao, 3),
+        "imagens_por_s": round(total / duracao, 3) if duracao else 0.0,
+        "escrita_planilha_s": round(tempo_escrita, 3),
+        "etapas_media_s": {etapa: round(sum(v) / len(v), 3) for etapa, v in tempos_etapas.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Processa pastas de cupons e extratos de pedágio em lote.")
+    parser.add_argument("entradas", nargs="+", help="Pastas, arquivos ou globs de imagens.")
+    parser.add_argument("--workers", type=int, default=None, help="Processos para QR/OCR (padrão: núcleos).")
+    parser.add_argument("--conexoes", type=int, default=8, help="Consultas simultâneas às páginas de NFC-e.")
+    parser.add_argument("--destino", default="reembolso_preenchido.xlsx",
+                        help="Planilha .xlsx (a partir do modelo), .csv ou .parquet.")
+    parser.add_argument("--modelo", default="planilha_reembolso_branco.xlsx")
+    parser.add_argument("--aba", default="Plan2")
+    parser.add_argument("--linha-totais", type=int, default=None,
+                        help="Só para modelos sem o rótulo TOTAL A RECEBER.")
+    parser.add_argument("--resumo", help="Arquivo para gravar o resumo JSON (além de imprimir).")
+    args = parser.parse_args(argv)
+
+    import exportacao
+    try:
+        formato = exportacao.formato_do_arquivo(args.destino)
+    except ValueError as e:
+        print(f"ERRO FATAL: {e}")
+        return 1
+    if formato == "xlsx" and not os.path.exists(args.modelo):
+        print(f"ERRO FATAL: O arquivo modelo '{args.modelo}' não foi encontrado.")
+        return 1
+
+    resumo = processar_lote(args.entradas, args.destino, args.modelo, args.aba, args.linha_totais,
+                            workers=args.workers, conexoes=args.conexoes)
+    texto_resumo = json.dumps(resumo, ensure_ascii=False, indent=2)
+    print(texto_resumo)
+    if args.resumo:
+        with open(args.resumo, "w", encoding="utf-8") as f:
+            f.write(texto_resumo)
+    return 0 if not resumo["falhas"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
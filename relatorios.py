@@ -0,0 +1,159 @@
+# relatorios.py
+# Totais e resumos dos lançamentos guardados, sem abrir a planilha:
+# - comandos do WhatsApp "total" e "resumo" (opcionalmente com período e
+#   agrupamento), respondidos com uma consulta agregada no armazenamento;
+# - exportação de um período em fluxo (csv/parquet) direto do armazenamento.
+# As agregações rodam no backend (GROUP BY nas colunas indexadas do SQLite),
+# ver armazenamento_estado.agregar.
+#
+# Formas aceitas:
+#   total | resumo                       período do cadastro (ou tudo)
+#   total 03/2025                        um mês
+#   resumo 01/03/2025 15/03/2025         de uma data a outra (ou só um dia)
+#   resumo placa | resumo dia | resumo tipo | resumo mes
+#   resumo dia 03/2025                   agrupamento e período juntos
+
+import re
+from datetime import date, timedelta
+
+from transacao import data_iso
+
+
+COMANDOS = ("total", "resumo")
+# Palavra do comando -> agrupamento de armazenamento.agregar.
+AGRUPAMENTOS = {"tipo": "tipo", "tipos": "tipo", "placa": "placa", "placas": "placa",
+                "dia": "dia", "dias": "dia", "mes": "mes", "mês": "mes", "meses": "mes"}
+# Sem agrupamento pedido, o resumo mostra por tipo e por placa.
+AGRUPAMENTOS_RESUMO = ("tipo", "placa")
+
+_MES_ANO = re.compile(r"^(\d{1,2})/(\d{4})$")
+_DATA = re.compile(r"^\d{1,2}/\d{1,2}/\d{2,4}$")
+
+TITULOS = {"tipo": "Por tipo", "placa": "Por placa", "dia": "Por dia", "mes": "Por mês"}
+
+
+# --- Interpretação do comando ---
+# Retorna {"comando", "agrupamentos", "inicio", "fim"} (datas ISO ou None), ou
+# None se o texto não é uma consulta.
+def interpretar_consulta(texto):
+    palavras = texto.strip().lower().split()
+    if not palavras or palavras[0] not in COMANDOS:
+        return None
+    consulta = {"comando": palavras[0], "agrupamentos": (), "inicio": None, "fim": None}
+    datas = []
+    for palavra in palavras[1:]:
+        if palavra in AGRUPAMENTOS and consulta["comando"] == "resumo":
+            consulta["agrupamentos"] += (AGRUPAMENTOS[palavra],)
+        elif (m := _MES_ANO.match(palavra)):
+            mes, ano = int(m.group(1)), int(m.group(2))
+            if not 1 <= mes <= 12:
+                return None
+            proximo = date(ano + mes // 12, mes % 12 + 1, 1)
+            datas += [date(ano, mes, 1).isoformat(), (proximo - timedelta(days=1)).isoformat()]
+        elif _DATA.match(palavra) and data_iso(palavra):
+            datas.append(data_iso(palavra))
+        else:
+            # "total de ontem", "resumo por favor": não é um comando que a gente entende.
+            return None
+    if datas:
+        consulta["inicio"], consulta["fim"] = min(datas), max(datas)
+    if consulta["comando"] == "resumo" and not consulta["agrupamentos"]:
+        consulta["agrupamentos"] = AGRUPAMENTOS_RESUMO
+    return consulta
+
+
+# Período do cadastro (Data Inicial / Data Final), se as duas forem datas válidas.
+def periodo_do_cadastro(dados):
+    inicio, fim = data_iso(dados.get("data_inicial")), data_iso(dados.get("data_final"))
+    if inicio and fim and inicio <= fim:
+        return inicio, fim
+    return None, None
+
+
+# --- Formatação ---
+def formatar_brl(valor):
+    return "R$ " + f"{valor:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def formatar_data(iso):
+    return f"{iso[8:10]}/{iso[5:7]}/{iso[:4]}"
+
+
+def descrever_periodo(inicio, fim):
+    if not inicio and not fim:
+        return "todos os lançamentos"
+    if inicio == fim:
+        return f"dia {formatar_data(inicio)}"
+    return f"{formatar_data(inicio)} a {formatar_data(fim)}"
+
+
+def _rotulo(agrupamento, chave):
+    if chave is None:
+        return "Sem data" if agrupamento in ("dia", "mes") else "Sem tipo"
+    if agrupamento == "dia":
+        return formatar_data(chave)
+    if agrupamento == "mes":
+        return f"{chave[5:7]}/{chave[:4]}"
+    return chave
+
+
+def _plural(quantidade):
+    return f"{quantidade} lançamento" + ("" if quantidade == 1 else "s")
+
+
+# --- Consulta ---
+def consultar(armazenamento, numero, consulta):
+    inicio, fim = consulta["inicio"], consulta["fim"]
+    periodo = descrever_periodo(inicio, fim)
+    totais = armazenamento.agregar(numero, "total", inicio, fim)
+    if not totais:
+        return f"📭 Nenhum lançamento em {periodo}."
+    _, quantidade, total = totais[0]
+    if consulta["comando"] == "total":
+        return f"💰 Total ({periodo}): {formatar_brl(total)} em {_plural(quantidade)}."
+
+    linhas = [f"📊 Resumo ({periodo})"]
+    for agrupamento in consulta["agrupamentos"]:
+        grupos = armazenamento.agregar(numero, agrupamento, inicio, fim)
+        if agrupamento == "placa":
+            # Cupons não têm placa: o resumo por placa só lista os pedágios.
+            grupos = [grupo for grupo in grupos if grupo[0] is not None]
+        if not grupos:
+            continue
+        linhas.append(f"\n*{TITULOS[agrupamento]}*")
+        linhas += [f"{_rotulo(agrupamento, chave)}: {formatar_brl(valor)} ({n})" for chave, n, valor in grupos]
+    linhas.append(f"\n*Total:* {formatar_brl(total)} em {_plural(quantidade)}")
+    return "\n".join(linhas)
+
+
+# --- Exportação do período (em fluxo) ---
+def exportar_periodo(armazenamento, numero, arquivo_destino, inicio=None, fim=None, tipo=None,
+                     arquivo_modelo=None, nome_da_aba=None, dados=None):
+    import exportacao
+    transacoes = armazenamento.iterar_transacoes(numero, inicio, fim, tipo)
+    return exportacao.exportar(transacoes, arquivo_destino, arquivo_modelo, nome_da_aba, dados)
+
+
+# Uso: python relatorios.py whatsapp:+5512999999999 [resumo 03/2025] [--destino marco.csv]
+if __name__ == "__main__":
+    import argparse
+    import os
+    from armazenamento_estado import criar_armazenamento
+
+    parser = argparse.ArgumentParser(description="Totais e exportação dos lançamentos de um usuário.")
+    parser.add_argument("numero", help="Número do WhatsApp (ex.: whatsapp:+5512999999999).")
+    parser.add_argument("consulta", nargs="*", default=["resumo"], help="Como no WhatsApp (padrão: resumo).")
+    parser.add_argument("--tipo", help="Só um Tipo de Despesa (na exportação).")
+    parser.add_argument("--destino", help="Exporta o período para .csv, .parquet ou .xlsx.")
+    args = parser.parse_args()
+
+    armazenamento = criar_armazenamento(os.path.dirname(os.path.abspath(__file__)))
+    consulta = interpretar_consulta(" ".join(args.consulta))
+    if consulta is None:
+        parser.error(f"Consulta não reconhecida: {' '.join(args.consulta)}")
+    print(consultar(armazenamento, args.numero, consulta))
+    if args.destino:
+        pasta = os.path.dirname(os.path.abspath(__file__))
+        gravadas = exportar_periodo(armazenamento, args.numero, args.destino, consulta["inicio"], consulta["fim"],
+                                    args.tipo, os.path.join(pasta, "planilha_reembolso_branco.xlsx"), "Plan2")
+        print(f"INFO: {gravadas} transações gravadas em '{args.destino}'.")
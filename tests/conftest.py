@@ -0,0 +1,13 @@
+# tests/conftest.py
+# O app cria o armazenamento, o cache e o enviador no import: aponta tudo
+# para uma pasta temporária (e para o enviador só de log) antes disso.
+
+import os
+import tempfile
+
+PASTA_TESTES = tempfile.mkdtemp(prefix="testes_reembolso_")
+os.environ["ARMAZENAMENTO"] = "memoria"
+os.environ["CACHE_RESULTADOS_DB"] = os.path.join(PASTA_TESTES, "cache_resultados.db")
+os.environ["LOG_NIVEL"] = "CRITICAL"
+for variavel in ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_WHATSAPP_NUMBER"):
+    os.environ.pop(variavel, None)
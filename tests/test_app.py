@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+import app
+from enviador_mensagens import EnviadorStub
+
+
+@pytest.fixture
+def usuario_cadastrado(tmp_path, monkeypatch):
+    numero = f"whatsapp:+55{os.getpid()}0"
+    monkeypatch.setattr(app, "PASTA_PLANILHAS", str(tmp_path))
+    monkeypatch.setattr(app, "enviador", EnviadorStub())
+    app.armazenamento.salvar_usuario(numero, {"etapa": len(app.ETAPAS_CADASTRO), "dados": {"nome": "Fulano"}})
+    app.armazenamento.adicionar_transacoes(numero, [
+        {"Data": "12/03/2025", "Tipo de Despesa": "Passagem", "Estabelecimento": "Concessionaria 123",
+         "Valor": 8.7, "Observação": "Placa: ABC1D23"}])
+    return numero
+
+
+def _postar(numero, texto):
+    resposta = app.app.test_client().post("/whatsapp", data={"From": numero, "Body": texto, "NumMedia": "0"})
+    assert resposta.status_code == 200
+    return resposta.get_data(as_text=True)
+
+
+# O webhook só enfileira: a planilha sai depois, pelo enviador.
+def test_exportar_responde_na_hora_e_envia_a_planilha_pela_fila(usuario_cadastrado):
+    assert "⏳" in _postar(usuario_cadastrado, "exportar")
+    app.fila.aguardar()
+
+    arquivo = app.arquivo_planilha_usuario(usuario_cadastrado)
+    assert app.enviador.mensagens == [
+        {"destino": usuario_cadastrado, "texto": f"📄 Planilha atualizada: {os.path.basename(arquivo)}"}]
+    assert os.path.exists(arquivo)
+
+
+def test_falha_ao_gerar_a_planilha_vira_mensagem_de_erro(usuario_cadastrado, monkeypatch):
+    def falhar(*args, **kwargs):
+        raise OSError("disco cheio")
+    monkeypatch.setattr(app.exportacao, "exportar_xlsx", falhar)
+
+    _postar(usuario_cadastrado, "planilha")
+    app.fila.aguardar()
+    assert [m["texto"][0] for m in app.enviador.mensagens] == ["❌"]
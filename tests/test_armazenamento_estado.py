@@ -0,0 +1,126 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from armazenamento_estado import ArmazenamentoMemoria, ArmazenamentoSQLite
+
+NUMERO = "whatsapp:+5511999990000"
+CUPOM = {"Data": "05/03/2025", "Tipo de Despesa": "Combustivel/Alimentação", "Estabelecimento": "12.345.678/0001-90",
+         "Valor": 120.5, "Observação": "CNPJ: 12.345.678/0001-90"}
+PASSAGEM = {"Data": "12 de marco", "Tipo de Despesa": "Passagem", "Estabelecimento": "Concessionaria 123",
+            "Valor": 8.7, "Observação": "Placa: ABC1D23"}
+
+
+@pytest.fixture(params=["memoria", "sqlite"])
+def armazenamento(request, tmp_path):
+    if request.param == "memoria":
+        return ArmazenamentoMemoria()
+    return ArmazenamentoSQLite(str(tmp_path / "estado.db"))
+
+
+# Ler, somar e gravar o usuário sem bloquear perderia incrementos.
+def _incrementar(armazenamento, vezes):
+    for _ in range(vezes):
+        with armazenamento.bloquear(NUMERO):
+            usuario = armazenamento.obter_usuario(NUMERO)
+            usuario["dados"]["contador"] = usuario["dados"].get("contador", 0) + 1
+            time.sleep(0.0005)
+            armazenamento.salvar_usuario(NUMERO, usuario)
+
+
+def test_bloquear_serializa_leitura_e_escrita_do_usuario(armazenamento):
+    threads = [threading.Thread(target=_incrementar, args=(armazenamento, 25)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert armazenamento.obter_usuario(NUMERO)["dados"]["contador"] == 100
+
+
+# Dois objetos no mesmo arquivo fazem o papel de dois workers do gunicorn.
+def test_bloquear_serializa_entre_conexoes_no_mesmo_banco(tmp_path):
+    caminho = str(tmp_path / "estado.db")
+    workers = [ArmazenamentoSQLite(caminho), ArmazenamentoSQLite(caminho)]
+    threads = [threading.Thread(target=_incrementar, args=(workers[i % 2], 20)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert workers[0].obter_usuario(NUMERO)["dados"]["contador"] == 80
+
+
+def test_erro_dentro_do_bloqueio_desfaz_as_escritas(tmp_path):
+    armazenamento = ArmazenamentoSQLite(str(tmp_path / "estado.db"))
+    with pytest.raises(RuntimeError):
+        with armazenamento.bloquear(NUMERO):
+            armazenamento.salvar_usuario(NUMERO, {"etapa": 3, "dados": {"nome": "Fulano"}})
+            with armazenamento.bloquear(NUMERO):
+                armazenamento.adicionar_transacoes(NUMERO, [CUPOM])
+            raise RuntimeError("falha no meio")
+    assert armazenamento.obter_usuario(NUMERO) == {"etapa": 0, "dados": {}}
+    assert armazenamento.listar_transacoes(NUMERO) == []
+
+
+def test_atualizar_transacao_e_idempotente(armazenamento):
+    id_cupom, id_passagem = armazenamento.adicionar_transacoes(NUMERO, [CUPOM, PASSAGEM])
+    campos = {"Estabelecimento": "POSTO TESTE LTDA", "Valor": 130.0}
+
+    assert armazenamento.atualizar_transacao(NUMERO, id_cupom, campos)
+    uma_vez = (armazenamento.listar_transacoes(NUMERO), armazenamento.agregar(NUMERO, "tipo"))
+    assert armazenamento.atualizar_transacao(NUMERO, id_cupom, campos)
+    assert (armazenamento.listar_transacoes(NUMERO), armazenamento.agregar(NUMERO, "tipo")) == uma_vez
+
+    assert uma_vez[0][0] == dict(CUPOM, id=id_cupom, **campos)
+    assert uma_vez[0][1] == dict(PASSAGEM, id=id_passagem)
+    assert armazenamento.agregar(NUMERO, "total", "2025-03-05", "2025-03-05") == [(None, 1, 130.0)]
+
+
+def test_atualizar_transacao_de_outro_usuario_nao_muda_nada(armazenamento):
+    (id_cupom,) = armazenamento.adicionar_transacoes(NUMERO, [CUPOM])
+    assert not armazenamento.atualizar_transacao("whatsapp:+5511888880000", id_cupom, {"Valor": 0.0})
+    assert not armazenamento.atualizar_transacao(NUMERO, id_cupom + 100, {"Valor": 0.0})
+    assert armazenamento.listar_transacoes(NUMERO) == [dict(CUPOM, id=id_cupom)]
+
+
+# --- Migração do banco anterior às colunas indexadas ---
+def _criar_banco_antigo(caminho, transacoes, criado_em):
+    conexao = sqlite3.connect(caminho)
+    conexao.executescript("""
+        CREATE TABLE usuarios (numero TEXT PRIMARY KEY, etapa INTEGER NOT NULL, dados TEXT NOT NULL,
+                               atualizado_em REAL NOT NULL);
+        CREATE TABLE transacoes (id INTEGER PRIMARY KEY AUTOINCREMENT, numero TEXT NOT NULL,
+                                 dados TEXT NOT NULL, criado_em REAL NOT NULL);
+        CREATE INDEX idx_transacoes_numero ON transacoes (numero, id);
+    """)
+    conexao.executemany("INSERT INTO transacoes (numero, dados, criado_em) VALUES (?, ?, ?)",
+                        [(NUMERO, json.dumps(t, ensure_ascii=False), criado_em) for t in transacoes])
+    conexao.commit()
+    conexao.close()
+
+
+def test_migracao_indexa_as_transacoes_antigas(tmp_path):
+    caminho = str(tmp_path / "estado.db")
+    # Data por extenso ("12 de marco") ganha o ano de quando foi lançada.
+    _criar_banco_antigo(caminho, [CUPOM, PASSAGEM], time.mktime((2024, 6, 30, 12, 0, 0, 0, 0, -1)))
+
+    armazenamento = ArmazenamentoSQLite(caminho)
+    colunas = sqlite3.connect(caminho).execute(
+        "SELECT data, tipo, valor, placa, indexada FROM transacoes ORDER BY id").fetchall()
+    assert colunas == [("2025-03-05", "Combustivel/Alimentação", 120.5, None, 1),
+                       ("2024-03-12", "Passagem", 8.7, "ABC1D23", 1)]
+    assert armazenamento.agregar(NUMERO, "placa") == [("ABC1D23", 1, 8.7), (None, 1, 120.5)]
+    assert [t["id"] for t in armazenamento.listar_transacoes(NUMERO)] == [1, 2]
+
+
+def test_migracao_roda_uma_vez(tmp_path):
+    caminho = str(tmp_path / "estado.db")
+    _criar_banco_antigo(caminho, [CUPOM], time.time())
+    ArmazenamentoSQLite(caminho)
+    # Uma coluna apagada à mão não volta: a linha já está marcada como indexada.
+    sqlite3.connect(caminho, isolation_level=None).execute("UPDATE transacoes SET tipo = NULL")
+
+    armazenamento = ArmazenamentoSQLite(caminho)
+    assert armazenamento.agregar(NUMERO, "tipo") == [(None, 1, 120.5)]
@@ -0,0 +1,177 @@
+import os
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+import cache_resultados
+from cache_resultados import CacheResultados, chave_do_extrato, chaves_da_imagem, extrair_chave_acesso
+
+LAYOUT = ["Extrato Sem Parar", "123 - ABC1D23", "12 de marco", "Passagem CCR AutoBan", "Estacionamento"]
+
+
+# Extratos diferentes sobre o mesmo fundo branco e com o mesmo layout: só os
+# valores mudam (no dHash 8x8, vários deles davam o mesmo hash).
+def extrato_sintetico(valores):
+    folha = np.full((1600, 1200), 255, np.uint8)
+    linhas = LAYOUT + [f"R$ {valor}" for valor in valores]
+    for n, linha in enumerate(linhas):
+        cv2.putText(folha, linha, (80, 120 + n * 90), cv2.FONT_HERSHEY_SIMPLEX, 1.6, 20, 3, cv2.LINE_AA)
+    return cv2.imencode(".jpg", folha, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def transacoes(valor):
+    return [{"Data": "12 de marco", "Tipo de Despesa": "Passagem", "Valor": valor, "Observação": "Placa: ABC1D23"}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheResultados(str(tmp_path / "cache.db"))
+
+
+# Relógio controlado pelo teste no lugar de time.time do módulo.
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(cache_resultados, "time", SimpleNamespace(time=lambda: agora[0]))
+    return agora
+
+
+def _chaves_gravadas(cache):
+    return {chave for (chave,) in cache._conexao.execute("SELECT chave FROM resultados")}
+
+
+# Mesma validação do decodificador: 44 dígitos com o dígito verificador errado
+# (QR mal lido) não viram chave de cache.
+@pytest.mark.parametrize("url, chave", [
+    ("https://www.nfce.fazenda.sp.gov.br/qrcode?p=35250312345678000190650010000043211123456789|2|1|1|ff",
+     "35250312345678000190650010000043211123456789"),
+    ("https://www.nfce.fazenda.sp.gov.br/qrcode?p=35250312345678000190650010000043211123456780|2|1|1|ff", None),
+    ("https://www.nfce.fazenda.sp.gov.br/qrcode?chNFe=123&nVersao=100", None),
+    (None, None),
+])
+def test_extrair_chave_acesso_so_aceita_chave_valida(url, chave):
+    assert extrair_chave_acesso(url) == chave
+
+def test_extratos_com_mesmo_layout_tem_chaves_diferentes():
+    imagens = [extrato_sintetico([f"{8 + i},{10 * i:02d}", f"{15 + i},00"]) for i in range(8)]
+    chaves = {chave for imagem in imagens for chave in chaves_da_imagem(imagem)}
+    assert len(chaves) == 8
+    assert all(chave.startswith("img:") for chave in chaves)
+
+
+def test_extrato_diferente_do_mesmo_remetente_nao_e_ignorado(cache):
+    chaves_a = chaves_da_imagem(extrato_sintetico(["8,70"])) + [chave_do_extrato(transacoes(8.7))]
+    chaves_b = chaves_da_imagem(extrato_sintetico(["9,10"])) + [chave_do_extrato(transacoes(9.1))]
+    cache.salvar(chaves_a, {"tipo": "pedagio", "transacoes": transacoes(8.7)}, "whatsapp:+551")
+    assert cache.buscar(chaves_b) is None
+
+
+def test_extrato_de_outra_pessoa_nao_e_reaproveitado(cache):
+    cache.salvar(chaves_da_imagem(extrato_sintetico(["8,70"])), {"tipo": "pedagio", "transacoes": transacoes(8.7)},
+                 "whatsapp:+551")
+    assert cache.buscar(chaves_da_imagem(extrato_sintetico(["9,10"]))) is None
+
+
+# A mesma foto recomprimida (reencaminhada) tem outros bytes; o extrato é
+# reconhecido pelas transações lidas, em qualquer ordem.
+def test_mesmo_extrato_reenviado_e_reconhecido_pelas_transacoes(cache):
+    original = extrato_sintetico(["8,70"])
+    recomprimida = cv2.imencode(".jpg", cv2.imdecode(np.frombuffer(original, np.uint8), cv2.IMREAD_GRAYSCALE),
+                                [cv2.IMWRITE_JPEG_QUALITY, 60])[1].tobytes()
+    assert chaves_da_imagem(original) != chaves_da_imagem(recomprimida)
+
+    lidas = transacoes(8.7) + transacoes(15.0)
+    cache.salvar(chaves_da_imagem(original) + [chave_do_extrato(lidas)],
+                 {"tipo": "pedagio", "transacoes": lidas}, "whatsapp:+551")
+    em_cache = cache.buscar(chaves_da_imagem(recomprimida) + [chave_do_extrato(list(reversed(lidas)))])
+    assert em_cache["remetentes"] == ["whatsapp:+551"]
+
+
+def test_app_lanca_dois_extratos_diferentes_com_mesmo_layout(monkeypatch):
+    import app
+    from fila_processamento import Tarefa
+
+    imagens = {extrato_sintetico(["8,70"]): transacoes(8.7), extrato_sintetico(["9,10"]): transacoes(9.1)}
+    leitura_atual = {}
+    monkeypatch.setattr(app, "ler_extrato", lambda imagem: {
+        "texto": "", "transacoes": leitura_atual["transacoes"], "confianca": 1.0, "tentativa": "padrao"})
+
+    numero = f"whatsapp:+55{os.getpid()}"
+    respostas = []
+    for conteudo, lidas in imagens.items():
+        leitura_atual["transacoes"] = lidas
+        tarefa, extratos = Tarefa(None, (), {}), []
+        assert app.processar_midia(tarefa, numero, conteudo, "image/jpeg", extratos) is None
+        respostas.append(app.lancar_extratos(tarefa, numero, extratos))
+
+    assert all(resposta.startswith("✅") for resposta in respostas)
+    assert [t["Valor"] for t in app.armazenamento.listar_transacoes(numero)] == [8.7, 9.1]
+
+
+# Um extrato já lançado (reencaminhado, outros bytes) junto com um novo na
+# mesma mensagem: só as transações do novo entram.
+def test_app_lanca_so_o_extrato_novo_da_mensagem(monkeypatch):
+    import app
+    from fila_processamento import Tarefa
+
+    original = extrato_sintetico(["8,70"])
+    recomprimida = cv2.imencode(".jpg", cv2.imdecode(np.frombuffer(original, np.uint8), cv2.IMREAD_GRAYSCALE),
+                                [cv2.IMWRITE_JPEG_QUALITY, 60])[1].tobytes()
+    leitura_atual = {}
+    monkeypatch.setattr(app, "ler_extrato", lambda imagem: {
+        "texto": "", "transacoes": leitura_atual["transacoes"], "confianca": 1.0, "tentativa": "padrao"})
+
+    def enviar(numero, arquivos):
+        tarefa, extratos = Tarefa(None, (), {}), []
+        for conteudo, lidas in arquivos:
+            leitura_atual["transacoes"] = lidas
+            assert app.processar_midia(tarefa, numero, conteudo, "image/jpeg", extratos) is None
+        return app.lancar_extratos(tarefa, numero, extratos)
+
+    numero = f"whatsapp:+56{os.getpid()}"
+    assert enviar(numero, [(original, transacoes(8.7))]).startswith("✅")
+    resposta = enviar(numero, [(recomprimida, transacoes(8.7)), (extrato_sintetico(["9,10"]), transacoes(9.1))])
+
+    assert resposta.startswith("✅ Extrato com 1 transações") and "1 arquivo(s) já lançado(s)" in resposta
+    assert [t["Valor"] for t in app.armazenamento.listar_transacoes(numero)] == [8.7, 9.1]
+    # As chaves da foto reencaminhada também ficaram no cache.
+    assert numero in app.cache.buscar(chaves_da_imagem(recomprimida))["remetentes"]
+
+def test_entrada_vencida_nao_e_devolvida_e_sai_do_banco(tmp_path, relogio):
+    cache = CacheResultados(str(tmp_path / "cache.db"), ttl_segundos=60)
+    cache.salvar(["nfce:1"], {"valor": 10}, "whatsapp:+551")
+
+    relogio[0] += 60
+    assert cache.buscar(["nfce:1"])["resultado"] == {"valor": 10}
+    relogio[0] += 1
+    assert cache.buscar(["nfce:1"]) is None
+    assert _chaves_gravadas(cache) == set()
+
+
+def test_salvar_remove_as_entradas_vencidas(tmp_path, relogio):
+    cache = CacheResultados(str(tmp_path / "cache.db"), ttl_segundos=60)
+    cache.salvar(["nfce:antiga"], {"valor": 1}, "whatsapp:+551")
+    relogio[0] += 61
+    cache.salvar(["nfce:nova"], {"valor": 2}, "whatsapp:+551")
+    assert _chaves_gravadas(cache) == {"nfce:nova"}
+
+
+# Acima do limite sai a entrada acessada há mais tempo, não a mais antiga.
+def test_limite_de_entradas_remove_a_menos_usada(tmp_path, relogio):
+    cache = CacheResultados(str(tmp_path / "cache.db"), max_entradas=2)
+    for chave in ("nfce:a", "nfce:b"):
+        relogio[0] += 1
+        cache.salvar([chave], {"chave": chave}, "whatsapp:+551")
+    relogio[0] += 1
+    assert cache.buscar(["nfce:a"]) is not None
+    relogio[0] += 1
+    cache.salvar(["nfce:c"], {"chave": "nfce:c"}, "whatsapp:+551")
+    assert _chaves_gravadas(cache) == {"nfce:a", "nfce:c"}
+
+
+def test_remetentes_se_acumulam_sem_repetir(cache):
+    for remetente in ("whatsapp:+551", "whatsapp:+552", "whatsapp:+551"):
+        cache.salvar(["nfce:1"], {"valor": 10}, remetente)
+    assert cache.buscar(["img:x", "nfce:1"])["remetentes"] == ["whatsapp:+551", "whatsapp:+552"]
@@ -0,0 +1,95 @@
+from urllib.parse import quote
+
+import pytest
+
+from decodificador_nfce import (decodificar_chave, decodificar_qr_nfce, digito_verificador,
+                                qr_tem_dados_de_lancamento)
+
+# SP, março de 2025, CNPJ 12.345.678/0001-90, modelo 65, série 1, número 4321.
+CHAVE_ONLINE = "35250312345678000190650010000043211123456789"
+URL_SEFAZ = "https://www.nfce.fazenda.sp.gov.br/qrcode"
+
+
+def _chave(chave43):
+    return chave43 + str(digito_verificador(chave43))
+
+
+# Mesma nota emitida em contingência offline (tipo de emissão 9).
+CHAVE_OFFLINE = _chave(CHAVE_ONLINE[:34] + "9" + CHAVE_ONLINE[35:43])
+
+
+# --- Dígito verificador (módulo 11) ---
+def test_digito_verificador_do_exemplo_do_manual_da_nfe():
+    assert digito_verificador("5206043300991100250655012000000780026730161") == 5
+
+
+def test_digito_verificador_e_zero_quando_o_resto_e_zero_ou_um():
+    restos = {}
+    for ultimo in "0123456789":
+        chave43 = CHAVE_ONLINE[:42] + ultimo
+        soma = sum(int(d) * (2, 3, 4, 5, 6, 7, 8, 9)[i % 8] for i, d in enumerate(reversed(chave43)))
+        restos[soma % 11] = digito_verificador(chave43)
+    assert restos[0] == 0 and restos[1] == 0
+    assert all(digito == 11 - resto for resto, digito in restos.items() if resto >= 2)
+
+
+def test_chave_valida_e_decodificada_campo_a_campo():
+    assert decodificar_chave(CHAVE_ONLINE) == {
+        "chave": CHAVE_ONLINE, "uf": "SP", "ano": 2025, "mes": 3, "cnpj": "12.345.678/0001-90",
+        "modelo": "65", "serie": 1, "numero": 4321, "tipo_emissao": "1"}
+
+
+@pytest.mark.parametrize("chave", [
+    CHAVE_ONLINE[:43] + "0",                        # dígito verificador errado
+    CHAVE_ONLINE[:20] + "56" + CHAVE_ONLINE[22:],   # dígitos trocados no meio
+    CHAVE_ONLINE[:43],                              # 43 dígitos
+    CHAVE_ONLINE[:42] + "a9",                       # não numérica
+    None,
+])
+def test_chave_invalida_e_rejeitada(chave):
+    assert decodificar_chave(chave) is None
+
+
+# --- QR Code ---
+def test_qr_v1_traz_valor_e_data():
+    dh_emi = "2025-03-05T10:20:30-03:00".encode("ascii").hex()
+    dados = decodificar_qr_nfce(f"{URL_SEFAZ}?chNFe={CHAVE_ONLINE}&nVersao=100&tpAmb=1&dhEmi={dh_emi}"
+                                f"&vNF=45.90&vICMS=0.00&digVal=abc&cIdToken=000001&cHashQRCode=ff")
+    assert (dados["versao_qr"], dados["data_emissao"], dados["valor_total"]) == ("100", "05/03/2025", 45.9)
+    assert dados["cnpj"] == "12.345.678/0001-90" and dados["nome_estabelecimento"] is None
+    assert qr_tem_dados_de_lancamento(dados)
+
+
+def test_qr_v2_online_nao_traz_valor_nem_data():
+    dados = decodificar_qr_nfce(f"{URL_SEFAZ}?p={CHAVE_ONLINE}|2|1|1|0123456789abcdef")
+    assert (dados["versao_qr"], dados["data_emissao"], dados["valor_total"]) == ("2", None, None)
+    assert dados["chave"] == CHAVE_ONLINE
+    assert not qr_tem_dados_de_lancamento(dados)
+
+
+# O dia vem no QR; mês e ano vêm da chave.
+@pytest.mark.parametrize("parametro", [
+    f"{CHAVE_OFFLINE}|2|1|05|45.90|6a4f7a|1|0123456789abcdef",
+    quote(f"{CHAVE_OFFLINE}|2|1|5|45,90|6a4f7a|1|0123456789abcdef"),
+])
+def test_qr_v2_offline_traz_dia_e_valor(parametro):
+    dados = decodificar_qr_nfce(f"{URL_SEFAZ}?p={parametro}")
+    assert (dados["tipo_emissao"], dados["data_emissao"], dados["valor_total"]) == ("9", "05/03/2025", 45.9)
+    assert qr_tem_dados_de_lancamento(dados)
+
+
+# Campos de contingência num QR de emissão normal não são lidos como dia e valor.
+def test_qr_v2_de_emissao_normal_ignora_campos_de_contingencia():
+    dados = decodificar_qr_nfce(f"{URL_SEFAZ}?p={CHAVE_ONLINE}|2|1|05|45.90|6a4f7a|1|ff")
+    assert (dados["data_emissao"], dados["valor_total"]) == (None, None)
+
+
+@pytest.mark.parametrize("url", [
+    f"{URL_SEFAZ}?p={CHAVE_ONLINE[:43]}0|2|1|1|ff",
+    f"{URL_SEFAZ}?chNFe=123&nVersao=100",
+    "",
+    None,
+])
+def test_qr_sem_chave_valida_retorna_none(url):
+    assert decodificar_qr_nfce(url) is None
+    assert not qr_tem_dados_de_lancamento(decodificar_qr_nfce(url))
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from enviador_mensagens import EnviadorStub, criar_enviador
+from fila_processamento import FilaProcessamento
+
+VARIAVEIS_TWILIO = ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN", "TWILIO_WHATSAPP_NUMBER")
+
+
+@pytest.mark.parametrize("configuradas", [(), ("TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN")])
+def test_sem_configuracao_completa_da_twilio_usa_o_stub(monkeypatch, configuradas):
+    for variavel in VARIAVEIS_TWILIO:
+        monkeypatch.delenv(variavel, raising=False)
+    for variavel in configuradas:
+        monkeypatch.setenv(variavel, "x")
+    assert isinstance(criar_enviador(), EnviadorStub)
+
+
+def test_stub_guarda_as_mensagens_enviadas_de_varias_threads():
+    enviador = EnviadorStub()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: enviador.enviar(f"whatsapp:+55{i % 4}", f"mensagem {i}"), range(200)))
+    assert len(enviador.mensagens) == 200
+    assert sorted(m["texto"] for m in enviador.mensagens if m["destino"] == "whatsapp:+550") == sorted(
+        f"mensagem {i}" for i in range(0, 200, 4))
+
+
+def test_resposta_da_fila_sai_pelo_stub():
+    enviador, fila = EnviadorStub(), FilaProcessamento(num_workers=2)
+
+    def processar(tarefa, destino, texto):
+        with tarefa.etapa("envio"):
+            enviador.enviar(destino, texto.upper())
+
+    try:
+        for i in range(5):
+            fila.enfileirar(processar, "whatsapp:+551", f"cupom {i}")
+        fila.aguardar()
+    finally:
+        fila.parar()
+    assert sorted(m["texto"] for m in enviador.mensagens) == [f"CUPOM {i}" for i in range(5)]
+    assert fila.estatisticas()["concluidas"] == 5
@@ -0,0 +1,27 @@
+import glob
+import json
+import os
+import re
+
+import pytest
+
+from extratores_nfce import extrair_dados_html
+
+# Páginas de referência: cada .html (com a URL do QR Code num comentário
+# "<!-- url: ... -->" na primeira linha) tem ao lado o .json esperado.
+PASTA_CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "corpus_nfce")
+CASOS = sorted(glob.glob(os.path.join(PASTA_CORPUS, "*.html")))
+
+
+def test_corpus_tem_casos():
+    assert CASOS
+
+
+@pytest.mark.parametrize("caminho_html", CASOS, ids=lambda caminho: os.path.basename(caminho)[:-5])
+def test_extrator_reproduz_o_corpus(caminho_html):
+    with open(caminho_html, encoding="utf-8") as f:
+        html = f.read()
+    with open(caminho_html[:-5] + ".json", encoding="utf-8") as f:
+        esperado = json.load(f)
+    match = re.match(r"<!-- url: (\S+) -->", html)
+    assert extrair_dados_html(html, match.group(1) if match else None) == esperado
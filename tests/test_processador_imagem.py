@@ -0,0 +1,71 @@
+import threading
+
+import processador_imagem
+from processador_imagem import eh_pdf, paginas_do_pdf
+
+
+# PDF mínimo com uma página por largura: cada página tem um retângulo preto
+# de `largura` pontos, então dá para saber de qual documento e página veio cada imagem.
+def pdf_sintetico(larguras):
+    objetos = ["<< /Type /Catalog /Pages 2 0 R >>", None]
+    filhos = []
+    for largura in larguras:
+        conteudo = f"0 g 10 10 {largura} 50 re f".encode("ascii")
+        numero_conteudo = len(objetos) + 2
+        filhos.append(f"{len(objetos) + 1} 0 R")
+        objetos.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 300 100] /Contents {numero_conteudo} 0 R >>")
+        objetos.append(f"<< /Length {len(conteudo)} >>\nstream\n{conteudo.decode()}\nendstream")
+    objetos[1] = f"<< /Type /Pages /Kids [{' '.join(filhos)}] /Count {len(larguras)} >>"
+
+    saida, posicoes = bytearray(b"%PDF-1.4\n"), []
+    for numero, objeto in enumerate(objetos, start=1):
+        posicoes.append(len(saida))
+        saida += f"{numero} 0 obj\n{objeto}\nendobj\n".encode("ascii")
+    inicio_xref = len(saida)
+    saida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode("ascii")
+    saida += "".join(f"{posicao:010d} 00000 n \n" for posicao in posicoes).encode("ascii")
+    saida += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n".encode("ascii")
+    return bytes(saida)
+
+
+# Largura do retângulo em pontos, medida na página rasterizada a 72 dpi.
+def largura_do_retangulo(imagem):
+    return int((imagem.cinza < 128).any(axis=0).sum())
+
+
+def test_paginas_do_pdf_rasteriza_todas_as_paginas_em_ordem():
+    conteudo = pdf_sintetico([40, 120, 200])
+    assert eh_pdf(conteudo)
+    assert [largura_do_retangulo(p) for p in paginas_do_pdf(conteudo, dpi=72)] == [40, 120, 200]
+
+
+# O PDFium não é thread-safe: com o lock, vários workers abrindo PDFs ao mesmo
+# tempo continuam recebendo as próprias páginas.
+def test_pdfs_em_varias_threads_ao_mesmo_tempo():
+    documentos = {i: [10 + i, 60 + i, 110 + i, 160 + i] for i in range(8)}
+    resultados, erros = {}, []
+
+    def rasterizar(i):
+        try:
+            for _ in range(5):
+                larguras = [largura_do_retangulo(p) for p in paginas_do_pdf(pdf_sintetico(documentos[i]), dpi=72)]
+                assert larguras == documentos[i]
+            resultados[i] = larguras
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=rasterizar, args=(i,)) for i in documentos]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not erros
+    assert resultados == documentos
+
+
+# O OCR de cada página roda com o lock livre (e o documento já fechado).
+def test_lock_do_pdfium_fica_livre_enquanto_as_paginas_sao_consumidas():
+    paginas = paginas_do_pdf(pdf_sintetico([40, 120]), dpi=72)
+    next(paginas)
+    assert not processador_imagem._LOCK_PDFIUM.locked()
+    assert len(list(paginas)) == 1
@@ -0,0 +1,118 @@
+import glob
+import json
+import os
+import random
+import sys
+import types
+
+import pytest
+
+import processador_pedagio
+from processador_pedagio import analisar_e_estruturar_texto, montar_linhas_por_posicao
+
+# Extratos de referência: cada .txt (texto do OCR) tem ao lado o .json esperado.
+PASTA_CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks",
+                            "corpus_pedagio")
+CASOS = sorted(glob.glob(os.path.join(PASTA_CORPUS, "*.txt")))
+
+
+def _caso(caminho_txt):
+    with open(caminho_txt, encoding="utf-8") as f:
+        texto = f.read()
+    with open(caminho_txt[:-4] + ".json", encoding="utf-8") as f:
+        return texto, json.load(f)
+
+
+# Caixas do Tesseract para o texto: uma linha a cada 40 px, topo das palavras
+# oscilando alguns pixels e as palavras fora de ordem.
+def palavras_do_texto(texto, semente):
+    palavras = []
+    for n, linha in enumerate(l for l in texto.splitlines() if l.strip()):
+        esquerda = 20
+        for i, palavra in enumerate(linha.split()):
+            palavras.append({"texto": palavra, "esquerda": esquerda, "topo": 40 * n + (n + i) % 4,
+                             "largura": 12 * len(palavra), "altura": 18})
+            esquerda += 12 * len(palavra) + 10
+    random.Random(semente).shuffle(palavras)
+    return palavras
+
+
+# --- Corpus do parser ---
+def test_corpus_tem_casos():
+    assert CASOS
+
+
+@pytest.mark.parametrize("caminho_txt", CASOS, ids=lambda caminho: os.path.basename(caminho)[:-4])
+def test_parser_reproduz_o_corpus(caminho_txt):
+    texto, esperado = _caso(caminho_txt)
+    assert analisar_e_estruturar_texto(texto) == esperado
+
+
+@pytest.mark.parametrize("caminho_txt", CASOS, ids=lambda caminho: os.path.basename(caminho)[:-4])
+def test_linhas_montadas_pela_posicao_reproduzem_o_corpus(caminho_txt):
+    texto, esperado = _caso(caminho_txt)
+    linhas = montar_linhas_por_posicao(palavras_do_texto(texto, os.path.basename(caminho_txt)))
+    assert linhas == [" ".join(linha.split()) for linha in texto.splitlines() if linha.strip()]
+    assert analisar_e_estruturar_texto("\n".join(linhas)) == esperado
+
+
+def test_linhas_por_posicao_sem_palavras():
+    assert montar_linhas_por_posicao([]) == []
+
+
+# --- Motor de OCR ---
+
+
+# tesserocr falso (como o wheel, procura os idiomas em "./"): conta as
+# instâncias do Tesseract carregadas.
+@pytest.fixture
+def tesserocr_falso(monkeypatch, tmp_path):
+    modulo = types.ModuleType("tesserocr")
+    modulo.instancias = []
+    modulo.PyTessBaseAPI = lambda **kwargs: modulo.instancias.append(kwargs) or object()
+    modulo.get_languages = lambda: ("./", [])
+    monkeypatch.setitem(sys.modules, "tesserocr", modulo)
+    monkeypatch.setattr(processador_pedagio, "_motor_ocr", None)
+    for variavel in ("MOTOR_OCR", "TAMANHO_POOL_OCR", "NUM_WORKERS_FILA"):
+        monkeypatch.delenv(variavel, raising=False)
+    (tmp_path / "por.traineddata").write_bytes(b"")
+    monkeypatch.setenv("TESSDATA_PREFIX", str(tmp_path))
+    return modulo
+
+
+# Só as threads da fila fazem OCR: o pool não depende do número de núcleos.
+@pytest.mark.parametrize("ambiente, esperado", [
+    ({}, 2),
+    ({"NUM_WORKERS_FILA": "3"}, 3),
+    ({"NUM_WORKERS_FILA": "3", "TAMANHO_POOL_OCR": "1"}, 1),
+])
+def test_pool_de_ocr_tem_uma_instancia_por_worker_da_fila(tesserocr_falso, monkeypatch, ambiente, esperado):
+    for variavel, valor in ambiente.items():
+        monkeypatch.setenv(variavel, valor)
+    assert processador_pedagio.obter_motor_ocr().nome == "tesserocr"
+    assert len(tesserocr_falso.instancias) == esperado
+
+
+# O inicializador sobrescreve o que vier do ambiente (o monkeypatch desfaz no fim).
+def test_worker_do_processamento_em_lote_carrega_uma_instancia(tesserocr_falso, monkeypatch):
+    import processar_lote
+    monkeypatch.setenv("NUM_WORKERS_FILA", "8")
+    monkeypatch.setenv("TAMANHO_POOL_OCR", "8")
+    monkeypatch.setattr(processar_lote, "_detector_qr", None)
+    monkeypatch.setattr("processador_cupom.configurar_detector_wechat", lambda: None)
+    processar_lote._inicializar_worker()
+    processador_pedagio.obter_motor_ocr()
+    assert len(tesserocr_falso.instancias) == 1
+
+
+def test_pool_de_ocr_carrega_os_idiomas_da_pasta_do_tessdata(tesserocr_falso, tmp_path):
+    processador_pedagio.obter_motor_ocr()
+    assert {(i["path"], i["lang"]) for i in tesserocr_falso.instancias} == {(f"{tmp_path}/", "por")}
+
+
+# Sem o por.traineddata o pool não sobe e cada imagem usa o pytesseract.
+def test_sem_idioma_instalado_volta_para_o_pytesseract(tesserocr_falso, monkeypatch, tmp_path):
+    monkeypatch.setattr(processador_pedagio, "PASTAS_TESSDATA", ())
+    (tmp_path / "por.traineddata").unlink()
+    assert processador_pedagio.obter_motor_ocr().nome == "pytesseract"
+    assert tesserocr_falso.instancias == []
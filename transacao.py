@@ -0,0 +1,119 @@
+# transacao.py
+# Registro de uma despesa (cupom ou passagem de pedágio). O armazenamento, o
+# cache e o JSON continuam trabalhando com dicionários de chaves em português
+# ("Data", "Tipo de Despesa", ...); a exportação converte cada um para este
+# registro compacto uma única vez e lê os campos por atributo.
+
+import re
+import unicodedata
+from datetime import date
+
+ORIGEM_PADRAO = "São Jose dos Campos"
+DESTINO_PADRAO = "São Paulo"
+
+# Chave do dicionário -> atributo do registro.
+CHAVES = {
+    "Data": "data",
+    "Tipo de Despesa": "tipo_despesa",
+    "Estabelecimento": "estabelecimento",
+    "Valor": "valor",
+    "Observação": "observacao",
+    "Origem": "origem",
+    "Destino": "destino",
+    "ID_Transacao": "id_transacao",
+    "id": "id",
+}
+
+
+class Transacao:
+    __slots__ = tuple(CHAVES.values())
+
+    def __init__(self, data, tipo_despesa, estabelecimento, valor, observacao="",
+                 origem=ORIGEM_PADRAO, destino=DESTINO_PADRAO, id_transacao=None, id=None):
+        self.data = data
+        self.tipo_despesa = tipo_despesa
+        self.estabelecimento = estabelecimento or ""
+        self.valor = valor
+        self.observacao = observacao or ""
+        self.origem = origem or ORIGEM_PADRAO
+        self.destino = destino or DESTINO_PADRAO
+        self.id_transacao = id_transacao
+        self.id = id
+
+    @classmethod
+    def de_dict(cls, dados):
+        return cls(**{atributo: dados[chave] for chave, atributo in CHAVES.items() if chave in dados})
+
+    # Aceita tanto um registro quanto o dicionário guardado no armazenamento.
+    @classmethod
+    def de(cls, transacao):
+        return transacao if isinstance(transacao, cls) else cls.de_dict(transacao)
+
+    # Origem e destino padrão ficam de fora: o dicionário guardado não muda.
+    def como_dict(self):
+        dados = {}
+        for chave, atributo in CHAVES.items():
+            valor = getattr(self, atributo)
+            if valor is None or (atributo == "origem" and valor == ORIGEM_PADRAO) or (
+                    atributo == "destino" and valor == DESTINO_PADRAO):
+                continue
+            dados[chave] = valor
+        return dados
+
+    # Coluna CLIENTE da planilha: estabelecimento e, se houver, a observação.
+    @property
+    def cliente(self):
+        if self.observacao:
+            return f"{self.estabelecimento} - {self.observacao}"
+        return self.estabelecimento
+
+    def __repr__(self):
+        return (f"Transacao({self.data!r}, {self.tipo_despesa!r}, {self.estabelecimento!r}, "
+                f"{self.valor!r})")
+
+
+# --- Campos indexados (consultas e relatórios) ---
+# Cupons trazem a data como DD/MM/AAAA; extratos de pedágio como "12 de marco",
+# sem ano. Nesse caso vale o ano de `referencia` (quando a transação foi
+# lançada), ou o anterior se o mês ainda não chegou nessa data.
+MESES = {nome: numero for numero, nome in enumerate(
+    ("jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"), start=1)}
+
+_DATA_NUMERICA = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{2,4})")
+_DATA_POR_EXTENSO = re.compile(r"(\d{1,2}) de (\w+)")
+_PLACA = re.compile(r"Placa:\s*([A-Z0-9]{7})")
+
+
+def _sem_acentos(texto):
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+
+
+# Data da transação em ISO (AAAA-MM-DD), ou None se não der para interpretar.
+def data_iso(texto, referencia=None):
+    texto = str(texto or "")
+    try:
+        if (m := _DATA_NUMERICA.search(texto)):
+            dia, mes, ano = (int(g) for g in m.groups())
+            return date(ano + 2000 if ano < 100 else ano, mes, dia).isoformat()
+        if (m := _DATA_POR_EXTENSO.search(_sem_acentos(texto).lower())):
+            mes = MESES.get(m.group(2)[:3])
+            if not mes:
+                return None
+            referencia = referencia or date.today()
+            ano = referencia.year if mes <= referencia.month else referencia.year - 1
+            return date(ano, mes, int(m.group(1))).isoformat()
+    except ValueError:
+        return None
+    return None
+
+
+def placa(observacao):
+    m = _PLACA.search(observacao or "")
+    return m.group(1) if m else None
+
+
+# (data ISO, tipo de despesa, valor, placa) de um dicionário guardado.
+def campos_indexados(transacao, referencia=None):
+    valor = transacao.get("Valor")
+    return (data_iso(transacao.get("Data"), referencia), transacao.get("Tipo de Despesa"),
+            float(valor) if isinstance(valor, (int, float)) else None, placa(transacao.get("Observação")))